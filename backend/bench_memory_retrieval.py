@@ -0,0 +1,85 @@
+import sys
+# Windows console encoding fix
+sys.stdout.reconfigure(encoding='utf-8')
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+# Allow running from the repo root as well as from backend/
+sys.path.insert(0, str(Path(__file__).parent))
+
+from memory_store import MemoryStore, estimate_tokens
+
+TOPICS = {
+    "cricket": ["batting", "bowling", "wicket", "innings", "captain", "kohli", "tendulkar", "dhoni"],
+    "python": ["list", "dict", "generator", "asyncio", "decorator", "typing", "pytest", "import"],
+    "movies": ["director", "actor", "sequel", "box", "office", "oscar", "screenplay", "trilogy"],
+    "finance": ["inflation", "interest", "rate", "bond", "equity", "dividend", "portfolio", "tax"],
+    "physics": ["quantum", "gravity", "photon", "entropy", "relativity", "particle", "field", "energy"],
+}
+
+
+def make_entry(rng: random.Random, topic: str, marker: str = "") -> dict:
+    words = rng.sample(TOPICS[topic], 4)
+    return {
+        "type": "error_correction",
+        "content": f"When answering about {topic}: {' '.join(words)} {marker}".strip(),
+        "timestamp": "2026-01-01T00:00:00"
+    }
+
+
+def build_store(path: str, size: int, rng: random.Random) -> list:
+    """Writes `size` background entries plus one planted correction per topic; returns the probes."""
+    data = [make_entry(rng, rng.choice(list(TOPICS))) for _ in range(size)]
+    probes = []
+    for topic, words in TOPICS.items():
+        marker = f"{topic}-fact-{rng.randrange(10**6)}"
+        data.insert(rng.randrange(len(data) + 1), {
+            "type": "error_correction",
+            "content": f"Correction: {words[0]} {words[1]} detail {marker}",
+            "timestamp": "2026-01-01T00:00:00"
+        })
+        probes.append((f"Tell me about {topic} {words[0]} and {words[1]} detail", marker))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    return probes
+
+
+def run(sizes: list, repeats: int):
+    rng = random.Random(7)
+    print(f"{'entries':>8} {'recall@k':>9} {'ms/query':>9} {'ctx tokens':>11} {'full dump tokens':>17} {'ms/update':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "memory_store.json")
+            probes = build_store(path, size, rng)
+            store = MemoryStore(filepath=path)
+
+            hits, tokens, start = 0, 0, time.perf_counter()
+            for _ in range(repeats):
+                for query, marker in probes:
+                    results = store.retrieve_memory(query)
+                    hits += any(marker in entry["content"] for entry in results)
+                    tokens += sum(estimate_tokens(entry) for entry in results)
+            elapsed = time.perf_counter() - start
+            queries = repeats * len(probes)
+            full_dump = len(json.dumps(store.data, ensure_ascii=False)) // 4
+
+            start = time.perf_counter()
+            for i in range(repeats):
+                store.update_memory("error_correction", f"benchmark feedback {i}")
+            update_ms = (time.perf_counter() - start) / repeats * 1000
+            print(f"{size:>8} {hits / queries:>9.2f} {elapsed / queries * 1000:>9.2f} "
+                  f"{tokens // queries:>11} {full_dump:>17,} {update_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend memory retrieval and update latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    run(args.sizes, args.repeats)
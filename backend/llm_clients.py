@@ -6,9 +6,17 @@ from openai import AsyncOpenAI
 from groq import AsyncGroq
 import aiohttp
 import asyncio
+import json
+import sys
+import time
+from functools import partial
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Line-edit refinement is shared with the router pipeline
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from router.patching import PATCH_INSTRUCTIONS, apply_patch, number_lines, refine_stats, use_patch
+
 
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
@@ -222,20 +230,18 @@ async def generate_ollama(prompt: str, model_name="qwen2.5:3b"):
     except Exception as e:
         return f"Error Ollama: {str(e)} (Ensure Ollama is running)"
 
-async def generate_all(prompt: str):
-    # Run all in parallel
-    results = await asyncio.gather(
-        generate_gemini(prompt),
-        generate_chatgpt(prompt),
-        generate_groq(prompt),
-        generate_ollama(prompt, model_name="qwen2.5:3b")
-    )
-    return {
-        "Gemini": results[0],
-        "ChatGPT": results[1],
-        "Groq": results[2],
-        "Ollama": results[3]
-    }
+GENERATORS = {
+    "Gemini": generate_gemini,
+    "ChatGPT": generate_chatgpt,
+    "Groq": generate_groq,
+    "Ollama": partial(generate_ollama, model_name="qwen2.5:3b"),
+}
+
+async def generate_all(prompt: str, models: list = None):
+    """Runs the generators (all, or only `models`) in parallel."""
+    names = [name for name in GENERATORS if models is None or name in models]
+    results = await asyncio.gather(*(GENERATORS[name](prompt) for name in names))
+    return dict(zip(names, results))
 
 async def judge_responses(prompt: str, responses: dict):
     if not gemini_client:
@@ -409,3 +415,97 @@ The JSON MUST be EXACTLY:
         
     except Exception as e:
         return {"error": f"Error Judging: {str(e)}", "raw_response": text_response if 'text_response' in locals() else "N/A"}
+
+
+EDITOR_PROMPT = """
+You are an expert EDITOR revising an answer after human feedback.
+
+────────────────────────
+USER PROMPT
+────────────────────────
+"{prompt}"
+
+────────────────────────
+CURRENT ANSWER
+────────────────────────
+{answer}
+
+────────────────────────
+HUMAN FEEDBACK
+────────────────────────
+"{feedback}"
+
+────────────────────────
+MODEL RESPONSE EXCERPTS (the answer was synthesized from these)
+────────────────────────
+{excerpts}
+
+────────────────────────
+TASK
+────────────────────────
+1. Classify the feedback:
+   - "style": tone, length, format, structure, wording
+   - "detail": expand, explain, add examples using what the answer and excerpts already contain
+   - "factual": the answer (or a model's response) states something wrong or misses a fact the human supplies
+   - "topic_change": the feedback asks a different question
+2. For "style" and "detail": apply the feedback. {apply_format}
+   Keep everything the feedback does not touch.
+3. For "factual": list the models whose excerpts contain or depend on the corrected claim.
+   Do NOT write the answer.
+4. For "topic_change": do NOT write the answer.
+
+Return ONLY valid JSON, no markdown:
+{output_format}
+"""
+REWRITE_FORMAT = ("Return the full revised answer.",
+                  '{"feedback_type": "style | detail | factual | topic_change", "affected_models": [], "revised_answer": ""}')
+PATCH_FORMAT = ("Return line edits, NOT the answer:\n" + PATCH_INSTRUCTIONS.replace("Return ONLY valid JSON with", "Put in \"edits\""),
+                '{"feedback_type": "style | detail | factual | topic_change", "affected_models": [], "edits": []}')
+
+async def edit_answer(prompt: str, draft: str, feedback: str, raw_responses: dict, excerpt_chars: int = 400,
+                      patch: bool = None):
+    """
+    One editor call for a feedback round: classifies the feedback and, for
+    style/detail feedback, returns the revised answer. Long drafts are edited
+    with line patches (router/patching.py); a patch that fails to apply is
+    retried once as a full rewrite. On failure the feedback_type is "unknown"
+    so the caller falls back to regeneration. "llm_calls" is the number of
+    editor calls made, including a retry.
+    """
+    if not gemini_client:
+        return {"feedback_type": "unknown", "error": "Gemini API Key missing for Editor", "llm_calls": 0}
+    if patch is None:
+        patch = use_patch(draft)
+    apply_format, output_format = PATCH_FORMAT if patch else REWRITE_FORMAT
+    excerpts = "\n".join(f"- {name}: {(text or '')[:excerpt_chars]}" for name, text in raw_responses.items())
+    started = time.perf_counter()
+    try:
+        response = await gemini_client.aio.models.generate_content(
+            model="gemini-2.0-flash-exp",
+            contents=EDITOR_PROMPT.format(prompt=prompt, answer=number_lines(draft) if patch else draft,
+                                          feedback=feedback, excerpts=excerpts,
+                                          apply_format=apply_format, output_format=output_format)
+        )
+        text_response = response.text.replace("```json", "").replace("```", "").strip()
+        result = json.loads(text_response)
+        if not isinstance(result, dict):
+            raise ValueError(f"expected a JSON object, got {type(result).__name__}")
+    except Exception as e:
+        return {"feedback_type": "unknown", "error": f"Error Editing: {str(e)}", "llm_calls": 1}
+    result["llm_calls"] = 1
+
+    if result.get("feedback_type") not in ("style", "detail"):
+        return result   # classification only, no answer was written
+    if not patch:
+        refine_stats.record("rewrite", text_response, time.perf_counter() - started)
+        return result
+    try:
+        result["revised_answer"] = apply_patch(draft, result)
+        refine_stats.record("patch", text_response, time.perf_counter() - started)
+        return result
+    except ValueError as e:
+        refine_stats.record("failed_patch", text_response, time.perf_counter() - started)
+        print(f"[Editor] Patch not applicable ({e}); rewriting the full answer.")
+        retry = await edit_answer(prompt, draft, feedback, raw_responses, excerpt_chars, patch=False)
+        retry["llm_calls"] += 1
+        return retry
@@ -4,8 +4,14 @@ from pydantic import BaseModel
 from llm_clients import generate_all, judge_responses
 from orchestrator import Orchestrator
 from typing import Optional, Dict, Any
+from pathlib import Path
 import uvicorn
 import os
+import sys
+
+# The router engine is served from the same app (/api/router/*)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from router.api import router as router_api
 
 app = FastAPI()
 
@@ -17,6 +23,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.include_router(router_api)
 
 class PromptRequest(BaseModel):
     prompt: str
@@ -27,10 +34,12 @@ class JudgeRequest(BaseModel):
 
 class OrchestratorStartRequest(BaseModel):
     prompt: str
+    session_id: Optional[str] = None
 
 class OrchestratorFeedbackRequest(BaseModel):
     workflow_id: str
-    feedback: str
+    feedback: str = ""
+    approved: bool = False
 
 orchestrator = Orchestrator()
 
@@ -51,7 +60,7 @@ async def run_judge(request: JudgeRequest):
 async def start_orchestrator(request: OrchestratorStartRequest):
     if not request.prompt:
         raise HTTPException(status_code=400, detail="Prompt is empty")
-    return await orchestrator.start_workflow(request.prompt)
+    return await orchestrator.start_workflow(request.prompt, request.session_id)
 
 @app.post("/api/orchestrator/human-feedback")
 async def process_feedback(request: OrchestratorFeedbackRequest):
@@ -60,5 +69,21 @@ async def process_feedback(request: OrchestratorFeedbackRequest):
         request.model_dump()
     )
 
+@app.get("/api/workflows")
+async def workflow_stats():
+    return orchestrator.workflows.summary()
+
+@app.get("/api/workflows/{workflow_id}")
+async def get_workflow(workflow_id: str):
+    workflow = orchestrator.workflows.get(workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return workflow
+
+@app.delete("/api/workflows/{workflow_id}")
+async def delete_workflow(workflow_id: str):
+    orchestrator.workflows.delete(workflow_id)
+    return {"status": "deleted", "workflow_id": workflow_id}
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="localhost", port=8000, reload=True)
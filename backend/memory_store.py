@@ -1,31 +1,251 @@
+import heapq
 import json
+import math
 import os
-from pathlib import Path
+import re
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Retrieval limits for the memory context injected into generator prompts.
+MEMORY_TOP_K = int(os.getenv("BACKEND_MEMORY_TOP_K", "8"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("BACKEND_MEMORY_TOKEN_BUDGET", "1000"))
+# Keep only the newest N entries (0 = keep everything). The log is rewritten once
+# COMPACT_MIN_DEAD_LINES surplus or corrupt lines have accumulated.
+MEMORY_MAX_ENTRIES = int(os.getenv("BACKEND_MEMORY_MAX_ENTRIES", "0"))
+COMPACT_MIN_DEAD_LINES = 1000
+
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of",
+              "on", "or", "that", "the", "this", "to", "was", "with", "what", "who", "how"}
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN_RE.findall(text.casefold()) if t not in _STOPWORDS]
+
+
+def estimate_tokens(entry: dict) -> int:
+    """Rough prompt cost of an entry (~4 characters per token)."""
+    return len(json.dumps(entry, ensure_ascii=False)) // 4 + 1
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring over memory entries, updated
+    incrementally as entries are appended. Documents are list positions.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}   # term -> {doc_id: term frequency}
+        self.doc_len = []
+        self.total_len = 0
+
+    def add(self, doc_id: int, text: str):
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(terms.values())
+        while len(self.doc_len) <= doc_id:
+            self.doc_len.append(0)
+        self.doc_len[doc_id] = length
+        self.total_len += length
+
+    def search(self, query: str, k: int) -> list:
+        """Returns up to k (score, doc_id) pairs, best first."""
+        n = len(self.doc_len)
+        if not n:
+            return []
+        avg_len = self.total_len / n or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(k, ((score, doc_id) for doc_id, score in scores.items()))
+
+
+@contextmanager
+def _locked(lock_path: str):
+    """Exclusive cross-process lock so several uvicorn workers can share one file."""
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        yield
+    finally:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
+
+
 class MemoryStore:
-    def __init__(self, filepath="memory_store.json"):
+    """
+    Feedback memory persisted as append-only JSON Lines (`memory_store.jsonl`):
+    each update appends one line, so its cost does not depend on the store size.
+    A legacy `memory_store.json` list is imported once. The loader streams the
+    file and ignores a truncated final line (a crash or an append in progress);
+    the next writer cuts it off before appending.
+    The file lock orders processes; an in-process lock orders threads (updates
+    run off the event loop while retrievals run on it), so `data`, the index
+    and the log offset always change together.
+    """
+    def __init__(self, filepath="memory_store.json", max_entries: int = MEMORY_MAX_ENTRIES):
         self.filepath = filepath
-        self._load_memory()
+        self.logpath = os.path.splitext(filepath)[0] + ".jsonl"
+        self.lockpath = filepath + ".lock"
+        self.max_entries = max_entries
+        self._offset = 0     # bytes of the log applied to self.data
+        self._ino = None
+        self._dead = 0       # corrupt or surplus lines waiting for compaction
+        self._lock = threading.RLock()   # guards data, index, _offset, _ino, _dead
+        with self._lock, _locked(self.lockpath):
+            self._migrate_legacy()
+            self._load_memory()
+
+    def _migrate_legacy(self):
+        if os.path.exists(self.logpath) or not os.path.exists(self.filepath):
+            return
+        try:
+            with open(self.filepath, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except json.JSONDecodeError:
+            legacy = []
+        self._write_log(legacy)
+        print(f"[Memory] Migrated {len(legacy)} entries from {os.path.basename(self.filepath)} to JSONL.")
 
     def _load_memory(self):
-        if os.path.exists(self.filepath):
-            try:
-                with open(self.filepath, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
-            except json.JSONDecodeError:
-                self.data = []
-        else:
-            self.data = []
+        self.data = []
+        self.index = BM25Index()
+        self._offset = 0
+        self._dead = 0
+        self._read_tail()
+
+    def _read_tail(self):
+        """Applies complete lines after self._offset (streaming, line by line)."""
+        try:
+            f = open(self.logpath, 'rb')
+        except FileNotFoundError:
+            self._ino = None
+            return
+        with f:
+            self._ino = os.fstat(f.fileno()).st_ino
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break   # truncated final line
+                self._offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[Memory] Skipping corrupt line in {os.path.basename(self.logpath)}")
+                    self._dead += 1
+                    continue
+                self.data.append(entry)
+                self._index_entry(len(self.data) - 1, entry)
+
+    def _index_entry(self, doc_id: int, entry: dict):
+        self.index.add(doc_id, f"{entry.get('type', '')} {entry.get('content', '')}")
+
+    def _refresh(self):
+        """Picks up lines appended by other processes, or reloads after a compaction."""
+        try:
+            st = os.stat(self.logpath)
+        except FileNotFoundError:
+            if self._ino is not None:
+                self._load_memory()
+            return
+        if st.st_ino != self._ino or st.st_size < self._offset:
+            self._load_memory()
+        elif st.st_size > self._offset:
+            self._read_tail()
+
+    def _write_log(self, entries: list):
+        """Atomically replaces the log with `entries`."""
+        directory = os.path.dirname(os.path.abspath(self.logpath))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.logpath)
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _append(self, entry: dict):
+        """Appends one line (caller holds the file lock and has refreshed)."""
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+        with open(self.logpath, 'ab') as f:
+            if f.tell() > self._offset:
+                # A writer died mid-line; nobody else can be appending while we hold the lock
+                print(f"[Memory] Dropping truncated line at end of {os.path.basename(self.logpath)}")
+                f.truncate(self._offset)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            self._ino = os.fstat(f.fileno()).st_ino
+        self._offset += len(line)
+
+    def _compact(self):
+        """Rewrites the log without corrupt lines, keeping the newest max_entries entries."""
+        if self.max_entries:
+            self.data = self.data[-self.max_entries:]
+        self._write_log(self.data)
+        self._load_memory()
+
+    def _needs_compaction(self) -> bool:
+        surplus = len(self.data) - self.max_entries if self.max_entries else 0
+        return self._dead + max(surplus, 0) >= COMPACT_MIN_DEAD_LINES
 
-    def _save_memory(self):
-        with open(self.filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
+    def retrieve_memory(self, query: str, top_k: int = MEMORY_TOP_K, token_budget: int = MEMORY_TOKEN_BUDGET):
+        """
+        Returns the entries most relevant to `query` (BM25), best first, capped at
+        top_k entries and ~token_budget prompt tokens. Remaining slots are filled
+        with the most recent entries, since fresh corrections often share no
+        words with the prompt.
+        """
+        with self._lock:
+            self._refresh()
+            ranked = [doc_id for _, doc_id in self.index.search(query, top_k)]
+            seen = set(ranked)
+            for doc_id in range(len(self.data) - 1, -1, -1):
+                if len(ranked) >= top_k:
+                    break
+                if doc_id not in seen:
+                    ranked.append(doc_id)
+            entries = [self.data[doc_id] for doc_id in ranked]
 
-    def retrieve_memory(self, query: str):
-        # validation: simple keyword matching for now, can be upgraded to vector search later
-        # Returning all memory for now as the dataset is small
-        return self.data
+        results, used = [], 0
+        for entry in entries:
+            cost = estimate_tokens(entry)
+            if used + cost > token_budget:
+                continue
+            results.append(entry)
+            used += cost
+        return results
 
     def update_memory(self, memory_type: str, content: str):
         entry = {
@@ -33,6 +253,11 @@ class MemoryStore:
             "content": content,
             "timestamp": datetime.now().isoformat()
         }
-        self.data.append(entry)
-        self._save_memory()
+        with self._lock, _locked(self.lockpath):
+            self._refresh()
+            self._append(entry)
+            self.data.append(entry)
+            self._index_entry(len(self.data) - 1, entry)
+            if self._needs_compaction():
+                self._compact()
         return entry
@@ -1,58 +1,80 @@
 import asyncio
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from memory_store import MemoryStore
+from workflows import WorkflowStore
 import llm_clients
 import json
+import os
+
+# Feedback rounds: "incremental" first asks a single editor call to apply the
+# feedback and only regenerates (the affected models, then the judge) for
+# factual corrections or topic changes; "full" re-runs every generator and the
+# judge for each piece of feedback.
+REFINE_MODE = os.getenv("BACKEND_REFINE_MODE", "incremental")
+# How the editor's verdict is handled
+EDIT_TYPES = {"style", "detail"}            # answered by the editor alone
+REGENERATE_AFFECTED = {"factual"}           # only the models it names are re-run
 
 class Orchestrator:
     def __init__(self):
         self.memory = MemoryStore()
-        # Simple in-memory state tracking for demo purposes. 
-        # In production, use a proper DB (Redis/Postgres).
-        self.current_state = {} 
+        # Pending human reviews (generated ids, stages, TTL; in-memory or SQLite)
+        self.workflows = WorkflowStore()
 
-    async def _run_cycle(self, prompt: str, memory_context: List[Dict]):
+    async def _run_cycle(self, prompt: str, memory_context: List[Dict], reuse: Dict[str, str] = None):
         """
         Runs Stage 1 (Generation) and Stage 2 (Judging).
+        Models in `reuse` keep their cached response instead of being called again.
         Returns the result dict.
         """
         # Stage 1: Multi-LLM Generation
         # We append memory findings to the prompt for the LLMs so they are aware
         augmented_prompt = f"USER PROMPT: {prompt}\n\nSTRICT MEMORY CONSTRAINTS:\n{json.dumps(memory_context)}"
         
-        raw_responses = await llm_clients.generate_all(augmented_prompt)
+        reuse = reuse or {}
+        regenerate = [name for name in llm_clients.GENERATORS if name not in reuse]
+        fresh = await llm_clients.generate_all(augmented_prompt, regenerate) if regenerate else {}
+        raw_responses = {name: fresh.get(name, reuse.get(name)) for name in llm_clients.GENERATORS}
         
         # Stage 2: AI Judge & Debate
         judge_result = await llm_clients.judge_responses(prompt, raw_responses)
         
         return {
             "raw_responses": raw_responses,
-            "judge_result": judge_result
+            "judge_result": judge_result,
+            "llm_calls": len(regenerate) + 1
         }
 
-    async def start_workflow(self, prompt: str):
+    async def start_workflow(self, prompt: str, session_id: Optional[str] = None):
         """
         Starts the workflow from Stage 0 to Stage 2.
         Pauses for Stage 3 (Human Verification).
+        A new session id is generated when session_id is not given.
         """
-        # Stage 0: Memory Retrieval
-        retrieved_memory = self.memory.retrieve_memory(prompt)
-        
-        cycle_result = await self._run_cycle(prompt, retrieved_memory)
+        workflow = self.workflows.create(prompt, session_id)
+        try:
+            # Stage 0: Memory Retrieval
+            retrieved_memory = self.memory.retrieve_memory(prompt)
+            
+            cycle_result = await self._run_cycle(prompt, retrieved_memory)
+        except Exception:
+            self.workflows.advance(workflow, "failed")
+            raise
         
         # Prepare state for human review
-        workflow_id = "default_session" # Simplified for single user
-        self.current_state[workflow_id] = {
-            "prompt": prompt,
-            "raw_responses": cycle_result["raw_responses"],
-            "judge_result": cycle_result["judge_result"],
-            "stage": "waiting_for_human",
-            "memory_context": retrieved_memory
-        }
+        workflow = self.workflows.advance(
+            workflow, "waiting_for_human",
+            raw_responses=cycle_result["raw_responses"],
+            judge_result=cycle_result["judge_result"],
+            memory_context=retrieved_memory
+        )
+        if not workflow:
+            return {"error": "Workflow expired during generation"}
         
         return {
             "status": "waiting_for_human_verification",
-            "workflow_id": workflow_id,
+            "workflow_id": workflow["id"],
+            "session_id": workflow["session_id"],
             "draft_answer": cycle_result["judge_result"].get("corrected_answer"),
             "critique": cycle_result["judge_result"].get("rationale"),
             "model_scores": cycle_result["judge_result"].get("scores"),
@@ -63,47 +85,115 @@ class Orchestrator:
     async def process_human_feedback(self, workflow_id: str, human_input: Dict[str, Any]):
         """
         Resumes from Stage 3 with human input.
-        Every input triggers a re-generation cycle for refinement.
+        {"approved": true} completes the workflow and stores the answer;
+        any other input triggers a re-generation cycle for refinement.
         """
-        state = self.current_state.get(workflow_id)
+        state = self.workflows.get(workflow_id)
         if not state:
             return {"error": "Workflow session not found"}
+        if state["stage"] != "waiting_for_human":
+            return {"error": f"Workflow is {state['stage']}, not waiting for feedback"}
+
+        if human_input.get("approved"):
+            final_answer = state["judge_result"].get("corrected_answer") or state["judge_result"].get("final_answer")
+            if not self.workflows.advance(state, "completed", final_answer=final_answer):
+                return {"error": "Workflow was updated by another request"}
+            await asyncio.to_thread(self.memory.update_memory, "verified_answer",
+                                    f"Q: {state['prompt']}\nA: {final_answer}")
+            return {
+                "status": "completed",
+                "workflow_id": workflow_id,
+                "session_id": state["session_id"],
+                "final_answer": final_answer,
+                "memory_saved": True
+            }
 
         # Extract feedback from input
         feedback = human_input.get("feedback") or human_input.get("corrections")
         if not feedback:
             return {"error": "No feedback or corrections provided"}
 
-        # Store error correction immediately
-        self.memory.update_memory("error_correction", feedback)
-        
-        # Re-retrieve memory including the new error correction
+        # Claim the workflow so a concurrent request can't refine it twice
+        claimed = self.workflows.advance(state, "refining")
+        if not claimed:
+            return {"error": "Workflow is already being refined"}
+        try:
+            return await self._refine(claimed, feedback)
+        except Exception:
+            self.workflows.advance(claimed, "waiting_for_human")
+            raise
+
+    async def _refine(self, state: Dict[str, Any], feedback: str):
+        workflow_id = state["id"]
         prompt = state["prompt"]
-        updated_memory = self.memory.retrieve_memory(prompt)
-        
-        # Construct refined prompt with explicit user feedback
-        refined_prompt = f"{prompt}\n\nUSER FEEDBACK / CORRECTION: {feedback}"
-        
-        # Loop back to Stage 1 (Re-run Cycle)
-        cycle_result = await self._run_cycle(refined_prompt, updated_memory)
+        judge_result = state["judge_result"]
+        draft = judge_result.get("corrected_answer") or judge_result.get("final_answer") or ""
+        full_cycle_calls = len(llm_clients.GENERATORS) + 1
+
+        edit = {"feedback_type": "unknown"}
+        llm_calls = 0
+        if REFINE_MODE == "incremental":
+            edit = await llm_clients.edit_answer(prompt, draft, feedback, state["raw_responses"])
+            llm_calls += edit.get("llm_calls", 1)
+        feedback_type = edit.get("feedback_type", "unknown")
+
+        if feedback_type in EDIT_TYPES and edit.get("revised_answer"):
+            # Editor handled it: generators and judge are skipped, their results stay valid
+            raw_responses = state["raw_responses"]
+            judge_result = {**judge_result, "corrected_answer": edit["revised_answer"],
+                            "rationale": f"Edited for feedback ({feedback_type}): {feedback}"}
+            updated_memory = state["memory_context"]
+            message = "Edited based on feedback."
+        else:
+            # Store error correction immediately (file I/O off the event loop)
+            await asyncio.to_thread(self.memory.update_memory, "error_correction", feedback)
+            
+            # Re-retrieve memory including the new error correction
+            updated_memory = self.memory.retrieve_memory(f"{prompt}\n{feedback}")
+            
+            # Construct refined prompt with explicit user feedback
+            prompt = f"{prompt}\n\nUSER FEEDBACK / CORRECTION: {feedback}"
+
+            # A factual correction only invalidates the responses that made the claim
+            reuse = None
+            affected = [name for name in edit.get("affected_models") or [] if name in state["raw_responses"]]
+            if feedback_type in REGENERATE_AFFECTED and affected:
+                reuse = {name: text for name, text in state["raw_responses"].items() if name not in affected}
+            
+            # Loop back to Stage 1 (Re-run Cycle)
+            cycle_result = await self._run_cycle(prompt, updated_memory, reuse)
+            raw_responses = cycle_result["raw_responses"]
+            judge_result = cycle_result["judge_result"]
+            llm_calls += cycle_result["llm_calls"]
+            message = "Re-generated based on feedback." if not reuse else \
+                f"Re-generated {', '.join(affected)} based on feedback (other responses reused)."
+
+        calls_saved = full_cycle_calls - llm_calls
+        print(f"[Orchestrator] Feedback round ({feedback_type}): {llm_calls} LLM calls, {calls_saved} saved vs full regeneration.")
         
         # Update state with new results
-        self.current_state[workflow_id] = {
-            "prompt": refined_prompt,
-            "raw_responses": cycle_result["raw_responses"],
-            "judge_result": cycle_result["judge_result"],
-            "stage": "waiting_for_human",
-            "memory_context": updated_memory
-        }
+        updated = self.workflows.advance(
+            state, "waiting_for_human",
+            prompt=prompt,
+            raw_responses=raw_responses,
+            judge_result=judge_result,
+            memory_context=updated_memory,
+            llm_calls_saved=state.get("llm_calls_saved", 0) + calls_saved
+        )
+        if not updated:
+            return {"error": "Workflow expired or was removed during refinement"}
         
         # Return new draft to user
         return {
             "status": "waiting_for_human_verification",
             "workflow_id": workflow_id,
-            "draft_answer": cycle_result["judge_result"].get("corrected_answer"),
-            "critique": cycle_result["judge_result"].get("rationale"),
-            "model_scores": cycle_result["judge_result"].get("scores"),
-            "raw_responses": cycle_result["raw_responses"],
-            "full_judge_result": cycle_result["judge_result"],
-            "message": "Re-generated based on feedback."
+            "session_id": state["session_id"],
+            "draft_answer": judge_result.get("corrected_answer"),
+            "critique": judge_result.get("rationale"),
+            "model_scores": judge_result.get("scores"),
+            "raw_responses": raw_responses,
+            "full_judge_result": judge_result,
+            "feedback_type": feedback_type,
+            "llm_calls": {"used": llm_calls, "full_cycle": full_cycle_calls, "saved": calls_saved},
+            "message": message
         }
@@ -34,6 +34,8 @@ async def main():
         print(f"\nStatus: {status}")
         if msg:
             print(f"System Message: {msg}")
+        if result.get("llm_calls"):
+            print(f"LLM calls: {result['llm_calls']['used']} (saved {result['llm_calls']['saved']} vs full regeneration)")
         
         if status == "completed":
             print(f"Final Answer: {result.get('final_answer')}")
@@ -60,7 +62,7 @@ async def main():
         print("\n[Human Feedback Required]")
         print("Draft Answer is above.\n")
         
-        print("Enter feedback/corrections for the next cycle (or 'exit' to stop): ", end="")
+        print("Enter feedback/corrections for the next cycle ([ENTER] to approve, 'exit' to stop): ", end="")
         feedback = input().strip()
         
         if feedback.lower() == 'exit':
@@ -69,10 +71,11 @@ async def main():
             
         feedback_payload = {
             "workflow_id": workflow_id,
-            "feedback": feedback
+            "feedback": feedback,
+            "approved": not feedback
         }
         
-        print("\nProcessing feedback... (this triggers re-generation)")
+        print("\nProcessing feedback... (editor pass; re-generation only for factual corrections or new topics)")
         result = await orchestrator.process_human_feedback(workflow_id, feedback_payload)
 
 if __name__ == "__main__":
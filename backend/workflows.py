@@ -0,0 +1,206 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+# Pending human reviews of the backend pipeline. WORKFLOW_STORE=sqlite keeps
+# them in WORKFLOW_DB, so they survive restarts and any worker process can
+# resume them; "memory" keeps them in-process. Workflows untouched for
+# WORKFLOW_TTL seconds expire, and beyond WORKFLOW_MAX the least recently
+# updated ones are dropped.
+WORKFLOW_STORE = os.getenv("WORKFLOW_STORE", "memory")
+WORKFLOW_DB = Path(os.getenv("WORKFLOW_DB", Path(__file__).resolve().parent / "workflows.db"))
+WORKFLOW_TTL = float(os.getenv("WORKFLOW_TTL", "86400"))
+WORKFLOW_MAX = int(os.getenv("WORKFLOW_MAX", "10000"))
+SWEEP_INTERVAL = 60   # seconds between expiry sweeps
+
+# Stage machine: stage -> stages it may move to
+STAGES = {
+    "generating": {"waiting_for_human", "failed"},
+    "waiting_for_human": {"refining", "completed"},
+    "refining": {"waiting_for_human"},   # back to review on success or failure
+    "completed": set(),
+    "failed": set(),
+}
+
+
+class InMemoryWorkflowBackend:
+    def __init__(self):
+        self._workflows = OrderedDict()   # id -> workflow, least recently updated first
+        self._lock = threading.Lock()
+
+    def load(self, workflow_id: str):
+        with self._lock:
+            workflow = self._workflows.get(workflow_id)
+            return json.loads(json.dumps(workflow)) if workflow else None
+
+    def insert(self, workflow: dict):
+        with self._lock:
+            self._workflows[workflow["id"]] = json.loads(json.dumps(workflow))
+
+    def replace(self, workflow: dict, expected_stage: str) -> bool:
+        """Stores `workflow` only if the stored copy is still in expected_stage."""
+        with self._lock:
+            current = self._workflows.get(workflow["id"])
+            if not current or current["stage"] != expected_stage:
+                return False
+            self._workflows[workflow["id"]] = json.loads(json.dumps(workflow))
+            self._workflows.move_to_end(workflow["id"])
+            return True
+
+    def delete(self, workflow_id: str):
+        with self._lock:
+            self._workflows.pop(workflow_id, None)
+
+    def expire(self, before: float) -> int:
+        with self._lock:
+            stale = [key for key, w in self._workflows.items() if w["updated_at"] < before]
+            for key in stale:
+                del self._workflows[key]
+            return len(stale)
+
+    def trim(self, keep: int) -> int:
+        with self._lock:
+            dropped = max(len(self._workflows) - keep, 0)
+            for _ in range(dropped):
+                self._workflows.popitem(last=False)
+            return dropped
+
+    def count_by_stage(self) -> dict:
+        with self._lock:
+            counts = {}
+            for w in self._workflows.values():
+                counts[w["stage"]] = counts.get(w["stage"], 0) + 1
+            return counts
+
+
+class SQLiteWorkflowBackend:
+    """Workflows as JSON rows in stdlib sqlite3 (WAL), shared by worker processes."""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS workflows (
+        id TEXT PRIMARY KEY,
+        session_id TEXT,
+        stage TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_workflows_updated ON workflows(updated_at);
+    """
+
+    def __init__(self, db_file: Path = WORKFLOW_DB):
+        self.db_file = Path(db_file)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_file), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def load(self, workflow_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM workflows WHERE id = ?", (workflow_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def insert(self, workflow: dict):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO workflows (id, session_id, stage, updated_at, data) VALUES (?, ?, ?, ?, ?)",
+                               (workflow["id"], workflow.get("session_id"), workflow["stage"],
+                                workflow["updated_at"], json.dumps(workflow, ensure_ascii=False)))
+
+    def replace(self, workflow: dict, expected_stage: str) -> bool:
+        # Compare-and-set on the stage: of two workers resuming the same workflow, one wins
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE workflows SET stage = ?, updated_at = ?, data = ? WHERE id = ? AND stage = ?",
+                (workflow["stage"], workflow["updated_at"], json.dumps(workflow, ensure_ascii=False),
+                 workflow["id"], expected_stage))
+            return cursor.rowcount == 1
+
+    def delete(self, workflow_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM workflows WHERE id = ?", (workflow_id,))
+
+    def expire(self, before: float) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM workflows WHERE updated_at < ?", (before,)).rowcount
+
+    def trim(self, keep: int) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM workflows WHERE id IN "
+                "(SELECT id FROM workflows ORDER BY updated_at DESC LIMIT -1 OFFSET ?)", (keep,)).rowcount
+
+    def count_by_stage(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute("SELECT stage, COUNT(*) FROM workflows GROUP BY stage").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+BACKENDS = {"memory": InMemoryWorkflowBackend, "sqlite": SQLiteWorkflowBackend}
+
+
+class WorkflowStore:
+    """
+    Workflows with generated ids, an explicit stage machine (STAGES), idle
+    expiry and a size cap. Callers get copies; changes are written back with
+    advance(), which also guards against two requests resuming the same
+    workflow at once.
+    """
+    def __init__(self, backend=None, ttl: float = WORKFLOW_TTL, max_workflows: int = WORKFLOW_MAX):
+        self.backend = backend or BACKENDS[WORKFLOW_STORE]()
+        self.ttl = ttl
+        self.max_workflows = max_workflows
+        self._last_sweep = 0.0
+
+    def create(self, prompt: str, session_id: str = None, **state) -> dict:
+        self._sweep()
+        now = time.time()
+        workflow = {"id": uuid.uuid4().hex, "session_id": session_id or uuid.uuid4().hex, "stage": "generating",
+                    "prompt": prompt, "created_at": now, "updated_at": now, **state}
+        self.backend.insert(workflow)
+        return workflow
+
+    def get(self, workflow_id: str):
+        """The workflow, or None if unknown or expired."""
+        workflow = self.backend.load(workflow_id)
+        if workflow and self.ttl and time.time() - workflow["updated_at"] > self.ttl:
+            self.backend.delete(workflow_id)
+            return None
+        return workflow
+
+    def advance(self, workflow: dict, stage: str, **updates):
+        """
+        Moves `workflow` to `stage` with `updates` applied. Returns the new
+        state, or None if the workflow changed stage meanwhile (another request
+        got there first) or no longer exists.
+        """
+        if stage not in STAGES[workflow["stage"]]:
+            raise ValueError(f"Workflow {workflow['id']} cannot go from '{workflow['stage']}' to '{stage}'")
+        updated = {**workflow, **updates, "stage": stage, "updated_at": time.time()}
+        if not self.backend.replace(updated, expected_stage=workflow["stage"]):
+            return None
+        return updated
+
+    def delete(self, workflow_id: str):
+        self.backend.delete(workflow_id)
+
+    def _sweep(self):
+        now = time.time()
+        expired = 0
+        if self.ttl and now - self._last_sweep >= SWEEP_INTERVAL:
+            self._last_sweep = now
+            expired = self.backend.expire(now - self.ttl)
+        # One slot is kept free for the workflow being created
+        dropped = self.backend.trim(max(self.max_workflows - 1, 0)) if self.max_workflows else 0
+        if expired or dropped:
+            print(f"[Workflows] Expired {expired}, dropped {dropped} over the cap.")
+
+    def summary(self) -> dict:
+        counts = self.backend.count_by_stage()
+        return {"workflows": sum(counts.values()), "by_stage": counts}
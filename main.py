@@ -5,6 +5,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent / "router"))
 
 from router.orchestrator import process_query
+from router.feedback import ainput, review_in_terminal
 
 async def main():
     print("="*60)
@@ -14,7 +15,7 @@ async def main():
 
     while True:
         try:
-            user_input = input("User: ").strip()
+            user_input = (await ainput("User: ")).strip()
             if user_input.lower() in ["exit", "quit"]:
                 print("Goodbye!")
                 break
@@ -22,7 +23,7 @@ async def main():
             if not user_input:
                 continue
 
-            await process_query(user_input)
+            await review_in_terminal(process_query(user_input))
 
         except KeyboardInterrupt:
             print("\nExiting...")
@@ -0,0 +1,63 @@
+import json
+import threading
+from pathlib import Path
+
+from .storage import atomic_write_text, file_token
+
+
+class AliasMap:
+    """
+    Merged intent signatures: alias -> canonical, persisted as a small JSON
+    file next to the store. Chains are flattened on write, so resolve() is a
+    single dict lookup. With watch=True every resolve() first checks the
+    file's stat token and reloads when another process changed it.
+    """
+    def __init__(self, path: Path, watch: bool = False):
+        self.path = Path(path)
+        self.watch = watch
+        self._lock = threading.Lock()
+        self._aliases = {}
+        self._token = None
+        self.reload()
+
+    def reload(self):
+        with self._lock:
+            token = file_token(self.path)
+            if token == self._token:
+                return
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._aliases = json.load(f)
+            except FileNotFoundError:
+                self._aliases = {}
+            except Exception as e:
+                print(f"[Memory] Could not read aliases from {self.path.name}: {e}")
+            self._token = token
+
+    def resolve(self, signature: str) -> str:
+        if self.watch:
+            self.reload()
+        return self._aliases.get(signature, signature)
+
+    def add(self, alias: str, canonical: str):
+        """Points `alias` (and everything that pointed at it) at `canonical`."""
+        with self._lock:
+            canonical = self._aliases.get(canonical, canonical)
+            if alias == canonical:
+                return
+            self._aliases.pop(canonical, None)
+            for key, target in self._aliases.items():
+                if target == alias:
+                    self._aliases[key] = canonical
+            self._aliases[alias] = canonical
+            atomic_write_text(self.path, json.dumps(self._aliases, ensure_ascii=False, indent=2))
+            self._token = file_token(self.path)
+
+    def aliases_of(self, canonical: str) -> list:
+        return [alias for alias, target in self._aliases.items() if target == canonical]
+
+    def __contains__(self, signature: str):
+        return signature in self._aliases
+
+    def __len__(self):
+        return len(self._aliases)
@@ -0,0 +1,79 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .memory import memory
+
+# Memory hits are "adapted" to the new phrasing by a judge call. The result is
+# cached per (intent_signature, normalized query, record version), so asking
+# the same thing again costs nothing, and a new approved version can never be
+# served a stale adaptation.
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation and spacing differences don't make a new phrasing."""
+    return " ".join(_WORD_RE.findall(query.casefold()))
+
+
+class AdaptedAnswerCache:
+    def __init__(self, capacity: int = ANSWER_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries = OrderedDict()   # (signature, normalized query) -> (version, answer), LRU first
+        self._by_signature = {}         # signature -> set of normalized queries
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidated": 0}
+
+    @staticmethod
+    def _key(record: dict, query: str):
+        return record.get("intent"), normalize_query(query)
+
+    def get(self, record: dict, query: str):
+        """The cached answer for this phrasing of the record's current version, or None."""
+        key = self._key(record, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == record.get("version", 1):
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            if entry:
+                self._remove(key)   # written for an older version (e.g. saved by another process)
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, record: dict, query: str, answer: str):
+        key = self._key(record, query)
+        with self._lock:
+            self._entries[key] = (record.get("version", 1), answer)
+            self._entries.move_to_end(key)
+            self._by_signature.setdefault(key[0], set()).add(key[1])
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+
+    def remember_phrasing(self, record: dict, query: str):
+        """The question an answer was approved for gets that answer verbatim."""
+        self.put(record, query, record.get("approved_answer") or record.get("answer"))
+
+    def _remove(self, key):
+        del self._entries[key]
+        queries = self._by_signature.get(key[0])
+        if queries:
+            queries.discard(key[1])
+            if not queries:
+                del self._by_signature[key[0]]
+
+    def invalidate(self, signature: str, record: dict = None):
+        """Drops every cached phrasing of an intent (registered as a memory save listener)."""
+        with self._lock:
+            for query in self._by_signature.pop(signature, ()):
+                self._entries.pop((signature, query), None)
+                self.stats["invalidated"] += 1
+
+
+# Global instance
+answer_cache = AdaptedAnswerCache()
+memory.save_listeners.append(answer_cache.invalidate)
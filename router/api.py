@@ -0,0 +1,42 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from .orchestrator import process_query, submit_feedback
+from .sessions import sessions
+
+# HTTP front of the router engine; backend/main.py mounts it next to its own
+# endpoints. Drafts come back with a continuation token that the client posts
+# to /feedback, so no request ever waits for a human.
+router = APIRouter(prefix="/api/router")
+
+
+class RouterQueryRequest(BaseModel):
+    query: str
+    session_id: Optional[str] = None   # None starts a new session
+
+
+class RouterFeedbackRequest(BaseModel):
+    continuation: str
+    feedback: str = ""                 # empty approves the draft
+
+
+@router.post("/query")
+async def query(request: RouterQueryRequest):
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query is empty")
+    return await process_query(request.query, request.session_id)
+
+
+@router.post("/feedback")
+async def feedback(request: RouterFeedbackRequest):
+    result = await submit_feedback(request.continuation, request.feedback)
+    if result.get("error"):
+        raise HTTPException(status_code=404, detail=result["error"])
+    return result
+
+
+@router.get("/sessions")
+async def session_stats():
+    return sessions.summary()
@@ -0,0 +1,81 @@
+import sys
+# Windows console encoding fix
+sys.stdout.reconfigure(encoding='utf-8')
+
+import argparse
+import asyncio
+import random
+import time
+from pathlib import Path
+
+# Add parent dir to sys.path to allow imports if run directly
+sys.path.append(str(Path(__file__).parent.parent))
+
+from router.embeddings import EMBEDDING_BACKEND, EmbeddingService
+
+WORDS = ("cricket india captain batting python generator asyncio movie director sequel inflation "
+         "interest bond quantum gravity photon explain compare best worst history future").split()
+
+
+def make_texts(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))) + f" #{seed}-{i}" for i in range(n)]
+
+
+def bench_direct(service: EmbeddingService, n: int, batch_sizes: list):
+    """Calls the encoder directly with fixed batch sizes (no cache)."""
+    texts = make_texts(n, seed=1)
+    service.embedder.encode(texts[:8])   # warm up / load weights
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, n, batch_size):
+            service.embedder.encode(texts[i:i + batch_size])
+        rate = n / (time.perf_counter() - start)
+        print(f"  batch {batch_size:>4}: {rate:>10,.0f} texts/sec")
+
+
+async def bench_concurrent(service: EmbeddingService, n: int, concurrency: int):
+    """n single-text embed() calls, `concurrency` in flight at a time, merged by the micro-batcher."""
+    texts = make_texts(n, seed=2 + concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with semaphore:
+            await service.embed([text])
+
+    batches_before = service.stats["batches"]
+    start = time.perf_counter()
+    await asyncio.gather(*(one(text) for text in texts))
+    rate = n / (time.perf_counter() - start)
+    batches = service.stats["batches"] - batches_before
+    print(f"  {concurrency:>4} concurrent: {rate:>10,.0f} texts/sec  (avg batch {n / max(batches, 1):.1f})")
+    return texts
+
+
+async def bench_cached(service: EmbeddingService, texts: list):
+    start = time.perf_counter()
+    await service.embed(texts)
+    rate = len(texts) / (time.perf_counter() - start)
+    print(f"  cached:           {rate:>10,.0f} texts/sec")
+
+
+async def main(n: int, batch_sizes: list, concurrency: list, backend: str):
+    service = EmbeddingService(backend=backend, cache_size=max(10 * n, 10_000))
+    print(f"[Bench] Embedder: {service.embedder.name}")
+    print("Direct encode:")
+    bench_direct(service, n, batch_sizes)
+    print("embed() with micro-batching:")
+    texts = []
+    for level in concurrency:
+        texts = await bench_concurrent(service, n, level)
+    await bench_cached(service, texts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding throughput benchmark")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=["auto", "model", "hashing"])
+    args = parser.parse_args()
+    asyncio.run(main(args.texts, args.batch_sizes, args.concurrency, args.backend))
@@ -0,0 +1,161 @@
+import sys
+# Windows console encoding fix
+sys.stdout.reconfigure(encoding='utf-8')
+
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add parent dir to sys.path to allow imports if run directly
+sys.path.append(str(Path(__file__).parent.parent))
+
+from router.memory import MemoryStore
+from router.memory_sqlite import SQLiteMemoryStore
+
+DOMAINS = ["programming", "sports", "entertainment", "technology", "science"]
+TASKS = ["explanation", "code_generation", "comparison", "ranking_retrieval"]
+
+
+def make_record(i: int) -> dict:
+    domain = DOMAINS[i % len(DOMAINS)]
+    task = TASKS[i % len(TASKS)]
+    obj = f"object_{i}"
+    timestamp = datetime.now().isoformat()
+    return {
+        "intent": f"{domain}|{task}|{obj}",
+        "domain": domain,
+        "task": task,
+        "object": obj,
+        "approved_answer": f"Stored answer number {i}. " * 20,
+        "source": {"generated_by": ["Gemini", "ChatGPT", "Groq", "Ollama"], "judge": "Gemini_Judge",
+                   "human_verified": True, "auto_saved": False},
+        "confidence": 0.95,
+        "created_at": timestamp,
+        "last_used_at": timestamp,
+        "history_log": []
+    }
+
+
+def build_store_file(path: Path, size: int) -> list:
+    data = {}
+    for i in range(size):
+        record = make_record(i)
+        data[record["intent"]] = record
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    return list(data.keys())
+
+
+def bench_reads(store, keys: list, max_reads: int, max_seconds: float) -> float:
+    """Returns reads/sec over at most max_reads lookups or max_seconds."""
+    start = time.perf_counter()
+    done = 0
+    while done < max_reads:
+        store.get_intent_answer(keys[(done * 7919) % len(keys)])
+        done += 1
+        if time.perf_counter() - start > max_seconds:
+            break
+    return done / (time.perf_counter() - start)
+
+
+def bench_domain_queries(store, max_seconds: float) -> float:
+    """Returns get_intents_by_domain calls/sec."""
+    start = time.perf_counter()
+    done = 0
+    while time.perf_counter() - start < max_seconds:
+        store.get_intents_by_domain(DOMAINS[done % len(DOMAINS)])
+        done += 1
+    return done / (time.perf_counter() - start)
+
+
+def open_store(path: Path, storage: str, write_behind: bool):
+    if storage == "sqlite":
+        start = time.perf_counter()
+        store = SQLiteMemoryStore(db_file=path.with_suffix(".db"), migrate_from=path)
+        print(f"  (sqlite migration {time.perf_counter() - start:.1f} s)")
+        return store
+    return MemoryStore(memory_file=path, write_behind=write_behind, storage=storage)
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def cold_start_child(path: Path, storage: str, key: str):
+    """Runs in a fresh process: time to open the store and serve one lookup."""
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    store = open_store(path, storage, write_behind=True)
+    opened = time.perf_counter() - start
+    store.get_intent_answer(key)
+    first = time.perf_counter() - start
+    print(json.dumps({"open": opened, "first": first, "rss": peak_rss_mb() - baseline}))
+    store.close()
+
+
+def run_cold_start(sizes: list):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "memory_store.json"
+            print(f"\n[Bench] Cold start with {size} intents...")
+            keys = build_store_file(path, size)
+            for storage in ("json", "log", "binary", "sqlite"):
+                # First open converts/migrates; measure the second one.
+                for _ in range(2):
+                    out = subprocess.run([sys.executable, __file__, "--cold-start-child", str(path), storage, keys[size // 2]],
+                                         capture_output=True, text=True, check=True).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                print(f"  {storage:<8} open {result['open'] * 1000:>8,.0f} ms   first answer {result['first'] * 1000:>8,.0f} ms"
+                      f"   +{result['rss']:,.0f} MB peak RSS")
+
+
+def run(sizes: list, max_reads: int, max_seconds: float):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "memory_store.json"
+            print(f"\n[Bench] Building store with {size} intents...")
+            keys = build_store_file(path, size)
+
+            modes = [
+                ("json write-through", "json", False),
+                ("json write-behind", "json", True),
+                ("log write-through", "log", False),
+                ("log write-behind", "log", True),
+                ("binary write-behind", "binary", True),
+                ("sqlite", "sqlite", False),
+            ]
+            for label, storage, write_behind in modes:
+                store = open_store(path, storage, write_behind)
+                rate = bench_reads(store, keys, max_reads, max_seconds)
+                domain_rate = bench_domain_queries(store, min(max_seconds, 1.0))
+                start = time.perf_counter()
+                store.close()
+                close_ms = (time.perf_counter() - start) * 1000
+                print(f"  {label:<20} {rate:>12,.0f} reads/sec  {domain_rate:>8,.1f} domain queries/sec"
+                      f"   (close {close_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MemoryStore read benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--reads", type=int, default=100_000)
+    parser.add_argument("--seconds", type=float, default=5.0, help="time cap per mode")
+    parser.add_argument("--cold-start", action="store_true", help="measure startup time and RSS instead")
+    parser.add_argument("--cold-start-child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.cold_start_child:
+        path, storage, key = args.cold_start_child
+        cold_start_child(Path(path), storage, key)
+    elif args.cold_start:
+        run_cold_start(args.sizes)
+    else:
+        run(args.sizes, args.reads, args.seconds)
@@ -0,0 +1,77 @@
+import sys
+# Windows console encoding fix
+sys.stdout.reconfigure(encoding='utf-8')
+
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+# Add parent dir to sys.path to allow imports if run directly
+sys.path.append(str(Path(__file__).parent.parent))
+
+from router import judge, patching
+
+# Long answers with small, typical corrections: where patching should pay off.
+ESSAY = "\n".join(
+    [f"{i}. {era} era: conditions, constraints and achievements of Indian cricket, with key players and impact."
+     for i, era in enumerate(["Pre-independence", "Early Test", "Spin quartet", "1983 World Cup", "Tendulkar",
+                              "Ganguly", "Dhoni", "IPL", "Kohli", "Bumrah", "Future"], 1)]
+    + ["", "Summary: India's all-time XI balances eras, adjusting for pitches, equipment and competition."])
+
+CODE = '''```python
+import asyncio
+
+async def fetch(session, url):
+    async with session.get(url) as resp:
+        return await resp.text()
+
+async def main(urls):
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        results = []
+        for url in urls:
+            results.append(await fetch(session, url))
+        return results
+
+if __name__ == "__main__":
+    print(asyncio.run(main(["https://example.com"])))
+```
+This fetches each URL in turn and returns the page bodies.'''
+
+CASES = [
+    ("Best all-time Indian XI across eras?", ESSAY, "The 1983 World Cup was won at Lord's, mention that."),
+    ("Best all-time Indian XI across eras?", ESSAY, "Make the summary one sentence shorter."),
+    ("Fetch several URLs with asyncio", CODE, "Fetch the URLs concurrently with asyncio.gather."),
+    ("Fetch several URLs with asyncio", CODE, "Add a timeout of 10 seconds to the session."),
+]
+
+
+async def run_case(mode: str, query: str, draft: str, feedback: str):
+    patching.REFINE_PATCH_MODE = mode
+    start = time.perf_counter()
+    answer = await judge.review_correction(query, draft, feedback)
+    return time.perf_counter() - start, answer
+
+
+async def main(repeat: int):
+    print(f"{'case':<6}{'mode':<8}{'ms p50':>10}")
+    for mode in ("off", "on"):
+        for i, (query, draft, feedback) in enumerate(CASES, 1):
+            timings = []
+            for _ in range(repeat):
+                seconds, _ = await run_case(mode, query, draft, feedback)
+                timings.append(seconds)
+            print(f"{i:<6}{'rewrite' if mode == 'off' else 'patch':<8}{statistics.median(timings) * 1000:>10.0f}")
+    print("\nOutput tokens and latency per path (failed_patch = patch attempts that fell back):")
+    for path, stats in patching.refine_stats.summary().items():
+        print(f"  {path:<13} calls={stats['calls']:<4} avg output tokens={stats['avg_output_tokens']:<8} "
+              f"avg ms={stats['avg_ms']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare patch-mode and full-rewrite refinement (needs GEMINI_API_KEY)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat))
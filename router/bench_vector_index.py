@@ -0,0 +1,131 @@
+import sys
+# Windows console encoding fix
+sys.stdout.reconfigure(encoding='utf-8')
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add parent dir to sys.path to allow imports if run directly
+sys.path.append(str(Path(__file__).parent.parent))
+
+from router.vector_index import NumpyIndex, normalize, top_k
+
+DIM = 384
+K = 10
+INSERT_BATCH = 50_000
+DOMAINS = 10   # rows are spread over this many domains; the filtered search keeps one
+
+
+def make_data(n: int, queries: int, seed: int = 0):
+    """Clustered unit vectors (like topic embeddings) plus queries near random rows."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal(size=(max(n // 500, 8), DIM), dtype=np.float32)
+    data = np.empty((n, DIM), dtype=np.float32)
+    for start in range(0, n, INSERT_BATCH):
+        end = min(start + INSERT_BATCH, n)
+        noise = rng.standard_normal(size=(end - start, DIM), dtype=np.float32)
+        data[start:end] = normalize(centers[rng.integers(len(centers), size=end - start)] + 0.6 * noise)
+    probes = data[rng.integers(n, size=queries)] + 0.3 * rng.normal(size=(queries, DIM)).astype(np.float32)
+    return data, normalize(probes)
+
+
+def exact_top_k(data: np.ndarray, probes: np.ndarray) -> np.ndarray:
+    ids = []
+    for start in range(0, len(probes), 64):
+        ids.append(top_k(probes[start:start + 64] @ data.T, K)[0])
+    return np.concatenate(ids)
+
+
+def recall(found: list, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / K for f, t in zip(found, truth)]))
+
+
+def bench_numpy(data: np.ndarray, probes: np.ndarray, truth: np.ndarray, int8: bool):
+    """Returns (p50 ms single query, ms/query batched, p50 ms filtered to one domain, recall@K)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = NumpyIndex(Path(tmp), dim=DIM, int8=int8)
+        for start in range(0, len(data), INSERT_BATCH):
+            chunk = data[start:start + INSERT_BATCH]
+            index.insert(chunk, [""] * len(chunk),
+                         [{"domain": f"d{i % DOMAINS}"} for i in range(start, start + len(chunk))])
+        latencies, found = [], []
+        for probe in probes:
+            start = time.perf_counter()
+            ids, _ = index.search_ids([probe], K)
+            latencies.append(time.perf_counter() - start)
+            found.append(ids[0].tolist())
+        start = time.perf_counter()
+        index.search_ids(probes, K)
+        batched = (time.perf_counter() - start) / len(probes)
+        filtered = []
+        for probe in probes:
+            start = time.perf_counter()
+            index.search_ids([probe], K, where={"domain": "d0"})
+            filtered.append(time.perf_counter() - start)
+        del index
+    return np.median(latencies) * 1000, batched * 1000, np.median(filtered) * 1000, recall(found, truth)
+
+
+def bench_milvus(data: np.ndarray, probes: np.ndarray, truth: np.ndarray):
+    """The index and default search params VectorStore picks for this size. Needs a running Milvus."""
+    from pymilvus import connections, utility, Collection, CollectionSchema, FieldSchema, DataType
+    from router.vector_store import MILVUS_HOST, MILVUS_PORT, choose_index, default_search_params
+    connections.connect("default", host=MILVUS_HOST, port=MILVUS_PORT)
+    name = "bench_vector_index"
+    if utility.has_collection(name):
+        utility.drop_collection(name)
+    schema = CollectionSchema([
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=DIM),
+    ])
+    collection = Collection(name, schema)
+    try:
+        for start in range(0, len(data), INSERT_BATCH):
+            chunk = data[start:start + INSERT_BATCH]
+            collection.insert([list(range(start, start + len(chunk))), chunk.tolist()])
+        collection.flush()
+        index = choose_index(len(data))
+        collection.create_index("embedding", index)
+        collection.load()
+        params = {"metric_type": "COSINE", "params": default_search_params(index, K)}
+        latencies, found = [], []
+        for probe in probes:
+            start = time.perf_counter()
+            hits = collection.search([probe.tolist()], "embedding", params, limit=K)
+            latencies.append(time.perf_counter() - start)
+            found.append([hit.id for hit in hits[0]])
+        start = time.perf_counter()
+        collection.search(probes.tolist(), "embedding", params, limit=K)
+        batched = (time.perf_counter() - start) / len(probes)
+        return np.median(latencies) * 1000, batched * 1000, float("nan"), recall(found, truth)
+    finally:
+        utility.drop_collection(name)
+
+
+def run(sizes: list, queries: int, milvus: bool):
+    print(f"{'vectors':>9}  {'backend':<22} {'p50 ms':>8} {'batch ms/q':>10} {'filter ms':>9} {'recall@10':>10}")
+    for n in sizes:
+        data, probes = make_data(n, queries)
+        truth = exact_top_k(data, probes)
+        rows = [("numpy float32", *bench_numpy(data, probes, truth, int8=False)),
+                ("numpy int8", *bench_numpy(data, probes, truth, int8=True))]
+        if milvus:
+            try:
+                rows.append(("milvus (auto index)", *bench_milvus(data, probes, truth)))
+            except Exception as e:
+                print(f"  (milvus skipped: {e})")
+        for label, latency, batched, filtered, rec in rows:
+            print(f"{n:>9,}  {label:<22} {latency:>8.2f} {batched:>10.3f} {filtered:>9.2f} {rec:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector index latency/recall benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--no-milvus", action="store_true", help="skip the Milvus comparison")
+    args = parser.parse_args()
+    run(args.sizes, args.queries, not args.no_milvus)
@@ -0,0 +1,167 @@
+import sys
+# Windows console encoding fix
+sys.stdout.reconfigure(encoding='utf-8')
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Add parent dir to sys.path to allow imports if run directly
+sys.path.append(str(Path(__file__).parent.parent))
+
+from router.embeddings import embedding_service
+from router.memory import memory
+from router.vector_index import normalize
+
+# Near-duplicate intents ("parity_check" vs "check_odd_even") are found by
+# embedding each intent together with its answer and linking pairs in the
+# same domain whose cosine similarity reaches CONSOLIDATE_THRESHOLD.
+CONSOLIDATE_THRESHOLD = float(os.getenv("CONSOLIDATE_THRESHOLD", "0.9"))
+STATE_FILE = Path(__file__).resolve().parent / "consolidate_state.npz"
+PROPOSALS_FILE = Path(__file__).resolve().parent / "consolidate_proposals.json"
+ANSWER_CHARS = 1500   # answer prefix that goes into the embedding
+
+
+def intent_text(key: str, record: dict) -> str:
+    answer = record.get("approved_answer") or record.get("answer") or ""
+    return f"{key.replace('_', ' ')}\n{answer[:ANSWER_CHARS]}"
+
+
+def load_state(path: Path = STATE_FILE) -> dict:
+    """{signature: (version, vector, checked)} from the previous run."""
+    if not path.exists():
+        return {}
+    data = np.load(path)
+    return {key: (int(version), vector, bool(checked))
+            for key, version, vector, checked in zip(data["keys"], data["versions"], data["vectors"], data["checked"])}
+
+
+def save_state(state: dict, path: Path = STATE_FILE):
+    keys = list(state)
+    # An empty store has no vectors to infer the width from (reshape(0, -1) is ambiguous)
+    vectors = (np.array([state[k][1] for k in keys], dtype=np.float32).reshape(len(keys), -1) if keys
+               else np.zeros((0, 0), dtype=np.float32))
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp, keys=np.array(keys, dtype=str),
+             versions=np.array([state[k][0] for k in keys], dtype=np.int64),
+             vectors=vectors,
+             checked=np.array([state[k][2] for k in keys], dtype=bool))
+    tmp.replace(path)
+
+
+def canonical_rank(key: str, record: dict):
+    """Sort key: the intent that survives a merge comes first."""
+    source = record.get("source") or {}
+    return (not source.get("human_verified", False), -record.get("use_count", 0),
+            -(record.get("confidence") or 0), record.get("created_at") or "", key)
+
+
+def _find(parent: dict, key: str) -> str:
+    while parent[key] != key:
+        parent[key] = parent[parent[key]]
+        key = parent[key]
+    return key
+
+
+def find_duplicates(records: dict, state: dict, threshold: float, full: bool) -> list:
+    """
+    Clusters near-duplicates per domain. Only pairs that involve a record that
+    is new or changed since the last applied run are compared (all pairs with
+    full=True). Returns [{"domain", "canonical", "aliases": [{"key", "score"}]}].
+    """
+    by_domain = {}
+    for key, record in records.items():
+        by_domain.setdefault(record.get("domain", "general"), []).append(key)
+
+    proposals = []
+    for domain, keys in sorted(by_domain.items()):
+        if len(keys) < 2:
+            continue
+        matrix = normalize([state[k][1] for k in keys])
+        dirty = [i for i, k in enumerate(keys) if full or not state[k][2]]
+        if not dirty:
+            continue
+        scores = matrix[dirty] @ matrix.T
+        parent = {k: k for k in keys}
+        for row, i in enumerate(dirty):
+            for j in np.flatnonzero(scores[row] >= threshold):
+                if j != i:
+                    parent[_find(parent, keys[i])] = _find(parent, keys[j])
+
+        clusters = {}
+        for key in keys:
+            clusters.setdefault(_find(parent, key), []).append(key)
+        position = {k: i for i, k in enumerate(keys)}
+        for members in clusters.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda k: canonical_rank(k, records[k]))
+            canonical = members[0]
+            # Chained links can pull in loosely related intents; each alias must match the canonical directly.
+            similarity = matrix[[position[k] for k in members[1:]]] @ matrix[position[canonical]]
+            aliases = [{"key": k, "score": round(float(s), 4)} for k, s in zip(members[1:], similarity) if s >= threshold]
+            if aliases:
+                proposals.append({"domain": domain, "canonical": canonical, "aliases": aliases})
+    return proposals
+
+
+def run(threshold: float, apply: bool, full: bool):
+    if apply and not getattr(memory, "owns_store", True):
+        print("[Consolidate] Another process is using the memory store; stop the app (or run every process "
+              "with MEMORY_SHARED=1) before --apply, or it will write the merged intents back.")
+        return []
+    keys = memory.list_intents()
+    records = {key: memory.peek_intent_answer(key) for key in keys}
+    records = {key: record for key, record in records.items() if record}
+
+    previous = load_state()
+    state, stale = {}, []
+    for key, record in records.items():
+        version = record.get("version", 1)
+        cached = previous.get(key)
+        if cached and cached[0] == version:
+            state[key] = cached
+        else:
+            stale.append(key)
+    if stale:
+        print(f"[Consolidate] Embedding {len(stale)} new or changed intents ({len(state)} unchanged)...")
+        vectors = embedding_service.embed_sync([intent_text(k, records[k]) for k in stale])
+        for key, vector in zip(stale, vectors):
+            state[key] = (records[key].get("version", 1), np.asarray(vector, dtype=np.float32), False)
+
+    proposals = find_duplicates(records, state, threshold, full)
+    for proposal in proposals:
+        aliases = ", ".join(f"{a['key']} ({a['score']:.3f})" for a in proposal["aliases"])
+        print(f"[{proposal['domain']}] {proposal['canonical']} <- {aliases}")
+    print(f"[Consolidate] {len(proposals)} clusters, {sum(len(p['aliases']) for p in proposals)} merge candidates.")
+
+    if not apply:
+        with open(PROPOSALS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(proposals, f, ensure_ascii=False, indent=2)
+        print(f"[Consolidate] Proposals written to {PROPOSALS_FILE.name}; re-run with --apply to merge.")
+        # Cache the embeddings, but leave records unchecked until the merges are applied
+        save_state(state)
+        return proposals
+
+    for proposal in proposals:
+        for alias in proposal["aliases"]:
+            if memory.merge_intents(alias["key"], proposal["canonical"]):
+                state.pop(alias["key"], None)
+    # Merging doesn't bump versions, so everything left is now checked
+    state = {key: (version, vector, True) for key, (version, vector, _) in state.items()}
+    save_state(state)
+    memory.flush()
+    print(f"[Consolidate] Applied. {len(memory.aliases)} aliases in total.")
+    return proposals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find and merge near-duplicate intents per domain")
+    parser.add_argument("--threshold", type=float, default=CONSOLIDATE_THRESHOLD)
+    parser.add_argument("--apply", action="store_true", help="merge the proposals (default: only report them)")
+    parser.add_argument("--full", action="store_true", help="compare every pair, not only records changed since the last --apply")
+    args = parser.parse_args()
+    run(args.threshold, args.apply, args.full)
@@ -1,51 +1,272 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+# History compaction: the newest CONTEXT_RECENT_TURNS turns are always kept
+# verbatim; older turns are folded into a running summary (written by an LLM
+# call in a background thread) so the formatted context stays within
+# CONTEXT_TOKEN_BUDGET. CONTEXT_SUMMARIZE=0 folds them into short excerpts instead.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", "2"))
+CONTEXT_SUMMARIZE = os.getenv("CONTEXT_SUMMARIZE", "1") == "1"
+EXCERPT_CHARS = 160   # per folded message while (or instead of) summarizing
+
+# Entities kept for implicit references ("that movie"). With ENTITY_TRACE_DECAY
+# in (0, 1) an unfiltered reference goes to the domain mentioned most (each
+# older mention counts DECAY times less) instead of simply the last entity.
+ENTITY_TRACE_SIZE = int(os.getenv("ENTITY_TRACE_SIZE", "200"))
+ENTITY_TRACE_DECAY = float(os.getenv("ENTITY_TRACE_DECAY", "0"))
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a USER and an AI.
+Keep facts, names, decisions, open questions and what each answer concluded. Drop
+pleasantries and formatting. At most {words} words.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{messages}
+
+Return only the updated summary."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt cost (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _format_message(msg: dict, max_chars: int = None) -> str:
+    role = "AI" if msg["role"] == "assistant" else "USER"
+    content = msg["content"]
+    if max_chars is not None and len(content) > max_chars:
+        content = content[:max(max_chars - 3, 0)] + "..."
+    return f"{role}: {content}\n"
+
+
+async def summarize_with_llm(summary: str, messages: list, max_tokens: int) -> str:
+    from .llm_generators import generate_gemini
+    prompt = SUMMARY_PROMPT.format(words=max(max_tokens * 3 // 4, 20), summary=summary or "(empty)",
+                                   messages="".join(_format_message(m) for m in messages))
+    result = await generate_gemini(prompt, "You compress conversation history.")
+    if result.startswith("Error"):
+        raise RuntimeError(result)
+    return result.strip()
+
 
 class ContextManager:
-    def __init__(self, max_turns=10):
-        self.history = []
+    def __init__(self, max_turns=10, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 recent_turns: int = CONTEXT_RECENT_TURNS, summarize: bool = CONTEXT_SUMMARIZE,
+                 summarizer=summarize_with_llm):
+        self.history = []           # verbatim messages
         self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summary_budget = token_budget // 3
+        self.summarizer = summarizer if summarize else None
+        self.summary = ""           # older turns, compressed
+        self._pending = []          # folded out of history, not yet in the summary
+        self._summarizing = False
+        self._formatted = None      # cached get_context_formatted() result
+        self._generation = 0        # bumped by clear() so a late summary is discarded
+        self._lock = threading.RLock()
+
+    def _history_tokens(self) -> int:
+        return sum(estimate_tokens(_format_message(m)) for m in self.history)
 
     def add_turn(self, role: str, content: str):
-        self.history.append({"role": role, "content": content})
-        if len(self.history) > self.max_turns * 2: # 2 messages per turn
-            self.history = self.history[-self.max_turns*2:]
+        with self._lock:
+            self.history.append({"role": role, "content": content})
+        self._compact()
+
+    def _compact(self):
+        """Folds the oldest messages out of the verbatim window while it is over budget."""
+        with self._lock:
+            keep = self.recent_turns * 2   # 2 messages per turn
+            while len(self.history) > keep and (
+                    len(self.history) > self.max_turns * 2 or
+                    self._history_tokens() + estimate_tokens(self.summary) > self.token_budget):
+                self._pending.append(self.history.pop(0))
+            self._formatted = None
+            start = self._pending and not self._summarizing
+            if start:
+                self._summarizing = bool(self.summarizer)
+        if start:
+            if self.summarizer:
+                # Own thread + loop: the CLI's per-query event loop is gone by the time this finishes
+                threading.Thread(target=asyncio.run, args=(self._summarize_pending(),),
+                                 name="context-summarizer", daemon=True).start()
+            else:
+                self._fold_excerpts()
+
+    def _fold_excerpts(self, batch: list = None):
+        """Cheap fallback: folded messages become short excerpts appended to the summary."""
+        with self._lock:
+            batch = list(self._pending) if batch is None else batch
+            text = (self.summary + " " if self.summary else "") + " ".join(
+                _format_message(m, EXCERPT_CHARS).strip() for m in batch)
+            # Keep the most recent part when over budget
+            self.summary = text[-self.summary_budget * 4:]
+            del self._pending[:len(batch)]
+            self._formatted = None
+
+    async def _summarize_pending(self):
+        while True:
+            with self._lock:
+                batch = list(self._pending)
+                summary = self.summary
+                generation = self._generation
+                if not batch:
+                    self._summarizing = False
+                    return
+            try:
+                new_summary = await self.summarizer(summary, batch, self.summary_budget)
+                with self._lock:
+                    if generation != self._generation:
+                        continue
+                    self.summary = new_summary[:self.summary_budget * 4]
+                    del self._pending[:len(batch)]
+                    self._formatted = None
+            except Exception as e:
+                print(f"[Context] Summarization failed ({e}); keeping excerpts instead.")
+                with self._lock:
+                    if generation == self._generation:
+                        self._fold_excerpts(batch)
 
     def get_context_formatted(self) -> str:
-        """Returns history formatted for the LLM prompt."""
-        formatted = ""
-        for msg in self.history:
-            role = "AI" if msg["role"] == "assistant" else "USER"
-            formatted += f"{role}: {msg['content']}\n"
-        return formatted
+        """Returns history formatted for the LLM prompt, within the token budget."""
+        with self._lock:
+            if self._formatted is not None:
+                return self._formatted
+            remaining = self.token_budget
+            # Newest first: recent turns get the budget before anything older
+            recent = []
+            for msg in reversed(self.history):
+                line = _format_message(msg)
+                if estimate_tokens(line) > remaining:
+                    if remaining <= 16:
+                        break
+                    line = _format_message(msg, remaining * 4 - 16)   # clip a huge answer
+                recent.append(line)
+                remaining -= estimate_tokens(line)
+            # Still being summarized: short excerpts meanwhile
+            excerpts = []
+            for msg in reversed(self._pending):
+                line = _format_message(msg, EXCERPT_CHARS)
+                if estimate_tokens(line) > remaining:
+                    break
+                excerpts.append(line)
+                remaining -= estimate_tokens(line)
+            parts = []
+            if self.summary and remaining > 16:
+                parts.append(f"SUMMARY OF EARLIER CONVERSATION: {self.summary[-(remaining - 16) * 4:]}\n")
+            parts.extend(reversed(excerpts))
+            parts.extend(reversed(recent))
+            self._formatted = "".join(parts)
+            return self._formatted
 
     def get_history(self) -> list:
         return self.history
 
+    def size_chars(self) -> int:
+        """Approximate footprint, for session memory accounting."""
+        with self._lock:
+            return len(self.summary) + sum(len(m["content"]) for m in self.history + self._pending)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"history": list(self.history), "summary": self.summary, "pending": list(self._pending)}
+
+    def load_dict(self, data: dict):
+        """Restores state saved by to_dict(); turns that were awaiting a summary are folded again."""
+        with self._lock:
+            self.history = list(data.get("pending", [])) + list(data.get("history", []))
+            self.summary = data.get("summary", "")
+            self._pending = []
+            self._formatted = None
+            self._generation += 1
+        self._compact()
+
     def clear(self):
-        self.history = []
+        with self._lock:
+            self.history = []
+            self.summary = ""
+            self._pending = []
+            self._formatted = None
+            self._generation += 1
 
 class EntityTraceMemory:
     """
     Medium-term memory for tracking recently mentioned entities.
     Survives topic switches to allow 'skip-back' references.
+    Entities are keyed by case-folded name in recency order, with a per-domain
+    index, so adding and resolving are O(1) whatever the capacity.
     """
-    def __init__(self, max_size=5):
-        self.entities = [] # List of dicts: {name, type, domain}
+    def __init__(self, max_size: int = ENTITY_TRACE_SIZE, decay: float = ENTITY_TRACE_DECAY):
         self.max_size = max_size
+        self.decay = decay
+        self._entities = OrderedDict()   # casefolded name -> {name, type, domain}, most recent last
+        self._by_domain = {}             # domain -> OrderedDict of casefolded names, most recent last
+        self._domain_weight = {}         # domain -> (weight, tick of last update)
+        self._tick = 0
 
     def add_entity(self, name: str, type: str, domain: str):
         # Avoid duplicates, move to top if exists
-        self.entities = [e for e in self.entities if e['name'].lower() != name.lower()]
-        self.entities.insert(0, {"name": name, "type": type, "domain": domain})
-        if len(self.entities) > self.max_size:
-            self.entities = self.entities[:self.max_size]
+        key = name.casefold()
+        self._unlink(key)
+        self._entities[key] = {"name": name, "type": type, "domain": domain}
+        self._by_domain.setdefault(domain, OrderedDict())[key] = None
+        self._tick += 1
+        weight, tick = self._domain_weight.get(domain, (0.0, self._tick))
+        self._domain_weight[domain] = (weight * self.decay ** (self._tick - tick) + 1, self._tick)
+        while len(self._entities) > self.max_size:
+            self._unlink(next(iter(self._entities)))
+
+    def _unlink(self, key: str):
+        entity = self._entities.pop(key, None)
+        if entity is None:
+            return
+        keys = self._by_domain[entity["domain"]]
+        del keys[key]
+        if not keys:
+            del self._by_domain[entity["domain"]]
+            self._domain_weight.pop(entity["domain"], None)
+
+    @property
+    def entities(self) -> list:
+        """Most recent first."""
+        return list(reversed(self._entities.values()))
 
     def get_recent_entities(self):
         return self.entities
 
+    def to_dict(self) -> dict:
+        return {"entities": self.entities}
+
+    def load_dict(self, data: dict):
+        self._entities.clear()
+        self._by_domain.clear()
+        self._domain_weight.clear()
+        self._tick = 0
+        for e in reversed(data.get("entities", [])):
+            self.add_entity(e["name"], e.get("type", "entity"), e.get("domain"))
+
+    def _domain_score(self, domain) -> float:
+        weight, tick = self._domain_weight[domain]
+        return weight * self.decay ** (self._tick - tick)
+
     def resolve_reference(self, domain_filter=None):
-        """Returns the most recent entity matching the filter."""
-        for e in self.entities:
-            if domain_filter and e['domain'] != domain_filter:
-                continue
-            return e
-        return None
+        """
+        Returns the most recent entity matching the filter. Without a filter and
+        with decay enabled, the most recent entity of the domain with the highest
+        decayed mention count wins (so one off-topic question doesn't hijack "that").
+        """
+        if domain_filter:
+            keys = self._by_domain.get(domain_filter)
+            return self._entities[next(reversed(keys))] if keys else None
+        if not self._entities:
+            return None
+        if self.decay and len(self._by_domain) > 1:
+            domain = max(self._by_domain, key=self._domain_score)
+            return self._entities[next(reversed(self._by_domain[domain]))]
+        return self._entities[next(reversed(self._entities))]
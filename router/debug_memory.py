@@ -25,6 +25,7 @@ except Exception as e:
     print(f"[Error] save_intent_answer failed: {e}")
 
 # 3. Verify file on disk
+memory.flush() # Write-behind: persist pending changes first
 print("\n[Action] Reading file from disk...")
 try:
     with open("memory_store.json", 'r') as f:
@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+# --- Configuration ---
+# "auto" uses the sentence-transformers model when it is installed and its weights
+# load, otherwise the hashing vectorizer; "model" / "hashing" force one of them.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "auto")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_DIM = 384   # matches the Milvus collection (all-MiniLM-L6-v2 output size)
+
+# Concurrent embed() calls are merged into batches of up to EMBED_BATCH_SIZE texts:
+# requests that queue up while a batch is encoding form the next batch. A non-zero
+# EMBED_BATCH_WAIT_MS additionally holds a batch open that long for late arrivals.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "0"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic fallback: signed feature hashing of words and character
+    trigrams into EMBEDDING_DIM buckets, L2-normalized. Needs no weights and
+    gives the same vector for the same text in every process.
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _add(self, vector: list, feature: str, weight: float):
+        h = zlib.crc32(feature.encode('utf-8'))
+        vector[h % self.dim] += weight if (h >> 31) & 1 else -weight
+
+    def encode(self, texts: list) -> list:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dim
+            for word in _WORD_RE.findall(text.casefold()):
+                self._add(vector, word, 1.0)
+                padded = f"#{word}#"
+                for i in range(len(padded) - 2):
+                    self._add(vector, padded[i:i + 3], 0.5)
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+
+class ModelEmbedder:
+    """Small local CPU model via sentence-transformers (normalized output)."""
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: list) -> list:
+        return self.model.encode(texts, batch_size=len(texts), normalize_embeddings=True,
+                                 show_progress_bar=False).tolist()
+
+
+def load_embedder(backend: str = EMBEDDING_BACKEND):
+    if backend in ("auto", "model"):
+        try:
+            embedder = ModelEmbedder()
+            if embedder.dim != EMBEDDING_DIM:
+                raise ValueError(f"model dimension {embedder.dim} != {EMBEDDING_DIM}")
+            print(f"[Embeddings] Using model '{embedder.name}'")
+            return embedder
+        except Exception as e:
+            if backend == "model":
+                raise
+            print(f"[Embeddings] Model unavailable ({e}); using hashing vectorizer")
+    return HashingEmbedder()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingService:
+    """
+    Embeds texts with micro-batching and an LRU cache keyed by text hash.
+    The embedder is loaded on first use; encoding runs in a worker thread so
+    the event loop stays responsive.
+    """
+    def __init__(self, backend: str = EMBEDDING_BACKEND, batch_size: int = EMBED_BATCH_SIZE,
+                 batch_wait_ms: float = EMBED_BATCH_WAIT_MS, cache_size: int = EMBED_CACHE_SIZE):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.cache_size = cache_size
+        self._embedder = None
+        self._embedder_lock = threading.Lock()
+        self._cache = OrderedDict()   # text_key -> vector, least recently used first
+        self._cache_lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self.stats = {"texts": 0, "cache_hits": 0, "batches": 0, "encoded": 0}
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            with self._embedder_lock:
+                if self._embedder is None:
+                    self._embedder = load_embedder(self.backend)
+        return self._embedder
+
+    def _cache_get(self, key: str):
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+
+    def _cache_put(self, key: str, vector: list):
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _encode(self, texts: list) -> list:
+        vectors = self.embedder.encode(texts)
+        for text, vector in zip(texts, vectors):
+            self._cache_put(text_key(text), vector)
+        self.stats["batches"] += 1
+        self.stats["encoded"] += len(texts)
+        return vectors
+
+    def embed_sync(self, texts: list) -> list:
+        """Blocking variant for scripts and offline jobs."""
+        results, misses = self._lookup(texts)
+        pending = list(misses)
+        for start in range(0, len(pending), self.batch_size):
+            chunk = pending[start:start + self.batch_size]
+            for text, vector in zip(chunk, self._encode(chunk)):
+                for i in misses[text]:
+                    results[i] = vector
+        return results
+
+    def _lookup(self, texts: list):
+        """Returns (results with cache hits filled in, {missing text: [positions]})."""
+        self.stats["texts"] += len(texts)
+        results, misses = [None] * len(texts), {}
+        for i, text in enumerate(texts):
+            vector = self._cache_get(text_key(text))
+            if vector is not None:
+                results[i] = vector
+                self.stats["cache_hits"] += 1
+            else:
+                misses.setdefault(text, []).append(i)
+        return results, misses
+
+    async def embed(self, texts: list) -> list:
+        """Returns one vector per text. Concurrent callers share encoder batches."""
+        results, misses = self._lookup(texts)
+        if misses:
+            self._ensure_worker()
+            loop = asyncio.get_running_loop()
+            futures = {}
+            for text in misses:
+                futures[text] = loop.create_future()
+                self._queue.put_nowait((text, futures[text]))
+            for text, future in futures.items():
+                vector = await future
+                for i in misses[text]:
+                    results[i] = vector
+        return results
+
+    def _ensure_worker(self):
+        # asyncio.run() creates a fresh loop per query, so the batcher follows the running loop.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._batch_worker(self._queue))
+
+    async def _batch_worker(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, await asyncio.to_thread(self._encode, texts)))
+            except Exception as e:
+                print(f"[Embeddings] Encode failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(vectors[text])
+
+
+# Global instance
+embedding_service = EmbeddingService()
+
+
+async def embed(texts: list) -> list:
+    return await embedding_service.embed(texts)
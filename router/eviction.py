@@ -0,0 +1,181 @@
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# Capacity policy for the intent memory. MEMORY_CAPACITY=0 means unbounded.
+MEMORY_CAPACITY = int(os.getenv("MEMORY_CAPACITY", "0"))
+EVICTION_POLICY = os.getenv("MEMORY_EVICTION_POLICY", "score")     # lru | lfu | score
+EVICTION_MODE = os.getenv("MEMORY_EVICTION_MODE", "archive")        # archive | drop
+# Per-domain TTLs in days, e.g. "news=1,sports=30". Domains not listed never expire.
+MEMORY_TTL_DAYS = os.getenv("MEMORY_TTL_DAYS", "")
+
+# ScorePolicy treats answers below this confidence as low value.
+LOW_CONFIDENCE = 0.9
+
+
+def parse_ttls(spec: str) -> dict:
+    ttls = {}
+    for part in spec.split(","):
+        if "=" in part:
+            domain, days = part.split("=", 1)
+            ttls[domain.strip()] = float(days)
+    return ttls
+
+
+class LRUPolicy:
+    """Evicts the least recently used intent."""
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def admit(self, key: str, record: dict):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def touch(self, key: str, record: dict):
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def remove(self, key: str):
+        self._order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self._order), None)
+
+
+class LFUPolicy:
+    """
+    Evicts the least frequently used intent (ties broken by recency), using
+    frequency buckets so every operation is O(1) amortized.
+    """
+    def __init__(self):
+        self._freq = {}
+        self._buckets = {}   # use count -> OrderedDict of keys, oldest first
+        self._min_freq = None
+
+    def _place(self, key: str, freq: int):
+        self._freq[key] = freq
+        self._buckets.setdefault(freq, OrderedDict())[key] = None
+        # None means unknown (lower buckets may still exist); victim() recomputes it
+        if self._min_freq is not None and freq < self._min_freq:
+            self._min_freq = freq
+
+    def _unplace(self, key: str):
+        freq = self._freq.pop(key)
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if freq == self._min_freq:
+                self._min_freq = None
+        return freq
+
+    def admit(self, key: str, record: dict):
+        if key in self._freq:
+            self._unplace(key)
+        self._place(key, record.get("use_count", 0))
+
+    def touch(self, key: str, record: dict):
+        if key in self._freq:
+            was_min = self._freq[key] == self._min_freq
+            freq = self._unplace(key)
+            self._place(key, freq + 1)
+            if was_min and self._min_freq is None:
+                self._min_freq = freq + 1   # it left the lowest bucket, which is now empty
+
+    def remove(self, key: str):
+        if key in self._freq:
+            self._unplace(key)
+
+    def victim(self):
+        if not self._buckets:
+            return None
+        if self._min_freq is None:
+            self._min_freq = min(self._buckets)
+        return next(iter(self._buckets[self._min_freq]))
+
+
+class ScorePolicy:
+    """
+    Evicts by value tier, least recently used first within a tier:
+    unverified auto-saved answers, then low-confidence answers, then the rest.
+    """
+    def __init__(self):
+        self._tiers = [OrderedDict(), OrderedDict(), OrderedDict()]
+        self._tier_of = {}
+
+    @staticmethod
+    def _tier(record: dict) -> int:
+        if record.get("source", {}).get("auto_saved"):
+            return 0
+        if (record.get("confidence") or 0) < LOW_CONFIDENCE:
+            return 1
+        return 2
+
+    def admit(self, key: str, record: dict):
+        self.remove(key)
+        tier = self._tier(record)
+        self._tiers[tier][key] = None
+        self._tier_of[key] = tier
+
+    def touch(self, key: str, record: dict):
+        tier = self._tier_of.get(key)
+        if tier is not None:
+            self._tiers[tier].move_to_end(key)
+
+    def remove(self, key: str):
+        tier = self._tier_of.pop(key, None)
+        if tier is not None:
+            del self._tiers[tier][key]
+
+    def victim(self):
+        for tier in self._tiers:
+            if tier:
+                return next(iter(tier))
+        return None
+
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+    "score": ScorePolicy,
+}
+
+
+class DomainTTL:
+    """
+    Tracks intents of TTL'd domains in last-used order so expired entries can be
+    popped from the front (O(1) amortized per expiry).
+    """
+    def __init__(self, ttls: dict):
+        self.ttls = {domain: timedelta(days=days) for domain, days in ttls.items() if days > 0}
+        self._order = {domain: OrderedDict() for domain in self.ttls}
+
+    def expired(self, record: dict, now: datetime = None) -> bool:
+        ttl = self.ttls.get(record.get("domain"))
+        if not ttl or not record.get("last_used_at"):
+            return False
+        return datetime.fromisoformat(record["last_used_at"]) + ttl < (now or datetime.now())
+
+    def touch(self, key: str, record: dict):
+        order = self._order.get(record.get("domain"))
+        if order is not None:
+            order[key] = None
+            order.move_to_end(key)
+
+    def remove(self, key: str):
+        for order in self._order.values():
+            order.pop(key, None)
+
+    def sweep(self, memory: dict) -> list:
+        """Returns the keys whose TTL has run out."""
+        now = datetime.now()
+        expired = []
+        for order in self._order.values():
+            for key in order:
+                record = memory.get(key)
+                if record is None:
+                    continue
+                if not self.expired(record, now):
+                    break
+                expired.append(key)
+        return expired
@@ -1,32 +1,28 @@
+import asyncio
 
-def get_user_feedback(judge_result: dict) -> dict:
-    """
-    Simulates or requests user feedback on the judge's selected answer.
-    Returns a dict with status ('approved', 'rejected') and authorized_answer.
-    """
-    print("\n" + "="*50)
-    print(f"JUDGE SELECTED ({judge_result.get('best_model')}):")
-    print(f"RATIONALE: {judge_result.get('rationale')}")
-    print("-" * 20)
-    print(f"ANSWER: {judge_result.get('final_answer')}")
-    print("="*50 + "\n")
 
-    print("="*50 + "\n")
+async def ainput(prompt: str = "") -> str:
+    """input() without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, input, prompt)
+
 
-    # Direct feedback model
-    print("Press [ENTER] to approve, or type your correction/feedback below:")
-    user_input = input(">>> ").strip()
+async def review_in_terminal(result) -> dict:
+    """
+    Terminal client of the router engine: shows each draft, sends the typed
+    reply with submit_feedback() and repeats until the answer is final.
+    Accepts a result dict or the awaitable that produces one.
+    """
+    from .orchestrator import submit_feedback
 
-    if not user_input:
-        # Empty input -> Approval
-        return {
-            "status": "approved",
-            "final_answer": judge_result.get("final_answer")
-        }
-    else:
-        # Non-empty input -> Correction (Explicit feedback)
-        # We assume if they typed something, that IS the new answer.
-        return {
-            "status": "approved",
-            "final_answer": user_input
-        }
+    if asyncio.iscoroutine(result):
+        result = await result
+    while result.get("status") == "awaiting_feedback":
+        print(f"\n[Proposed Answer]: {result['draft']}")
+        print(f"[Domain]: {result['domain']}")
+        print("Press [ENTER] to approve, or type your correction/feedback below:")
+        feedback = (await ainput(">>> ")).strip()
+        result = await submit_feedback(result["continuation"], feedback)
+    if result.get("error"):
+        print(f"[Router] {result['error']}")
+    return result
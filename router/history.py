@@ -0,0 +1,187 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from .storage import atomic_write_bytes
+
+# Retention for archived answers. 0 disables the corresponding limit.
+HISTORY_MAX_VERSIONS = int(os.getenv("HISTORY_MAX_VERSIONS", "20"))
+HISTORY_MAX_AGE_DAYS = float(os.getenv("HISTORY_MAX_AGE_DAYS", "0"))
+
+# Rewrite the segment once this many dropped entries are waiting AND they outnumber live ones.
+COMPACT_MIN_DEAD = 1000
+
+_HEADER = struct.Struct(">HI")  # key length, compressed body length
+
+
+def compress_answer(text: str) -> bytes:
+    return zlib.compress(text.encode('utf-8')) if text is not None else None
+
+
+def decompress_answer(blob: bytes) -> str:
+    return zlib.decompress(blob).decode('utf-8') if blob is not None else None
+
+
+def within_retention(entries: list, max_versions: int = HISTORY_MAX_VERSIONS,
+                     max_age_days: float = HISTORY_MAX_AGE_DAYS) -> list:
+    """Filters archive entries (oldest first) down to what the retention policy keeps."""
+    if max_age_days:
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+        entries = [e for e in entries if (e.get("archived_at") or "") >= cutoff]
+    if max_versions:
+        entries = entries[-max_versions:]
+    return entries
+
+
+class HistoryArchive:
+    """
+    Cold segment for archived answers, kept out of the hot records.
+
+    File layout: a sequence of [key_len, body_len][key][zlib(json(entry))]; an
+    empty body is a tombstone that drops every earlier entry of that key.
+    Nothing is read at startup; the offset index is built from the headers on
+    first use and bodies are only decompressed when history is requested.
+    """
+    def __init__(self, path: Path, max_versions: int = HISTORY_MAX_VERSIONS,
+                 max_age_days: float = HISTORY_MAX_AGE_DAYS):
+        self.path = Path(path)
+        self.max_versions = max_versions
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._index = None   # key -> [(body_offset, body_len), ...] oldest first
+        self._end = 0
+        self._ino = None
+        self._live = 0
+        self._dead = 0
+
+    def _ensure_index(self):
+        if self._index is not None:
+            return
+        self._index, self._end = {}, 0
+        self._live = self._dead = 0
+        self._scan()
+
+    def _scan(self):
+        """Indexes entries from self._end to the end of the file (headers only)."""
+        offset = self._end
+        if self.path.exists():
+            size = self.path.stat().st_size
+            self._ino = self.path.stat().st_ino
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                while offset + _HEADER.size <= size:
+                    key_len, body_len = _HEADER.unpack(f.read(_HEADER.size))
+                    body_offset = offset + _HEADER.size + key_len
+                    if body_offset + body_len > size:
+                        break
+                    key = f.read(key_len).decode('utf-8')
+                    f.seek(body_len, os.SEEK_CUR)
+                    offset = body_offset + body_len
+                    if not body_len:
+                        dropped = self._index.pop(key, [])
+                        self._live -= len(dropped)
+                        self._dead += len(dropped) + 1
+                        continue
+                    offsets = self._index.setdefault(key, [])
+                    offsets.append((body_offset, body_len))
+                    self._live += 1
+                    self._trim(offsets)
+            if offset < size:
+                print(f"[Memory] Dropping torn entry at end of {self.path.name}")
+                with open(self.path, 'r+b') as f:
+                    f.truncate(offset)
+        self._end = offset
+
+    def refresh(self):
+        """
+        Picks up entries appended by other processes: scans only the new tail, or
+        rebuilds the index if the segment was rewritten.
+        """
+        with self._lock:
+            if self._index is None:
+                return
+            try:
+                st = self.path.stat()
+            except FileNotFoundError:
+                self._index = None
+                return
+            if st.st_ino != self._ino or st.st_size < self._end:
+                self._index = None
+            elif st.st_size > self._end:
+                self._scan()
+
+    def _trim(self, offsets: list):
+        """Drops entries beyond max_versions from the index (the bytes stay until compaction)."""
+        if self.max_versions and len(offsets) > self.max_versions:
+            surplus = len(offsets) - self.max_versions
+            del offsets[:surplus]
+            self._live -= surplus
+            self._dead += surplus
+
+    def append(self, key: str, entry: dict):
+        key_bytes = key.encode('utf-8')
+        body = zlib.compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        with self._lock:
+            self._ensure_index()
+            with open(self.path, 'ab') as f:
+                f.write(_HEADER.pack(len(key_bytes), len(body)) + key_bytes + body)
+                self._ino = os.fstat(f.fileno()).st_ino
+            offsets = self._index.setdefault(key, [])
+            offsets.append((self._end + _HEADER.size + len(key_bytes), len(body)))
+            self._end += _HEADER.size + len(key_bytes) + len(body)
+            self._live += 1
+            self._trim(offsets)
+            if self._dead >= COMPACT_MIN_DEAD and self._dead > self._live:
+                self._compact()
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            self._ensure_index()
+            return len(self._index.get(key, []))
+
+    def get(self, key: str) -> list:
+        """Returns the retained archive entries for `key`, oldest first."""
+        with self._lock:
+            self._ensure_index()
+            entries = self._read(self._index.get(key, []))
+        return within_retention(entries, self.max_versions, self.max_age_days)
+
+    def drop(self, key: str):
+        """Forgets all archived versions of `key`."""
+        key_bytes = key.encode('utf-8')
+        with self._lock:
+            self._ensure_index()
+            offsets = self._index.pop(key, [])
+            if not offsets:
+                return
+            with open(self.path, 'ab') as f:
+                f.write(_HEADER.pack(len(key_bytes), 0) + key_bytes)
+            self._end += _HEADER.size + len(key_bytes)
+            self._live -= len(offsets)
+            self._dead += len(offsets) + 1
+
+    def _read(self, offsets: list) -> list:
+        if not offsets:
+            return []
+        entries = []
+        with open(self.path, 'rb') as f:
+            for body_offset, body_len in offsets:
+                f.seek(body_offset)
+                entries.append(json.loads(zlib.decompress(f.read(body_len))))
+        return entries
+
+    def _compact(self):
+        """Rewrites the segment with only the retained entries."""
+        chunks = []
+        for key, offsets in self._index.items():
+            key_bytes = key.encode('utf-8')
+            for entry in within_retention(self._read(offsets), self.max_versions, self.max_age_days):
+                body = zlib.compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+                chunks.append(_HEADER.pack(len(key_bytes), len(body)) + key_bytes + body)
+        atomic_write_bytes(self.path, b"".join(chunks))
+        self._index = None
+        self._ensure_index()
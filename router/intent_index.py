@@ -0,0 +1,121 @@
+from bisect import bisect_left, insort
+from fnmatch import fnmatchcase
+
+# Upper bound on candidates handed to the LLM equivalence check.
+MAX_MATCH_CANDIDATES = 50
+
+
+class _Level:
+    """One level of the hierarchy: children by name plus a sorted name list for prefix scans."""
+    __slots__ = ("children", "names", "count")
+
+    def __init__(self):
+        self.children = {}
+        self.names = []
+        self.count = 0
+
+    def child(self, name: str, factory):
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = factory()
+            insort(self.names, name)
+        return node
+
+    def drop(self, name: str):
+        del self.children[name]
+        del self.names[bisect_left(self.names, name)]
+
+    def match(self, part: str) -> list:
+        """Names matching one pattern component: exact, '*', 'prefix*' or any fnmatch glob."""
+        if part == "*":
+            return self.names
+        if "*" not in part and "?" not in part and "[" not in part:
+            return [part] if part in self.children else []
+        if part.endswith("*") and not any(c in part[:-1] for c in "*?["):
+            prefix = part[:-1]
+            start = bisect_left(self.names, prefix)
+            end = start
+            while end < len(self.names) and self.names[end].startswith(prefix):
+                end += 1
+            return self.names[start:end]
+        return [name for name in self.names if fnmatchcase(name, part)]
+
+
+class IntentIndex:
+    """
+    Hierarchical domain -> task -> object index over intent signatures.
+    Maintained incrementally on save/evict; answers wildcard queries such as
+    'sports|explanation|*' or '*|code_generation|bubblesort*' without scanning
+    every record.
+    """
+    def __init__(self):
+        self._root = _Level()
+        self._paths = {}   # intent_signature -> (domain, task, object)
+
+    def add(self, key: str, domain: str, task: str, obj: str):
+        path = (domain or "general", task or "unknown", obj or "unknown")
+        if self._paths.get(key) == path:
+            return
+        self.remove(key)
+        self._paths[key] = path
+
+        domain_node = self._root.child(path[0], _Level)
+        task_node = domain_node.child(path[1], _Level)
+        keys = task_node.child(path[2], set)
+        keys.add(key)
+        for node in (self._root, domain_node, task_node):
+            node.count += 1
+
+    def add_record(self, key: str, record: dict):
+        self.add(key, record.get("domain"), record.get("task"), record.get("object"))
+
+    def remove(self, key: str):
+        path = self._paths.pop(key, None)
+        if path is None:
+            return
+        domain_node = self._root.children[path[0]]
+        task_node = domain_node.children[path[1]]
+        keys = task_node.children[path[2]]
+        keys.discard(key)
+        for node in (self._root, domain_node, task_node):
+            node.count -= 1
+        if not keys:
+            task_node.drop(path[2])
+        if not task_node.count:
+            domain_node.drop(path[1])
+        if not domain_node.count:
+            self._root.drop(path[0])
+
+    def query(self, pattern: str) -> list:
+        """
+        Returns intent signatures matching 'domain|task|object'. Each component may be
+        exact, '*', 'prefix*' or a glob; missing trailing components default to '*'.
+        """
+        parts = (pattern.split("|") + ["*", "*"])[:3]
+        matches = []
+        for domain in self._root.match(parts[0]):
+            domain_node = self._root.children[domain]
+            for task in domain_node.match(parts[1]):
+                task_node = domain_node.children[task]
+                for obj in task_node.match(parts[2]):
+                    matches.extend(task_node.children[obj])
+        return matches
+
+    def candidates(self, domain: str, task: str = None, limit: int = MAX_MATCH_CANDIDATES) -> list:
+        """
+        Candidates for semantic matching: same domain and task first, then the rest
+        of the domain, capped at `limit`.
+        """
+        domain_node = self._root.children.get(domain)
+        if domain_node is None:
+            return []
+        ordered = [task] if task in domain_node.children else []
+        ordered += [name for name in domain_node.names if name != task]
+
+        result = []
+        for name in ordered:
+            for keys in domain_node.children[name].children.values():
+                result.extend(keys)
+                if len(result) >= limit:
+                    return result[:limit]
+        return result
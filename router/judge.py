@@ -1,6 +1,8 @@
 
 import json
+import time
 from .llm_generators import generate_gemini
+from .patching import PATCH_INSTRUCTIONS, apply_patch_response, number_lines, refine_stats, use_patch
 
 JUDGE_SYSTEM_PROMPT = """
 You are an expert AI Judge.
@@ -164,7 +166,34 @@ async def review_correction(query: str, original_draft: str, feedback: str) -> s
     Called when the user REJECTS or CORRECTS the judge's draft.
     The Judge must now synthesize the FINAL answer by respecting the user's authortity
     but maintaining the professional structure.
+    Long drafts are patched with line edits (see patching.py) instead of
+    rewritten; a patch that fails to apply falls back to the full rewrite.
     """
+    if use_patch(original_draft):
+        started = time.perf_counter()
+        response = await generate_gemini(f"""
+    User Query: "{query}"
+
+    Previous Draft Answer (numbered):
+{number_lines(original_draft)}
+
+    USER FEEDBACK / CORRECTION:
+    "{feedback}"
+
+    Task: apply the feedback to the draft. If the user is correcting facts, accept them as absolute truth;
+    if they ask "Why?" or for more detail, add that reasoning; if they ask for a different style, adapt it.
+
+    {PATCH_INSTRUCTIONS}
+    """, "You are an expert editor incorporating user feedback with minimal line edits.")
+        try:
+            patched = apply_patch_response(original_draft, response)
+            refine_stats.record("patch", response, time.perf_counter() - started)
+            return patched
+        except ValueError as e:
+            refine_stats.record("failed_patch", response, time.perf_counter() - started)
+            print(f"[Judge] Patch not applicable ({e}); rewriting the full answer.")
+
+    started = time.perf_counter()
     prompt = f"""
     User Query: "{query}"
     
@@ -183,7 +212,9 @@ async def review_correction(query: str, original_draft: str, feedback: str) -> s
     6. If user feedback introduces a NEW topic, STOP and signal routing.
     """
     
-    return await generate_gemini(prompt, "You are an expert editor incorporating user feedback.")
+    response = await generate_gemini(prompt, "You are an expert editor incorporating user feedback.")
+    refine_stats.record("rewrite", response, time.perf_counter() - started)
+    return response
 
 async def find_matching_intent(new_intent: str, candidates: list) -> str:
     """
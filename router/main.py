@@ -6,6 +6,7 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from router.orchestrator import process_query
+from router.feedback import review_in_terminal
 
 if __name__ == "__main__":
     print("Multi-LLM Orchestrator Started.")
@@ -15,4 +16,4 @@ if __name__ == "__main__":
         query = input("\nUser Query (Ctrl+C to quit): ").strip()
         if not query: continue
         
-        asyncio.run(process_query(query))
+        asyncio.run(review_in_terminal(process_query(query)))
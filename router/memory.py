@@ -1,97 +1,427 @@
 
-import json
+import atexit
 import os
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+from .aliases import AliasMap
+from .eviction import (EVICTION_MODE, EVICTION_POLICY, MEMORY_CAPACITY, MEMORY_TTL_DAYS, POLICIES,
+                       DomainTTL, parse_ttls)
+from .filelock import FileLock
+from .history import HistoryArchive, within_retention
+from .intent_index import MAX_MATCH_CANDIDATES, IntentIndex
+from .storage import STORAGES
+
 MEMORY_FILE = Path(__file__).resolve().parent / "memory_store.json"
 
+# Write-behind persistence: reads and saves only mark records dirty, and a
+# background thread persists them every FLUSH_INTERVAL seconds or once
+# FLUSH_THRESHOLD records are dirty. Set MEMORY_WRITE_BEHIND=0 to write through.
+WRITE_BEHIND = os.getenv("MEMORY_WRITE_BEHIND", "1") == "1"
+FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "5"))
+FLUSH_THRESHOLD = int(os.getenv("MEMORY_FLUSH_THRESHOLD", "100"))
+
+# On-disk format: "json" (whole-file rewrite), "log" (snapshot + append-only log),
+# "binary" (memory-mapped snapshot + log, records decoded lazily) or "sqlite"
+# (SQLiteMemoryStore, migrated once from the JSON file).
+STORAGE = os.getenv("MEMORY_STORAGE", "json")
+
+# Multi-process mode (e.g. uvicorn --workers N): every mutation runs under a
+# cross-process file lock after catching up with other writers, and reads
+# reload only when the files changed. Implies write-through.
+SHARED = os.getenv("MEMORY_SHARED", "0") == "1"
+
+
 class MemoryStore:
-    def __init__(self):
-        self.MEMORY_FILE = MEMORY_FILE
+    def __init__(self, memory_file: Path = MEMORY_FILE, write_behind: bool = WRITE_BEHIND,
+                 flush_interval: float = FLUSH_INTERVAL, flush_threshold: int = FLUSH_THRESHOLD,
+                 storage: str = STORAGE, capacity: int = MEMORY_CAPACITY,
+                 eviction_policy: str = EVICTION_POLICY, eviction_mode: str = EVICTION_MODE,
+                 ttl_days: dict = None, shared: bool = SHARED):
+        self.MEMORY_FILE = Path(memory_file)
+        self.storage = STORAGES[storage](self.MEMORY_FILE)
+        # Archived answers live in a compressed cold segment, not in the records.
+        self.history = HistoryArchive(self.MEMORY_FILE.with_suffix(".history"))
+        self.shared = shared
+        # Near-duplicate signatures merged by consolidate.py resolve to their canonical key.
+        self.aliases = AliasMap(self.MEMORY_FILE.with_suffix(".aliases.json"), watch=shared)
+        self._file_lock = FileLock(self.MEMORY_FILE.with_suffix(".lock")) if shared else None
+        # A non-shared store belongs to one process, which rewrites it from its own copy (so
+        # it would resurrect records merged away by consolidate.py). The owner holds this lock
+        # for its lifetime; owns_store is False when another process already had it.
+        self._owner_lock = None if shared else FileLock(self.MEMORY_FILE.with_suffix(".owner.lock"))
+        self.owns_store = shared or self._owner_lock.acquire(blocking=False)
+        self.write_behind = write_behind and not shared
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+
+        # Capacity / TTL policy. Evicted answers are archived to the history segment
+        # (eviction_mode="archive") or discarded together with their history ("drop").
+        self.capacity = capacity
+        self.eviction_mode = eviction_mode
+        self._eviction_policy = eviction_policy
+        self._ttl_days = parse_ttls(MEMORY_TTL_DAYS) if ttl_days is None else ttl_days
+        self.evictions = {"capacity": 0, "ttl": 0, "archived": 0}
+        # Called as listener(signature, record) after every successful save
+        self.save_listeners = []
+
+        self._lock = threading.RLock()        # guards self.memory / self._dirty
+        self._flush_lock = threading.Lock()   # serializes snapshot + write
+        self._dirty = {}   # intent_signature -> "put" | "touch" | "del"
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._flusher = None
+
         self._load_memory()
 
+        if self.write_behind:
+            self._flusher = threading.Thread(target=self._flush_loop, name="memory-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
     def _load_memory(self):
-        if not MEMORY_FILE.exists():
-            self.memory = {}
-            self._save_memory()
+        if self.shared:
+            self._file_lock.acquire()
+        try:
+            self.memory = self.storage.load()
+            self._rebuild_indexes()
+            with self._lock:
+                changes = self._enforce_limits()
+            if changes:
+                self._mark_dirty(changes)
+        finally:
+            if self.shared:
+                self._file_lock.release()
+
+    def _rebuild_indexes(self):
+        self.policy = POLICIES[self._eviction_policy]()
+        self.ttl = DomainTTL(self._ttl_days)
+        self.index = IntentIndex()
+        # A binary snapshot supplies the indexed fields without decoding every record
+        items = self.memory.meta_items() if hasattr(self.memory, "meta_items") else self.memory.items()
+        for key, record in sorted(items, key=lambda kv: kv[1].get("last_used_at") or ""):
+            self.policy.admit(key, record)
+            self.ttl.touch(key, record)
+            self.index.add_record(key, record)
+
+    def _reindex(self, key: str):
+        self.policy.remove(key)
+        self.ttl.remove(key)
+        self.index.remove(key)
+        record = self.memory.get(key)
+        if record:
+            self.policy.admit(key, record)
+            self.ttl.touch(key, record)
+            self.index.add_record(key, record)
+
+    @contextmanager
+    def _transaction(self):
+        """Shared mode: hold the cross-process lock and start from the latest on-disk state."""
+        if not self.shared:
+            yield
+            return
+        with self._file_lock:
+            self._refresh()
+            yield
+
+    def _refresh(self):
+        """Applies other processes' writes (caller holds the file lock)."""
+        with self._lock:
+            if not self.storage.changed():
+                return
+            changed = self.storage.refresh(self.memory)
+            self.history.refresh()
+            if changed is None:
+                self._rebuild_indexes()
+            else:
+                for key in changed:
+                    self._reindex(key)
+
+    def _refresh_if_changed(self):
+        """Shared mode read path: a few stat() calls unless another process wrote."""
+        if self.shared and self.storage.changed():
+            with self._file_lock:
+                self._refresh()
+
+    def _save_to_disk(self):
+        with self._flush_lock:
+            with self._lock:
+                changes, self._dirty = self._dirty, {}
+                payload = self.storage.encode(self.memory, changes)
+            self.storage.commit(payload)
+
+    def _mark_dirty(self, changes: dict):
+        """
+        Records mutations ({intent_signature: "put" | "touch" | "del"}).
+        Write-through mode persists immediately.
+        Must be called without holding self._lock (lock order: flush, then data).
+        """
+        with self._lock:
+            for intent_signature, op in changes.items():
+                # A pending put or delete already covers a later touch.
+                if not (op == "touch" and self._dirty.get(intent_signature) in ("put", "del")):
+                    self._dirty[intent_signature] = op
+            due = len(self._dirty) >= self.flush_threshold
+
+        if not self.write_behind:
+            self._save_to_disk()
+        elif due:
+            self._wakeup.set()
+
+    def _evict(self, intent_signature: str, reason: str) -> dict:
+        """Removes one intent (caller holds self._lock). Returns its dirty-change entry."""
+        record = self.memory.pop(intent_signature)
+        self.policy.remove(intent_signature)
+        self.ttl.remove(intent_signature)
+        self.index.remove(intent_signature)
+        self.evictions[reason] += 1
+        if self.eviction_mode == "archive":
+            self.history.append(intent_signature, {
+                "archived_at": datetime.now().isoformat(),
+                "previous_answer": record.get("approved_answer") or record.get("answer"),
+                "previous_confidence": record.get("confidence"),
+                "evicted": reason
+            })
+            self.evictions["archived"] += 1
         else:
+            self.history.drop(intent_signature)
+        print(f"[Memory] Evicted '{intent_signature}' ({reason}).")
+        return {intent_signature: "del"}
+
+    def _enforce_limits(self, reserve: int = 0) -> dict:
+        """
+        Drops expired intents, then evicts until `reserve` more fit within capacity
+        (caller holds self._lock).
+        """
+        changes = {}
+        for key in self.ttl.sweep(self.memory):
+            changes.update(self._evict(key, "ttl"))
+        while self.capacity and self.memory and len(self.memory) + reserve > self.capacity:
+            changes.update(self._evict(self.policy.victim(), "capacity"))
+        return changes
+
+    def stats(self) -> dict:
+        """Size and eviction counters for monitoring."""
+        with self._lock:
+            return {"intents": len(self.memory), "capacity": self.capacity, "evictions": dict(self.evictions)}
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
             try:
-                with open(MEMORY_FILE, 'r', encoding='utf-8') as f:
-                    self.memory = json.load(f)
-            except:
-                self.memory = {}
+                self.flush()
+            except Exception as e:
+                print(f"[Memory] Background flush failed: {e}")
 
-    def _save_to_disk(self):
-        with open(self.MEMORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.memory, f, indent=2)
+    def flush(self):
+        """Persists pending changes now. No-op when nothing is dirty."""
+        if self._dirty:
+            self._save_to_disk()
+
+    def close(self):
+        """Stops the background flusher and writes any pending changes."""
+        self._closed.set()
+        self._wakeup.set()
+        if self._flusher and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self.flush()
+        self.storage.close()
+        if self._owner_lock and self.owns_store:
+            self._owner_lock.release()
+            self.owns_store = False
 
     def get_intent_answer(self, intent_signature: str):
         """
         Returns the accepted answer if it exists for this intent.
         """
-        record = self.memory.get(intent_signature)
-        if record:
-            # Update last_used_at if it exists (schema support)
-            if "last_used_at" in record:
-                record["last_used_at"] = datetime.now().isoformat()
-                self._save_to_disk()
-        return record
+        intent_signature = self.aliases.resolve(intent_signature)
+        with self._transaction():
+            changes = {}
+            with self._lock:
+                record = self.memory.get(intent_signature)
+                if record and self.ttl.expired(record):
+                    changes = self._evict(intent_signature, "ttl")
+                    record = None
+                # Update last_used_at if it exists (schema support)
+                elif record and "last_used_at" in record:
+                    record["last_used_at"] = datetime.now().isoformat()
+                    record["use_count"] = record.get("use_count", 0) + 1
+                    self.policy.touch(intent_signature, record)
+                    self.ttl.touch(intent_signature, record)
+                    changes = {intent_signature: "touch"}
+            if changes:
+                self._mark_dirty(changes)
+            return record
 
-    def save_intent_answer(self, intent_data: dict, answer: str, generated_by_models: list, confidence: float, auto_saved: bool = False):
+    def peek_intent_answer(self, intent_signature: str):
+        """Reads a record without counting it as a use (for offline jobs)."""
+        self._refresh_if_changed()
+        with self._lock:
+            return self.memory.get(self.aliases.resolve(intent_signature))
+
+    def save_intent_answer(self, intent_data: dict, answer: str, generated_by_models: list, confidence: float,
+                           auto_saved: bool = False, expected_version: int = None):
         """
-        Saves the intent and answer to the JSON store with Rich Schema.
+        Saves the intent and answer to the store with Rich Schema.
         intent_data must contain: 'intent_signature', 'domain', 'task', 'object'
+
+        expected_version enables optimistic concurrency: the save only applies if the
+        stored record still has that version (0 = must not exist yet). Returns the
+        saved record, or None on conflict.
         """
         signature = intent_data.get("intent_signature")
         if not signature:
             print("[Memory] Error: No intent_signature provided.")
             return
+        signature = self.aliases.resolve(signature)
+
+        with self._transaction():
+            timestamp = datetime.now().isoformat()
+
+            with self._lock:
+                # Check for existing record to handle history/versioning
+                existing_record = self.memory.get(signature)
+
+                current_version = existing_record.get("version", 1) if existing_record else 0
+                if expected_version is not None and expected_version != current_version:
+                    print(f"[Memory] Conflict saving '{signature}': expected version {expected_version}, found {current_version}.")
+                    return None
+
+                # If updating an *existing* record, archive the OLD answer
+                if existing_record:
+                    # Legacy records still carry their history inline; move it to the cold segment
+                    for legacy_entry in existing_record.get("history_log", []):
+                        self.history.append(signature, legacy_entry)
+                    archive_entry = {
+                        "archived_at": timestamp,
+                        "previous_answer": existing_record.get("approved_answer") or existing_record.get("answer"),
+                        "previous_confidence": existing_record.get("confidence")
+                    }
+                    self.history.append(signature, archive_entry)
 
-        timestamp = datetime.now().isoformat()
-        
-        # Check for existing record to handle history/versioning
-        existing_record = self.memory.get(signature)
-        history_log = existing_record.get("history_log", []) if existing_record else []
-        
-        # If updating an *existing* record, archive the OLD answer
-        if existing_record:
-            archive_entry = {
-                "archived_at": timestamp,
-                "previous_answer": existing_record.get("approved_answer") or existing_record.get("answer"),
-                "previous_confidence": existing_record.get("confidence")
-            }
-            history_log.append(archive_entry)
-            
-        new_record = {
-            "intent": signature, # Composite key
-            "domain": intent_data.get("domain", "general"),
-            "task": intent_data.get("task", "unknown"),
-            "object": intent_data.get("object", "unknown"),
-            "approved_answer": answer,
-            "source": {
-                "generated_by": generated_by_models,
-                "judge": "Gemini_Judge",
-                "human_verified": not auto_saved, # If auto-saved, it is NOT verified
-                "auto_saved": auto_saved
-            },
-            "confidence": confidence,
-            "created_at": existing_record.get("created_at", timestamp) if existing_record else timestamp,
-            "last_used_at": timestamp,
-            "history_log": history_log
-        }
-        
-        self.memory[signature] = new_record
-        self._save_to_disk()
+                new_record = {
+                    "intent": signature, # Composite key
+                    "domain": intent_data.get("domain", "general"),
+                    "task": intent_data.get("task", "unknown"),
+                    "object": intent_data.get("object", "unknown"),
+                    "approved_answer": answer,
+                    "source": {
+                        "generated_by": generated_by_models,
+                        "judge": "Gemini_Judge",
+                        "human_verified": not auto_saved, # If auto-saved, it is NOT verified
+                        "auto_saved": auto_saved
+                    },
+                    "confidence": confidence,
+                    "created_at": existing_record.get("created_at", timestamp) if existing_record else timestamp,
+                    "last_used_at": timestamp,
+                    "use_count": existing_record.get("use_count", 0) if existing_record else 0,
+                    "history_count": self.history.count(signature),
+                    "version": current_version + 1
+                }
+
+                if existing_record:
+                    del self.memory[signature]
+                    self.ttl.remove(signature)
+                    self.policy.remove(signature)
+                # Make room before inserting so a fresh save is never its own victim
+                changes = self._enforce_limits(reserve=1)
+                self.memory[signature] = new_record
+                self.index.add_record(signature, new_record)
+                self.policy.admit(signature, new_record)
+                self.ttl.touch(signature, new_record)
+                changes[signature] = "put"
+            self._mark_dirty(changes)
+        for listener in self.save_listeners:
+            listener(signature, new_record)
+        return new_record
+
+    def merge_intents(self, alias: str, canonical: str) -> bool:
+        """
+        Folds a near-duplicate intent into `canonical`: the alias's answer and
+        history move to the canonical history, its record is removed and
+        lookups of `alias` resolve to `canonical` from now on.
+        """
+        canonical = self.aliases.resolve(canonical)
+        if alias == canonical:
+            return False
+        with self._transaction():
+            with self._lock:
+                if canonical not in self.memory:
+                    print(f"[Memory] Cannot merge into missing intent '{canonical}'.")
+                    return False
+                changes = {}
+                record = self.memory.pop(alias, None)
+                if record:
+                    self.policy.remove(alias)
+                    self.ttl.remove(alias)
+                    self.index.remove(alias)
+                    for entry in record.get("history_log", []) + self.history.get(alias):
+                        self.history.append(canonical, entry)
+                    self.history.drop(alias)
+                    self.history.append(canonical, {
+                        "archived_at": datetime.now().isoformat(),
+                        "previous_answer": record.get("approved_answer") or record.get("answer"),
+                        "previous_confidence": record.get("confidence"),
+                        "merged_from": alias
+                    })
+                    target = self.memory[canonical]
+                    target["history_count"] = self.history.count(canonical)
+                    target["use_count"] = target.get("use_count", 0) + record.get("use_count", 0)
+                    self.memory[canonical] = target
+                    self._reindex(canonical)
+                    changes = {alias: "del", canonical: "put"}
+                self.aliases.add(alias, canonical)
+            if changes:
+                self._mark_dirty(changes)
+        print(f"[Memory] Merged '{alias}' into '{canonical}'.")
+        return True
+
+    def get_history(self, intent_signature: str) -> list:
+        """
+        Returns archived versions of an intent (oldest first), loading them from
+        the cold segment on demand.
+        """
+        intent_signature = self.aliases.resolve(intent_signature)
+        self._refresh_if_changed()
+        with self._lock:
+            record = self.memory.get(intent_signature) or {}
+            legacy = record.get("history_log", [])
+        return within_retention(legacy + self.history.get(intent_signature),
+                                self.history.max_versions, self.history.max_age_days)
 
     def list_intents(self):
-        return list(self.memory.keys())
-        
+        self._refresh_if_changed()
+        with self._lock:
+            return list(self.memory.keys())
+
     def get_intents_by_domain(self, domain: str) -> list:
         """
         Returns a list of intent signatures that belong to the specified domain.
         """
-        return [k for k, v in self.memory.items() if v.get("domain") == domain]
+        self._refresh_if_changed()
+        with self._lock:
+            return self.index.query(f"{domain}|*|*")
+
+    def get_match_candidates(self, intent_data: dict, limit: int = MAX_MATCH_CANDIDATES) -> list:
+        """
+        Narrowed candidate list for semantic intent matching: same domain and task
+        first, then the rest of the domain.
+        """
+        self._refresh_if_changed()
+        with self._lock:
+            return self.index.candidates(intent_data.get("domain"), intent_data.get("task"), limit)
+
+    def is_persisted(self, intent_signature: str) -> bool:
+        """Re-reads the files (read-only) to confirm a save reached disk."""
+        with self._transaction():
+            return intent_signature in self.storage.persisted_keys()
 
 # Global instance
-memory = MemoryStore()
+if STORAGE == "sqlite":
+    from .memory_sqlite import SQLiteMemoryStore
+    memory = SQLiteMemoryStore(migrate_from=MEMORY_FILE)
+else:
+    memory = MemoryStore(storage=STORAGE)
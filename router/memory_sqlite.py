@@ -0,0 +1,361 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from .aliases import AliasMap
+from .history import HISTORY_MAX_AGE_DAYS, HISTORY_MAX_VERSIONS, compress_answer, decompress_answer, within_retention
+from .intent_index import MAX_MATCH_CANDIDATES
+
+SQLITE_FILE = Path(__file__).resolve().parent / "memory_store.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS intents (
+    intent          TEXT PRIMARY KEY,
+    domain          TEXT NOT NULL,
+    task            TEXT NOT NULL,
+    object          TEXT NOT NULL,
+    approved_answer TEXT,
+    source          TEXT,
+    confidence      REAL,
+    created_at      TEXT,
+    last_used_at    TEXT,
+    use_count       INTEGER NOT NULL DEFAULT 0,
+    version         INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_intents_domain ON intents(domain);
+CREATE INDEX IF NOT EXISTS idx_intents_task ON intents(task);
+CREATE INDEX IF NOT EXISTS idx_intents_object ON intents(object);
+CREATE INDEX IF NOT EXISTS idx_intents_last_used_at ON intents(last_used_at);
+
+CREATE TABLE IF NOT EXISTS history_log (
+    id                  INTEGER PRIMARY KEY AUTOINCREMENT,
+    intent              TEXT NOT NULL REFERENCES intents(intent) ON DELETE CASCADE,
+    archived_at         TEXT,
+    previous_answer     TEXT,
+    previous_answer_z   BLOB,
+    previous_confidence REAL,
+    merged_from         TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_log_intent ON history_log(intent);
+"""
+
+INTENT_COLUMNS = ("intent, domain, task, object, approved_answer, source, confidence, created_at, last_used_at, "
+                  "use_count, version")
+
+
+class SQLiteMemoryStore:
+    """
+    Drop-in alternative to MemoryStore backed by stdlib sqlite3 (WAL mode).
+    Domain/task/object/last_used_at are indexed columns and history_log lives
+    in a child table (zlib-compressed, read only by get_history), so lookups
+    never scan or rewrite the whole store. Safe to share between worker
+    processes: saves run in BEGIN IMMEDIATE transactions.
+    """
+    def __init__(self, db_file: Path = SQLITE_FILE, migrate_from: Path = None,
+                 max_versions: int = HISTORY_MAX_VERSIONS, max_age_days: float = HISTORY_MAX_AGE_DAYS):
+        self.MEMORY_FILE = Path(db_file)
+        self.max_versions = max_versions
+        self.max_age_days = max_age_days
+        self._lock = threading.RLock()
+        # Called as listener(signature, record) after every successful save
+        self.save_listeners = []
+        # Other processes may merge intents, so the alias file is watched.
+        self.aliases = AliasMap(self.MEMORY_FILE.with_suffix(".aliases.json"), watch=True)
+        # Other processes may hold the write lock briefly; wait instead of failing.
+        self._conn = sqlite3.connect(str(self.MEMORY_FILE), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(history_log)")]
+        if "previous_answer_z" not in columns:
+            self._conn.execute("ALTER TABLE history_log ADD COLUMN previous_answer_z BLOB")
+        if "merged_from" not in columns:
+            self._conn.execute("ALTER TABLE history_log ADD COLUMN merged_from TEXT")
+        columns = [row["name"] for row in self._conn.execute("PRAGMA table_info(intents)")]
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE intents ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        if "use_count" not in columns:
+            self._conn.execute("ALTER TABLE intents ADD COLUMN use_count INTEGER NOT NULL DEFAULT 0")
+
+        if migrate_from:
+            self.migrate_from_json(migrate_from)
+
+    def migrate_from_json(self, json_file: Path) -> int:
+        """
+        One-shot import of an existing memory_store.json. Only runs while the
+        database is still empty; returns the number of intents imported.
+        """
+        json_file = Path(json_file)
+        if not json_file.exists():
+            return 0
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM intents LIMIT 1").fetchone():
+                return 0
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"[Memory] Migration skipped, could not read {json_file}: {e}")
+                return 0
+
+            with self._conn:
+                for signature, record in data.items():
+                    self._write_record(signature, record)
+            print(f"[Memory] Migrated {len(data)} intents from {json_file.name} to SQLite.")
+            return len(data)
+
+    def _write_record(self, signature: str, record: dict):
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO intents ({INTENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                signature,
+                record.get("domain", "general"),
+                record.get("task", "unknown"),
+                record.get("object", "unknown"),
+                record.get("approved_answer") or record.get("answer"),
+                json.dumps(record.get("source", {})),
+                record.get("confidence"),
+                record.get("created_at"),
+                record.get("last_used_at"),
+                record.get("use_count", 0),
+                record.get("version", 1),
+            )
+        )
+        for entry in record.get("history_log", []):
+            self._archive(signature, entry)
+        self._apply_retention(signature)
+
+    def _archive(self, signature: str, entry: dict):
+        self._conn.execute(
+            """INSERT INTO history_log (intent, archived_at, previous_answer_z, previous_confidence, merged_from)
+               VALUES (?, ?, ?, ?, ?)""",
+            (signature, entry.get("archived_at"), compress_answer(entry.get("previous_answer")),
+             entry.get("previous_confidence"), entry.get("merged_from"))
+        )
+
+    def _apply_retention(self, signature: str):
+        if self.max_versions:
+            self._conn.execute(
+                """DELETE FROM history_log WHERE intent = ? AND id NOT IN
+                   (SELECT id FROM history_log WHERE intent = ? ORDER BY id DESC LIMIT ?)""",
+                (signature, signature, self.max_versions)
+            )
+        if self.max_age_days:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+            self._conn.execute("DELETE FROM history_log WHERE intent = ? AND archived_at < ?", (signature, cutoff))
+
+    def _row_to_record(self, row) -> dict:
+        history_count = self._conn.execute(
+            "SELECT COUNT(*) FROM history_log WHERE intent = ?", (row["intent"],)
+        ).fetchone()[0]
+        return {
+            "intent": row["intent"],
+            "domain": row["domain"],
+            "task": row["task"],
+            "object": row["object"],
+            "approved_answer": row["approved_answer"],
+            "source": json.loads(row["source"]) if row["source"] else {},
+            "confidence": row["confidence"],
+            "created_at": row["created_at"],
+            "last_used_at": row["last_used_at"],
+            "use_count": row["use_count"],
+            "history_count": history_count,
+            "version": row["version"]
+        }
+
+    def get_history(self, intent_signature: str) -> list:
+        """
+        Returns archived versions of an intent (oldest first).
+        """
+        intent_signature = self.aliases.resolve(intent_signature)
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT archived_at, previous_answer, previous_answer_z, previous_confidence, merged_from
+                   FROM history_log WHERE intent = ? ORDER BY id""",
+                (intent_signature,)
+            ).fetchall()
+        entries = []
+        for row in rows:
+            entry = {
+                "archived_at": row["archived_at"],
+                "previous_answer": decompress_answer(row["previous_answer_z"]) if row["previous_answer_z"] is not None
+                                   else row["previous_answer"],
+                "previous_confidence": row["previous_confidence"]
+            }
+            if row["merged_from"]:
+                entry["merged_from"] = row["merged_from"]
+            entries.append(entry)
+        return within_retention(entries, self.max_versions, self.max_age_days)
+
+    def get_intent_answer(self, intent_signature: str):
+        """
+        Returns the accepted answer if it exists for this intent.
+        """
+        intent_signature = self.aliases.resolve(intent_signature)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {INTENT_COLUMNS} FROM intents WHERE intent = ?", (intent_signature,)
+            ).fetchone()
+            if not row:
+                return None
+            record = self._row_to_record(row)
+            record["last_used_at"] = datetime.now().isoformat()
+            record["use_count"] += 1
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE intents SET last_used_at = ?, use_count = use_count + 1 WHERE intent = ?",
+                    (record["last_used_at"], intent_signature)
+                )
+            return record
+
+    def peek_intent_answer(self, intent_signature: str):
+        """Reads a record without counting it as a use (for offline jobs)."""
+        intent_signature = self.aliases.resolve(intent_signature)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {INTENT_COLUMNS} FROM intents WHERE intent = ?", (intent_signature,)
+            ).fetchone()
+            return self._row_to_record(row) if row else None
+
+    def save_intent_answer(self, intent_data: dict, answer: str, generated_by_models: list, confidence: float,
+                           auto_saved: bool = False, expected_version: int = None):
+        """
+        Saves the intent and answer with Rich Schema, archiving the previous answer
+        into history_log when the intent already exists.
+
+        expected_version enables optimistic concurrency (0 = must not exist yet).
+        Returns the saved record, or None on conflict.
+        """
+        signature = intent_data.get("intent_signature")
+        if not signature:
+            print("[Memory] Error: No intent_signature provided.")
+            return
+        signature = self.aliases.resolve(signature)
+
+        timestamp = datetime.now().isoformat()
+        source = {
+            "generated_by": generated_by_models,
+            "judge": "Gemini_Judge",
+            "human_verified": not auto_saved, # If auto-saved, it is NOT verified
+            "auto_saved": auto_saved
+        }
+
+        with self._lock, self._conn:
+            # Take the write lock up front so the read-check-write below is atomic across processes.
+            self._conn.execute("BEGIN IMMEDIATE")
+            existing = self._conn.execute(
+                "SELECT approved_answer, confidence, version FROM intents WHERE intent = ?", (signature,)
+            ).fetchone()
+            current_version = existing["version"] if existing else 0
+            if expected_version is not None and expected_version != current_version:
+                print(f"[Memory] Conflict saving '{signature}': expected version {expected_version}, found {current_version}.")
+                return None
+            if existing:
+                self._archive(signature, {
+                    "archived_at": timestamp,
+                    "previous_answer": existing["approved_answer"],
+                    "previous_confidence": existing["confidence"]
+                })
+                self._apply_retention(signature)
+                self._conn.execute(
+                    """UPDATE intents SET domain = ?, task = ?, object = ?, approved_answer = ?, source = ?,
+                       confidence = ?, last_used_at = ?, version = version + 1 WHERE intent = ?""",
+                    (intent_data.get("domain", "general"), intent_data.get("task", "unknown"),
+                     intent_data.get("object", "unknown"), answer, json.dumps(source),
+                     confidence, timestamp, signature)
+                )
+            else:
+                self._conn.execute(
+                    f"INSERT INTO intents ({INTENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (signature, intent_data.get("domain", "general"), intent_data.get("task", "unknown"),
+                     intent_data.get("object", "unknown"), answer, json.dumps(source),
+                     confidence, timestamp, timestamp, 0, 1)
+                )
+            row = self._conn.execute(
+                f"SELECT {INTENT_COLUMNS} FROM intents WHERE intent = ?", (signature,)
+            ).fetchone()
+            record = self._row_to_record(row)
+        for listener in self.save_listeners:
+            listener(signature, record)
+        return record
+
+    def merge_intents(self, alias: str, canonical: str) -> bool:
+        """
+        Folds a near-duplicate intent into `canonical`: the alias's answer and
+        history move to the canonical history, its row is deleted and lookups
+        of `alias` resolve to `canonical` from now on.
+        """
+        canonical = self.aliases.resolve(canonical)
+        if alias == canonical:
+            return False
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            if not self._conn.execute("SELECT 1 FROM intents WHERE intent = ?", (canonical,)).fetchone():
+                print(f"[Memory] Cannot merge into missing intent '{canonical}'.")
+                return False
+            row = self._conn.execute(
+                "SELECT approved_answer, confidence, use_count FROM intents WHERE intent = ?", (alias,)
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE history_log SET intent = ? WHERE intent = ?", (canonical, alias))
+                self._archive(canonical, {
+                    "archived_at": datetime.now().isoformat(),
+                    "previous_answer": row["approved_answer"],
+                    "previous_confidence": row["confidence"],
+                    "merged_from": alias
+                })
+                self._apply_retention(canonical)
+                self._conn.execute("UPDATE intents SET use_count = use_count + ? WHERE intent = ?",
+                                   (row["use_count"], canonical))
+                self._conn.execute("DELETE FROM intents WHERE intent = ?", (alias,))
+            self.aliases.add(alias, canonical)
+        print(f"[Memory] Merged '{alias}' into '{canonical}'.")
+        return True
+
+    def list_intents(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT intent FROM intents")]
+
+    def get_intents_by_domain(self, domain: str) -> list:
+        """
+        Returns a list of intent signatures that belong to the specified domain.
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT intent FROM intents WHERE domain = ?", (domain,))]
+
+    def get_match_candidates(self, intent_data: dict, limit: int = MAX_MATCH_CANDIDATES) -> list:
+        """
+        Narrowed candidate list for semantic intent matching: same domain and task
+        first, then the rest of the domain.
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT intent FROM intents WHERE domain = ? ORDER BY task != ? LIMIT ?",
+                (intent_data.get("domain"), intent_data.get("task"), limit)
+            )]
+
+    def is_persisted(self, intent_signature: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM intents WHERE intent = ?", (intent_signature,)
+            ).fetchone() is not None
+
+    def flush(self):
+        """Every call commits its own transaction; kept for MemoryStore API parity."""
+        pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    # One-shot migration: python -m router.memory_sqlite
+    from .memory import MEMORY_FILE
+    store = SQLiteMemoryStore(migrate_from=MEMORY_FILE)
+    print(f"[Memory] {len(store.list_intents())} intents in {store.MEMORY_FILE}")
+    store.close()
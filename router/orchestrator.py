@@ -1,25 +1,71 @@
 import asyncio
-# State tracking for follow-ups (in memory variable for this session)
-last_system_response = ""
-last_intent_sig = ""
-last_intent_data = {}
+import uuid
 from . import intent
 from .memory import memory
+from .answer_cache import answer_cache
+from .semantic_cache import semantic_cache
 from .llm_generators import generate_all
 from . import judge
-from .feedback import get_user_feedback
-from .context import ContextManager, EntityTraceMemory
+from .sessions import sessions
+from .feedback import review_in_terminal
 
-# Initialize Context Manager
-# Initialize Context Manager
-context_manager = ContextManager()
-entity_trace = EntityTraceMemory() # NEW: Trace Memory (Corrected Instantiation)
+# Conversation state (context, entity trace, follow-up state) lives in a
+# per-session object, so concurrent users never share it.
+DEFAULT_SESSION = "local"
+# The engine never waits for a human: a new answer comes back as a draft with a
+# continuation token, and the reply is sent with submit_feedback(). Drafts wait
+# in their session (so they expire and spill with it); older ones beyond this
+# many per session are dropped.
+MAX_PENDING_DRAFTS = 20
 
 IMPLICIT_TRIGGERS = {"jo", "us", "usi", "that", "it", "him", "her", "that movie", "that film", "woh"}
 
-async def process_query(user_query: str):
-    global last_system_response, last_intent_sig, last_intent_data
-    
+async def process_query(user_query: str, session_id: str = DEFAULT_SESSION) -> dict:
+    """
+    Answers a query, or drafts one for human review. Returns
+    {"status": "answered", "answer", ...} for follow-ups and memory hits, or
+    {"status": "awaiting_feedback", "draft", "continuation", ...}.
+    A session_id of None starts a new session (its id is in the result).
+    """
+    session = sessions.get(session_id)
+    try:
+        return await _process_query(user_query, session)
+    finally:
+        sessions.update(session)
+
+async def submit_feedback(continuation: str, feedback: str = "") -> dict:
+    """
+    Human reply to a draft: "" approves and saves it, a correction returns a
+    refined draft with a new continuation token, and a new question is
+    processed like process_query(). Each token can be used once.
+    """
+    token, _, session_id = continuation.partition(".")
+    session = sessions.peek(session_id) if session_id else None
+    pending = session.workflows.pop(token, None) if session else None
+    if not pending:
+        return {"error": "Continuation not found, expired or already used"}
+    try:
+        return await _apply_feedback(session, pending, feedback.strip())
+    except Exception:
+        session.workflows[token] = pending   # the client may retry
+        raise
+    finally:
+        sessions.update(session)
+
+def _await_feedback(session, pending: dict) -> dict:
+    token = uuid.uuid4().hex
+    session.workflows[token] = pending
+    drafts = [key for key, state in session.workflows.items() if state.get("kind") == "router_draft"]
+    for key in drafts[:-MAX_PENDING_DRAFTS]:
+        del session.workflows[key]
+    return {"status": "awaiting_feedback", "session_id": session.id, "continuation": f"{token}.{session.id}",
+            "draft": pending["draft"], "domain": pending["intent_data"]["domain"],
+            "intent_signature": pending["intent_data"]["intent_signature"]}
+
+async def _process_query(user_query: str, session):
+    context_manager = session.context
+    entity_trace = session.entity_trace
+
     # --- STEP 0: RESOLVE IMPLICIT REFERENCES ---
     if any(w in user_query.lower().split() for w in IMPLICIT_TRIGGERS):
         print(f"[Router] distinct implicit trigger found in '{user_query}'")
@@ -41,7 +87,7 @@ async def process_query(user_query: str):
     
     # 1. Classification (Follow-up vs New)
     history_str = context_manager.get_context_formatted()
-    classification = await intent.classify_query(user_query, history_str, last_intent_sig)
+    classification = await intent.classify_query(user_query, history_str, session.last_intent_sig)
     print(f"[Router] Classification: {classification['query_type']} ({classification['reasoning']})")
     
     # --- ROUTE 1: FOLLOW-UP (Contextual Refinement) ---
@@ -50,11 +96,11 @@ async def process_query(user_query: str):
         # We treat this as a "correction" or enhancement of the previous answer
         # If we have no previous response, we must treat it as new, but the classifier handles that.
         
-        refined_answer = await judge.review_correction(user_query, last_system_response, user_query)
+        refined_answer = await judge.review_correction(user_query, session.last_system_response, user_query)
         print(f"\n[Result] (Refined by Judge): {refined_answer}")
         
-        last_system_response = refined_answer
-        return refined_answer
+        session.last_system_response = refined_answer
+        return {"status": "answered", "source": "follow_up", "session_id": session.id, "answer": refined_answer}
 
     # --- ROUTE 2: NEW QUESTION (Standard Flow) ---
     
@@ -65,11 +111,9 @@ async def process_query(user_query: str):
     current_domain = intent_data["domain"]
     print(f"[Router] Intent Signature: {current_intent_sig} | Domain: {current_domain}")
     
-    # Update global intent state for NEXT turn
-    last_intent_sig = current_intent_sig
-    # Update global intent state for NEXT turn
-    last_intent_sig = current_intent_sig
-    last_intent_data = intent_data
+    # Update session intent state for NEXT turn
+    session.last_intent_sig = current_intent_sig
+    session.last_intent_data = intent_data
     
     # NEW: Update Entity Trace
     if intent_data.get("object") and intent_data.get("object") != "unknown_intent":
@@ -78,16 +122,47 @@ async def process_query(user_query: str):
     
     # 3. Check Memory (Only if same domain context if we wanted to be strict, but intent key implies uniqueness)
     cached_record = memory.get_intent_answer(current_intent_sig)
+    semantic_hit = None
+
+    # 3b. Exact miss: is this a paraphrase of a question with an approved answer?
+    if not cached_record:
+        semantic_hit = await semantic_cache.lookup(user_query, current_domain)
+        if semantic_hit:
+            print(f"[Router] Paraphrase of '{semantic_hit['intent_signature']}' ({semantic_hit['band']} similarity).")
+            cached_record = semantic_hit["record"]
+
+    # 3c. Still a miss: the same task may be stored under another signature
+    if not cached_record:
+        candidates = memory.get_match_candidates(intent_data)
+        if candidates:
+            print(f"[Router] Exact match failed. Checking semantic similarity in domain '{current_domain}'...")
+            match = await judge.find_matching_intent(current_intent_sig, candidates)
+            if match:
+                print(f"[Router] Semantic Match Found! Mapping '{current_intent_sig}' -> '{match}'")
+                cached_record = memory.get_intent_answer(match)
     
     if cached_record:
-        print("[Router] Intent found in memory! Routing to Judge for final delivery.")
         # Handle new vs legacy schema key
         answer_text = cached_record.get("approved_answer") or cached_record.get("answer")
-        
-        final_response = await judge.judge_from_memory(user_query, answer_text)
+
+        cached_answer = answer_cache.get(cached_record, user_query)
+
+        if cached_answer is not None:
+            # Original phrasing, or a phrasing already adapted for this version
+            print("[Router] Intent found in memory! Serving cached answer for this phrasing.")
+            final_response = cached_answer
+        elif semantic_hit and semantic_hit["band"] == "high":
+            # Same question in other words: the approved answer is served as-is
+            print("[Router] Serving approved answer directly.")
+            final_response = answer_text
+        else:
+            print("[Router] Intent found in memory! Routing to Judge for final delivery.")
+            final_response = await judge.judge_from_memory(user_query, answer_text)
+            answer_cache.put(cached_record, user_query, final_response)
         print(f"\n[Result] (From Memory): {final_response}")
-        last_system_response = final_response
-        return final_response
+        session.last_system_response = final_response
+        return {"status": "answered", "source": "memory", "session_id": session.id, "answer": final_response,
+                "intent_signature": cached_record.get("intent")}
     
     else:
         print("[Router] New Intent. Calling Generator LLMs...")
@@ -108,61 +183,57 @@ CURRENT QUERY:
         print("[Router] Generators finished. Judging...")
         judge_result = await judge.judge_responses(user_query, responses)
         
-        # 6. Iterative Human Feedback
-        final_answer = judge_result.get("corrected_answer") or judge_result.get("final_answer")
-        
-        while True:
-            print(f"\n[Proposed Answer]: {final_answer}")
-            print(f"[Domain]: {current_domain}")
-            
-            print("Press [ENTER] to approve, or type your correction/feedback below:")
-            user_feedback = input(">>> ").strip()
-            
-            if not user_feedback:
-                print("[Router] Feedback approved.")
-                # Store in Memory (New Schema)
-                memory.save_intent_answer(
-                    intent_data=intent_data,
-                    answer=final_answer,
-                    generated_by_models=generator_models,
-                    confidence=0.95 # Validated by human
-                )
-                print("[Router] Answer saved to memory.")
-                
-                # Update Context History
-                context_manager.add_turn("user", user_query)
-                context_manager.add_turn("assistant", final_answer)
-                
-                last_system_response = final_answer
-                return final_answer
-            
-            else:
-                # SMART FEEDBACK CHECK: Is this a correction or a new topic?
-                fb_classification = await intent.classify_query(user_feedback, final_answer, current_intent_sig)
-                
-                if fb_classification['query_type'] == 'follow_up':
-                    print(f"[Router] Feedback is a Follow-up ({fb_classification['reasoning']}). Refinement cycle...")
-                    # Update Memory timestamp for "last used" if we were editing a memory item (though here it's new)
-                    # For follow-ups effectively we are refining the intent.
-                    
-                    refined = await judge.review_correction(user_query, final_answer, user_feedback)
-                    final_answer = refined
-                    # Loop continues...
-                else:
-                # Intent Change
-                    print(f"[Router] Feedback is a NEW QUESTION ({fb_classification['reasoning']}). Switching context...")
-                    
-                    try:
-                        # Auto-save logic here if we were implementing it fully
-                        pass
-                    except Exception as e:
-                        print(f"[Auto-Save] Error saving draft: {e}")
-
-                    # We abandon the current iterative learning and start a fresh query
-                    return await process_query(user_feedback)
-
-                # We abandon the current iterative learning and start a fresh query
-                return await process_query(user_feedback)
+        # 6. Human Feedback (returned to the caller; see submit_feedback)
+        return _await_feedback(session, {
+            "kind": "router_draft",
+            "query": user_query,
+            "intent_data": intent_data,
+            "generator_models": generator_models,
+            "draft": judge_result.get("corrected_answer") or judge_result.get("final_answer"),
+        })
+
+async def _apply_feedback(session, pending: dict, user_feedback: str) -> dict:
+    user_query = pending["query"]
+    intent_data = pending["intent_data"]
+    final_answer = pending["draft"]
+
+    if not user_feedback:
+        print("[Router] Feedback approved.")
+        # Store in Memory (New Schema)
+        saved_record = memory.save_intent_answer(
+            intent_data=intent_data,
+            answer=final_answer,
+            generated_by_models=pending["generator_models"],
+            confidence=0.95 # Validated by human
+        )
+        print("[Router] Answer saved to memory.")
+        if saved_record:
+            answer_cache.remember_phrasing(saved_record, user_query)
+        # Index the question so paraphrases find this answer
+        await semantic_cache.add(user_query, saved_record)
+
+        # Update Context History
+        session.context.add_turn("user", user_query)
+        session.context.add_turn("assistant", final_answer)
+
+        session.last_system_response = final_answer
+        return {"status": "approved", "session_id": session.id, "answer": final_answer,
+                "intent_signature": intent_data["intent_signature"]}
+
+    # SMART FEEDBACK CHECK: Is this a correction or a new topic?
+    fb_classification = await intent.classify_query(user_feedback, final_answer, intent_data["intent_signature"])
+
+    if fb_classification['query_type'] == 'follow_up':
+        print(f"[Router] Feedback is a Follow-up ({fb_classification['reasoning']}). Refinement cycle...")
+        pending["draft"] = await judge.review_correction(user_query, final_answer, user_feedback)
+        return _await_feedback(session, pending)
+
+    # Intent Change
+    print(f"[Router] Feedback is a NEW QUESTION ({fb_classification['reasoning']}). Switching context...")
+    # The abandoned draft was never reviewed, so it is not saved to memory.
+
+    # We abandon the current iterative learning and start a fresh query
+    return await _process_query(user_feedback, session)
 
 if __name__ == "__main__":
     # Test specific flow
@@ -170,6 +241,6 @@ if __name__ == "__main__":
         try:
             q = input("\nEnter query (or 'exit'): ")
             if q.lower() == 'exit': break
-            asyncio.run(process_query(q))
+            asyncio.run(review_in_terminal(process_query(q)))
         except KeyboardInterrupt:
             break
@@ -0,0 +1,152 @@
+import json
+import os
+import re
+import threading
+
+# Refinement output: instead of rewriting a long answer, the editor returns
+# line edits against a numbered copy, applied and validated here. A patch that
+# doesn't parse or apply falls back to a full rewrite.
+#   REFINE_PATCH_MODE=auto   patch answers of at least PATCH_MIN_LINES lines
+#   REFINE_PATCH_MODE=on     always patch;  off: always rewrite
+REFINE_PATCH_MODE = os.getenv("REFINE_PATCH_MODE", "auto")
+PATCH_MIN_LINES = int(os.getenv("PATCH_MIN_LINES", "8"))
+
+PATCH_INSTRUCTIONS = """The answer is given with line numbers ("12| text"). Do NOT rewrite it.
+Return ONLY valid JSON with the edits that apply the feedback, line numbers as given:
+{"edits": [
+  {"op": "replace", "start": 3, "end": 5, "text": "new lines replacing 3-5 (inclusive)"},
+  {"op": "insert_after", "line": 7, "text": "new lines after line 7 (0 = at the top)"},
+  {"op": "delete", "start": 9, "end": 9}
+]}
+Edits must not overlap. Never include the "N| " prefixes in "text".
+If nearly every line has to change, return {"full_text": "the complete new answer"} instead."""
+
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+_PREFIX_RE = re.compile(r"^\s*\d+\| ?")
+
+
+def use_patch(text: str, mode: str = None) -> bool:
+    mode = mode or REFINE_PATCH_MODE
+    if mode == "on":
+        return True
+    if mode == "off":
+        return False
+    return text.count("\n") + 1 >= PATCH_MIN_LINES
+
+
+def number_lines(text: str) -> str:
+    return "\n".join(f"{i}| {line}" for i, line in enumerate(text.split("\n"), 1))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // 4 + 1
+
+
+def _lines(value) -> list:
+    if not isinstance(value, str):
+        raise ValueError("edit text must be a string")
+    lines = value.split("\n")
+    # Models sometimes copy the numbering into the replacement. Only strip it when
+    # every line carries it, so content such as a "10| rows" table line survives.
+    numbered = [line for line in lines if line.strip()]
+    if numbered and all(_PREFIX_RE.match(line) for line in numbered):
+        lines = [_PREFIX_RE.sub("", line) for line in lines]
+    return lines
+
+
+def apply_edits(text: str, edits: list) -> str:
+    """
+    Applies replace / insert_after / delete edits (1-based, inclusive line
+    numbers of the original text). Raises ValueError on malformed, out of
+    range or overlapping edits, so nothing half-applied is ever returned.
+    """
+    lines = text.split("\n")
+    count = len(lines)
+    if not isinstance(edits, list) or not edits:
+        raise ValueError("no edits")
+
+    spans, inserts = [], []
+    for edit in edits:
+        op = edit.get("op") if isinstance(edit, dict) else None
+        if op in ("replace", "delete"):
+            start, end = edit.get("start"), edit.get("end", edit.get("start"))
+            if not (isinstance(start, int) and isinstance(end, int) and 1 <= start <= end <= count):
+                raise ValueError(f"bad range {start}-{end} for {count} lines")
+            spans.append((start, end, _lines(edit.get("text", "")) if op == "replace" else []))
+        elif op == "insert_after":
+            line = edit.get("line")
+            if not (isinstance(line, int) and 0 <= line <= count):
+                raise ValueError(f"bad insert position {line} for {count} lines")
+            inserts.append((line, _lines(edit.get("text"))))
+        else:
+            raise ValueError(f"unknown op {op!r}")
+
+    spans.sort()
+    for (_, previous_end, _), (start, _, _) in zip(spans, spans[1:]):
+        if start <= previous_end:
+            raise ValueError("overlapping edits")
+    for line, _ in inserts:
+        if any(start <= line < end for start, end, _ in spans):
+            raise ValueError(f"insert after line {line} falls inside a replaced range")
+
+    # Bottom-up, so earlier line numbers stay valid; an insert after a replaced
+    # range's last line goes after its replacement.
+    operations = [(end, 1, start, new) for start, end, new in spans] + [(line, 0, None, new) for line, new in inserts]
+    for position, is_span, start, new in sorted(operations, key=lambda o: (o[0], -o[1]), reverse=True):
+        if is_span:
+            lines[start - 1:position] = new
+        else:
+            lines[position:position] = new
+
+    result = "\n".join(lines)
+    if not result.strip():
+        raise ValueError("patch left the answer empty")
+    return result
+
+
+def apply_patch_response(text: str, response: str) -> str:
+    """Parses the editor's JSON and returns the patched text (ValueError if unusable)."""
+    if not response or response.startswith("Error"):
+        raise ValueError(response or "empty response")
+    match = _JSON_RE.search(response)
+    if not match:
+        raise ValueError("no JSON in response")
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}")
+    return apply_patch(text, data)
+
+
+def apply_patch(text: str, data: dict) -> str:
+    """Applies a parsed {"edits": [...]} or {"full_text": ...} reply."""
+    if isinstance(data.get("full_text"), str) and data["full_text"].strip():
+        return data["full_text"]
+    return apply_edits(text, data.get("edits"))
+
+
+class RefineStats:
+    """Output tokens and latency per refinement path ("patch", "failed_patch", "rewrite")."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def record(self, path: str, output: str, seconds: float):
+        tokens = estimate_tokens(output)
+        with self._lock:
+            entry = self._paths.setdefault(path, {"calls": 0, "output_tokens": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["output_tokens"] += tokens
+            entry["seconds"] += seconds
+        print(f"[Refine] {path}: ~{tokens} output tokens, {seconds * 1000:.0f} ms")
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {path: {"calls": e["calls"],
+                           "avg_output_tokens": round(e["output_tokens"] / e["calls"], 1),
+                           "avg_ms": round(e["seconds"] * 1000 / e["calls"], 1)}
+                    for path, e in self._paths.items()}
+
+
+# Global instance
+refine_stats = RefineStats()
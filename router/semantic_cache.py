@@ -0,0 +1,139 @@
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from .memory import memory
+from .vector_store import vector_store
+
+# Paraphrase lookup after an exact intent_signature miss. The query is embedded
+# and matched against the queries of human-approved answers:
+#   score >= SEMANTIC_CACHE_HIGH              serve the stored answer as-is
+#   SEMANTIC_CACHE_LOW <= score < HIGH        adapt it with judge_from_memory
+#   below SEMANTIC_CACHE_LOW                  miss: generate as usual
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "1") == "1"
+SEMANTIC_CACHE_HIGH = float(os.getenv("SEMANTIC_CACHE_HIGH", "0.92"))
+SEMANTIC_CACHE_LOW = float(os.getenv("SEMANTIC_CACHE_LOW", "0.80"))
+# Every lookup (band and best score) is appended here for threshold tuning.
+SEMANTIC_CACHE_LOG = Path(os.getenv("SEMANTIC_CACHE_LOG", Path(__file__).resolve().parent / "semantic_cache_log.jsonl"))
+
+
+def record_text(record: dict) -> str:
+    """Stand-in query for records saved before their query was indexed."""
+    words = [record.get("task"), record.get("object")]
+    text = " ".join(w.replace("_", " ") for w in words if w and w != "unknown")
+    return text or record.get("intent", "").replace("_", " ")
+
+
+class SemanticCache:
+    def __init__(self, store=vector_store, high: float = SEMANTIC_CACHE_HIGH, low: float = SEMANTIC_CACHE_LOW,
+                 log_path: Path = SEMANTIC_CACHE_LOG, enabled: bool = SEMANTIC_CACHE):
+        self.store = store
+        self.high = high
+        self.low = low
+        self.log_path = Path(log_path)
+        self.enabled = enabled
+        self.stats = {"lookups": 0, "high": 0, "mid": 0, "miss": 0}
+
+    def band(self, score: float) -> str:
+        if score is None or score < self.low:
+            return "miss"
+        return "high" if score >= self.high else "mid"
+
+    def _log(self, entry: dict):
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"[SemanticCache] Could not write log: {e}")
+
+    async def lookup(self, query: str, domain: str = None) -> dict:
+        """
+        Nearest approved answer for a paraphrased query, or None on a miss.
+        Returns {"band": "high" | "mid", "score", "intent_signature", "record"}.
+        """
+        if not self.enabled:
+            return None
+        where = {"human_verified": True, "domain": domain} if domain else {"human_verified": True}
+        # No threshold here: the best score is logged even on a miss
+        hits = await self.store.search_similar(query, top_k=1, threshold=-1.0, where=where)
+        hit = hits[0] if hits else None
+        score = hit["score"] if hit else None
+        band = self.band(score)
+
+        record = None
+        signature = (hit.get("metadata") or {}).get("intent_signature") if hit else None
+        if band != "miss":
+            # The index only points at the intent; the answer is read from memory so
+            # it is always the current version (and a deleted intent is a miss).
+            record = memory.get_intent_answer(signature)
+            if not record:
+                band = "miss"
+
+        self.stats["lookups"] += 1
+        self.stats[band] += 1
+        self._log({"at": datetime.now().isoformat(), "query": query, "domain": domain, "band": band,
+                   "score": score, "intent_signature": signature})
+        print(f"[SemanticCache] {band} (similarity {score if score is None else round(score, 3)}, "
+              f"hit rate {(self.stats['high'] + self.stats['mid']) / self.stats['lookups']:.0%})")
+        if band == "miss":
+            return None
+        return {"band": band, "score": score, "intent_signature": signature, "record": record}
+
+    async def add(self, query: str, record: dict):
+        """Indexes the query that produced an approved answer."""
+        if not self.enabled or not record:
+            return
+        await self.store.insert_memory(query, metadata=self._metadata(record))
+
+    @staticmethod
+    def _metadata(record: dict) -> dict:
+        return {"intent_signature": record.get("intent"), "domain": record.get("domain"),
+                "task": record.get("task"),
+                "human_verified": bool((record.get("source") or {}).get("human_verified")),
+                "created_at": record.get("created_at")}
+
+    async def backfill(self) -> int:
+        """One-off: indexes every stored answer under a text built from its intent fields."""
+        records = [memory.peek_intent_answer(key) for key in memory.list_intents()]
+        records = [r for r in records if r]
+        return await self.store.insert_many([record_text(r) for r in records],
+                                            metadatas=[self._metadata(r) for r in records])
+
+
+def report(log_path: Path = SEMANTIC_CACHE_LOG, buckets: int = 10):
+    """Hit rates and the best-score distribution from the lookup log."""
+    entries = []
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    if not entries:
+        print("No lookups logged.")
+        return
+    total = len(entries)
+    for band in ("high", "mid", "miss"):
+        count = sum(1 for e in entries if e["band"] == band)
+        print(f"{band:<5} {count:>7} {count / total:>7.1%}")
+    scores = [e["score"] for e in entries if e.get("score") is not None]
+    print(f"\nBest-match similarity ({len(scores)} lookups with a candidate):")
+    counts = [0] * buckets
+    for score in scores:
+        counts[min(max(int(score * buckets), 0), buckets - 1)] += 1   # <0 and 1.0 go to the end buckets
+    for i, count in enumerate(counts):
+        print(f"  {i / buckets:.1f}-{(i + 1) / buckets:.1f} {count:>7} {'#' * round(40 * count / max(len(scores), 1))}")
+
+
+# Global instance
+semantic_cache = SemanticCache()
+
+
+if __name__ == "__main__":
+    # python -m router.semantic_cache report | backfill
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "backfill":
+        import asyncio
+        print(f"Indexed {asyncio.run(semantic_cache.backfill())} stored answers.")
+    else:
+        report()
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from .context import ContextManager, EntityTraceMemory
+from .storage import atomic_write_text
+
+# Per-user conversation state. Sessions idle for SESSION_IDLE_TTL seconds are
+# dropped; beyond SESSION_MAX sessions or SESSION_MEMORY_MB of state the least
+# recently used ones are evicted, to SESSION_SPILL_DIR when set (and reloaded
+# transparently on their next request) or dropped otherwise.
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+SESSION_MEMORY_MB = float(os.getenv("SESSION_MEMORY_MB", "256"))
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", "")
+SWEEP_INTERVAL = 60   # seconds between idle sweeps (memory and spill dir)
+
+
+class Session:
+    """Everything one conversation needs: context, entity trace, follow-up state and pending drafts."""
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.context = ContextManager()
+        self.entity_trace = EntityTraceMemory()
+        self.last_system_response = ""
+        self.last_intent_sig = ""
+        self.last_intent_data = {}
+        self.workflows = {}   # continuation token -> pending router draft (see orchestrator.py)
+        self.last_active = time.time()
+        self.size = 0         # approximate bytes, refreshed by SessionStore.update()
+
+    def estimate_size(self) -> int:
+        return (self.context.size_chars() + len(self.last_system_response) +
+                len(json.dumps([self.last_intent_data, self.workflows, self.entity_trace.entities],
+                               ensure_ascii=False, default=str)))
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "last_active": self.last_active, "context": self.context.to_dict(),
+                "entity_trace": self.entity_trace.to_dict(), "last_system_response": self.last_system_response,
+                "last_intent_sig": self.last_intent_sig, "last_intent_data": self.last_intent_data,
+                "workflows": self.workflows}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        session = cls(data["id"])
+        session.last_active = data.get("last_active", time.time())
+        session.context.load_dict(data.get("context", {}))
+        session.entity_trace.load_dict(data.get("entity_trace", {}))
+        session.last_system_response = data.get("last_system_response", "")
+        session.last_intent_sig = data.get("last_intent_sig", "")
+        session.last_intent_data = data.get("last_intent_data", {})
+        session.workflows = data.get("workflows", {})
+        return session
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = SESSION_MAX, idle_ttl: float = SESSION_IDLE_TTL,
+                 memory_mb: float = SESSION_MEMORY_MB, spill_dir: str = SESSION_SPILL_DIR):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.memory_cap = int(memory_mb * 1024 * 1024)
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._sessions = OrderedDict()   # session_id -> Session, least recently used first
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._last_sweep = time.time()
+        self.stats = {"created": 0, "expired": 0, "evicted": 0, "spilled": 0, "restored": 0}
+
+    def _spill_path(self, session_id: str) -> Path:
+        # Client-supplied ids never become file names directly
+        return self.spill_dir / (hashlib.sha1(session_id.encode('utf-8')).hexdigest() + ".json")
+
+    def _expired(self, session: Session, now: float) -> bool:
+        return bool(self.idle_ttl) and now - session.last_active > self.idle_ttl
+
+    def get(self, session_id: str = None) -> Session:
+        """The session for this id (created if unknown or expired; a new id if None)."""
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session and self._expired(session, now):
+                self._remove(session_id)
+                self.stats["expired"] += 1
+                session = None
+            if session is None and session_id and self.spill_dir:
+                session = self._restore(session_id, now)
+            if session is None:
+                session = Session(session_id or uuid.uuid4().hex)
+                self.stats["created"] += 1
+            if session.id not in self._sessions:
+                self._sessions[session.id] = session
+                session.size = session.estimate_size()
+                self._bytes += session.size
+            self._sessions.move_to_end(session.id)
+            session.last_active = now
+            self._enforce_limits(keep=session.id)
+            return session
+
+    def peek(self, session_id: str) -> Session:
+        """Like get(), but None instead of creating a session."""
+        with self._lock:
+            known = session_id in self._sessions or (self.spill_dir and self._spill_path(session_id).exists())
+        return self.get(session_id) if known else None
+
+    def update(self, session: Session):
+        """Call after a request mutated the session: refreshes its size and enforces the memory cap."""
+        with self._lock:
+            if self._sessions.get(session.id) is not session:
+                return
+            size = session.estimate_size()
+            self._bytes += size - session.size
+            session.size = size
+            session.last_active = time.time()
+            self._enforce_limits(keep=session.id)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+            if self.spill_dir:
+                self._spill_path(session_id).unlink(missing_ok=True)
+
+    def _remove(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session:
+            self._bytes -= session.size
+        return session
+
+    def _enforce_limits(self, keep: str = None):
+        """Evicts least recently used sessions (never `keep`) until within count and memory caps."""
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.memory_cap):
+            victim_id = next(iter(self._sessions))
+            if victim_id == keep:
+                self._sessions.move_to_end(keep)
+                continue
+            victim = self._remove(victim_id)
+            self.stats["evicted"] += 1
+            if self.spill_dir:
+                self._spill(victim)
+
+    def _spill(self, session: Session):
+        try:
+            atomic_write_text(self._spill_path(session.id), json.dumps(session.to_dict(), ensure_ascii=False))
+            self.stats["spilled"] += 1
+        except Exception as e:
+            print(f"[Sessions] Could not spill session {session.id}: {e}")
+
+    def _restore(self, session_id: str, now: float):
+        path = self._spill_path(session_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                session = Session.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[Sessions] Could not restore session {session_id}: {e}")
+            return None
+        finally:
+            path.unlink(missing_ok=True)
+        if self._expired(session, now):
+            self.stats["expired"] += 1
+            return None
+        self.stats["restored"] += 1
+        return session
+
+    def _sweep(self, now: float):
+        """Drops idle sessions from memory and from the spill directory (rate-limited)."""
+        if not self.idle_ttl or now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for session_id in [sid for sid, s in self._sessions.items() if self._expired(s, now)]:
+            self._remove(session_id)
+            self.stats["expired"] += 1
+        if self.spill_dir:
+            for path in self.spill_dir.glob("*.json"):
+                try:
+                    if now - path.stat().st_mtime > self.idle_ttl:
+                        path.unlink()
+                        self.stats["expired"] += 1
+                except FileNotFoundError:
+                    pass
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def summary(self) -> dict:
+        """Counts and memory use for monitoring."""
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._bytes, **self.stats}
+
+
+# Global instance
+sessions = SessionStore()
@@ -0,0 +1,193 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import MutableMapping
+from pathlib import Path
+
+# Binary snapshot layout:
+#   MAGIC
+#   record bodies: json(record) back to back
+#   index: json([[key, domain, task, object, last_used_at, use_count, confidence, auto_saved], ...])
+#   offsets: little-endian uint64 x (count + 1), body i spans offsets[i]..offsets[i+1]
+#   trailer: index offset, index length, count, MAGIC
+# Opening a snapshot maps the file and parses only the index; bodies are decoded on first access.
+MAGIC = b"IMSNAP1\n"
+_TRAILER = struct.Struct(">QQQ8s")
+
+
+def _meta_row(key: str, record: dict) -> list:
+    return [key, record.get("domain"), record.get("task"), record.get("object"), record.get("last_used_at"),
+            record.get("use_count", 0), record.get("confidence"), bool(record.get("source", {}).get("auto_saved"))]
+
+
+def _le_offsets(values) -> bytes:
+    offsets = array("Q", values)
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    return offsets.tobytes()
+
+
+def encode_snapshot(memory) -> bytes:
+    """
+    Serializes a record mapping. Records of a LazyRecords that were never
+    accessed are copied as raw bytes without being decoded.
+    """
+    bodies, rows, offsets = [], [], [len(MAGIC)]
+    for key in list(memory.keys()):
+        raw = memory.raw(key) if isinstance(memory, LazyRecords) else None
+        if raw is not None:
+            body, row = raw
+        else:
+            record = memory[key]
+            body, row = json.dumps(record, ensure_ascii=False).encode('utf-8'), _meta_row(key, record)
+        bodies.append(body)
+        rows.append(row)
+        offsets.append(offsets[-1] + len(body))
+
+    index = json.dumps(rows, ensure_ascii=False).encode('utf-8')
+    index_offset = offsets[-1]
+    return b"".join([MAGIC, *bodies, index, _le_offsets(offsets),
+                     _TRAILER.pack(index_offset, len(index), len(rows), MAGIC)])
+
+
+class LazyRecords(MutableMapping):
+    """
+    Dict-like view of a memory-mapped binary snapshot. Records are decoded on
+    first access and then kept (and mutated) like ordinary dict values; new or
+    replaced records live only in memory until the next snapshot.
+    """
+    def __init__(self):
+        self._mm = None
+        self._file = None
+        self._rows = []
+        self._offsets = None
+        self._slots = {}     # key -> row number, for records still only on disk
+        self._loaded = {}    # decoded or newly written records
+
+    @classmethod
+    def open(cls, path: Path) -> "LazyRecords":
+        records = cls()
+        records._map(Path(path))
+        records._slots = {row[0]: i for i, row in enumerate(records._rows)}
+        return records
+
+    def _map(self, path: Path):
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path.name} is not a binary memory snapshot")
+            index_offset, index_len, count, magic = _TRAILER.unpack(self._mm[-_TRAILER.size:])
+            if magic != MAGIC:
+                raise ValueError(f"{path.name} is truncated")
+            self._rows = json.loads(self._mm[index_offset:index_offset + index_len])
+            offsets_start = index_offset + index_len
+            self._offsets = array("Q")
+            self._offsets.frombytes(self._mm[offsets_start:offsets_start + 8 * (count + 1)])
+            if sys.byteorder == "big":
+                self._offsets.byteswap()
+        except:
+            self.release()
+            raise
+
+    def release(self):
+        """Unmaps the file. Records not yet decoded become unreachable until remap()."""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remap(self, path: Path):
+        """Points the undecoded records at a new snapshot that contains them byte-for-byte."""
+        pending = self._slots
+        self.release()
+        self._map(Path(path))
+        self._slots = {}
+        for i, row in enumerate(self._rows):
+            if row[0] in pending:
+                self._slots[row[0]] = i
+
+    def adopt(self, other: "LazyRecords"):
+        """Takes over another instance's state (used to reload in place)."""
+        self.release()
+        self.__dict__.update(other.__dict__)
+        other.__dict__.update(LazyRecords().__dict__)
+
+    def raw(self, key: str):
+        """(body bytes, index row) for a record that was never decoded, else None."""
+        i = self._slots.get(key)
+        if i is None:
+            return None
+        return self._mm[self._offsets[i]:self._offsets[i + 1]], self._rows[i]
+
+    def meta_items(self):
+        """
+        (key, record) pairs where undecoded records are stand-ins carrying only the
+        indexed fields (domain/task/object/last_used_at/use_count/confidence/auto_saved).
+        """
+        for key, record in self._loaded.items():
+            yield key, record
+        for key, i in self._slots.items():
+            _, domain, task, obj, last_used_at, use_count, confidence, auto_saved = self._rows[i]
+            yield key, {"domain": domain, "task": task, "object": obj, "last_used_at": last_used_at,
+                        "use_count": use_count, "confidence": confidence, "source": {"auto_saved": auto_saved}}
+
+    def __getitem__(self, key):
+        record = self._loaded.get(key)
+        if record is not None:
+            return record
+        i = self._slots.pop(key)
+        record = self._loaded[key] = json.loads(self._mm[self._offsets[i]:self._offsets[i + 1]])
+        return record
+
+    def __setitem__(self, key, record):
+        self._slots.pop(key, None)
+        self._loaded[key] = record
+
+    def __delitem__(self, key):
+        if key in self._loaded:
+            del self._loaded[key]
+        else:
+            del self._slots[key]
+
+    def __contains__(self, key):
+        return key in self._loaded or key in self._slots
+
+    def __iter__(self):
+        yield from list(self._loaded)
+        yield from list(self._slots)
+
+    def __len__(self):
+        return len(self._loaded) + len(self._slots)
+
+    def clear(self):
+        self._loaded.clear()
+        self._slots.clear()
+
+
+def convert(memory_file: Path, to: str):
+    """Forces conversion between memory_store.json (+ .log) and the binary snapshot."""
+    from .storage import BinaryStorage, LogStorage
+    reader, writer = (LogStorage, BinaryStorage) if to == "binary" else (BinaryStorage, LogStorage)
+    reader, writer = reader(memory_file), writer(memory_file)
+    memory = reader.load()
+    writer.overwrite(memory)
+    print(f"[Memory] Converted {len(memory)} intents to {to}.")
+    reader.close()
+    writer.close()
+
+
+if __name__ == "__main__":
+    # Run as: python -m router.snapshot binary|json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the intent memory between JSON and binary snapshots")
+    parser.add_argument("to", choices=["binary", "json"])
+    parser.add_argument("--file", type=Path, default=Path(__file__).resolve().parent / "memory_store.json",
+                        help="path of memory_store.json")
+    args = parser.parse_args()
+    convert(args.file, args.to)
@@ -0,0 +1,432 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from .snapshot import LazyRecords, encode_snapshot
+
+# LogStorage compacts once the log is at least this large AND larger than the snapshot,
+# which keeps the amortized cost of a write O(record).
+COMPACT_MIN_BYTES = int(os.getenv("MEMORY_COMPACT_MIN_BYTES", str(1024 * 1024)))
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Writes data to a temp file next to `path` and renames it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_text(path: Path, text: str):
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def file_token(path: Path):
+    """Cheap change-detection token: (inode, mtime, size), or None if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _mtime(*paths) -> int:
+    return max((os.stat(p).st_mtime_ns for p in paths if os.path.exists(p)), default=0)
+
+
+def _newer_format(json_path: Path):
+    """
+    "binary" or "json", whichever of the binary snapshot (+ .binlog) and the JSON
+    store (+ .log) was written last; None if neither is strictly newer.
+    """
+    binary = _mtime(json_path.with_suffix(".bin"), json_path.with_suffix(".binlog"))
+    text = _mtime(json_path, json_path.with_suffix(".log"))
+    if binary > text:
+        return "binary"
+    if text > binary:
+        return "json"
+    return None
+
+
+def _json_keys(path: Path) -> set:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return set(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return set()
+
+
+def _log_keys(log_path: Path, keys: set) -> set:
+    """Applies a log's put/del entries to `keys` without repairing or rewriting anything."""
+    try:
+        with open(log_path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return keys
+    for line in data[:data.rfind(b"\n") + 1].splitlines():
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if entry.get("op") == "put":
+            keys.add(entry.get("key"))
+        elif entry.get("op") == "del":
+            keys.discard(entry.get("key"))
+    return keys
+
+
+def _import_binary(json_path: Path) -> dict:
+    """Brings memory_store.json up to date with a newer binary snapshot (switching storage back)."""
+    reader = BinaryStorage(json_path)
+    memory = dict(reader.load().items())
+    reader.close()
+    atomic_write_text(json_path, json.dumps(memory, indent=2))
+    for stale in (json_path.with_suffix(".log"), json_path.with_suffix(".log.old")):
+        if stale.exists():
+            os.remove(stale)
+    print(f"[Memory] Imported {len(memory)} intents from {json_path.with_suffix('.bin').name}.")
+    return memory
+
+
+class JsonStorage:
+    """
+    The original format: the whole store as one pretty-printed JSON object.
+    Every commit rewrites the file (atomically).
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._token = None
+
+    def load(self) -> dict:
+        if _newer_format(self.path) == "binary":
+            _import_binary(self.path)
+        if not self.path.exists():
+            atomic_write_text(self.path, "{}")
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                memory = json.load(f)
+        except:
+            memory = {}
+        self._token = file_token(self.path)
+        return memory
+
+    def encode(self, memory: dict, changes: dict):
+        """Called under the store's data lock. Returns the payload for commit()."""
+        return json.dumps(memory, indent=2)
+
+    def commit(self, payload):
+        atomic_write_text(self.path, payload)
+        self._token = file_token(self.path)
+
+    def persisted_keys(self) -> set:
+        """Keys currently on disk, read without creating or converting files."""
+        return _json_keys(self.path)
+
+    def changed(self) -> bool:
+        """True if another process rewrote the file since we last read or wrote it."""
+        return file_token(self.path) != self._token
+
+    def refresh(self, memory: dict):
+        """Reloads `memory` in place. Returns None: any key may have changed."""
+        fresh = self.load()
+        memory.clear()
+        memory.update(fresh)
+        return None
+
+    def close(self):
+        pass
+
+
+class LogStorage:
+    """
+    Snapshot + append-only log.
+
+    The snapshot is `memory_store.json` in the original format; every mutation is
+    appended to `memory_store.log` as one JSON line:
+        {"op": "put", "key": ..., "record": {...}}
+        {"op": "touch", "key": ..., "last_used_at": ..., "use_count": ...}
+        {"op": "del", "key": ...}
+    Startup replays the log over the snapshot. A torn final line (crash mid-append)
+    is dropped, so at most the last record is lost.
+
+    Compaction rotates the log to `.log.old`, atomically rewrites the snapshot and
+    then deletes `.log.old`. Replaying `.log.old` over the new snapshot is a no-op,
+    so a crash at any step leaves a loadable store.
+    """
+    def __init__(self, path: Path, compact_min_bytes: int = COMPACT_MIN_BYTES):
+        self.path = Path(path)
+        self.log_path = self.path.with_suffix(".log")
+        self.old_log_path = self.path.with_suffix(".log.old")
+        self.compact_min_bytes = compact_min_bytes
+        self._log = None
+        self._log_ino = None
+        self._log_bytes = 0          # size of the live log we have applied
+        self._snapshot_bytes = 0
+        self._snapshot_token = None
+
+    def load(self) -> dict:
+        if _newer_format(self.path) == "binary":
+            _import_binary(self.path)
+        memory = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    memory = json.load(f)
+            except:
+                memory = {}
+            self._snapshot_bytes = self.path.stat().st_size
+        self._snapshot_token = file_token(self.path)
+
+        interrupted = self.old_log_path.exists()
+        if interrupted:
+            self._replay(self.old_log_path, memory)
+        self._log_bytes, _ = self._replay(self.log_path, memory)
+        self._open_log()
+
+        if interrupted or not self.path.exists():
+            # Finish an interrupted compaction (or create the initial snapshot).
+            self._write_snapshot(json.dumps(memory, indent=2))
+        return memory
+
+    def _open_log(self):
+        self._log = open(self.log_path, 'ab')
+        self._log_ino = os.fstat(self._log.fileno()).st_ino
+
+    def _replay(self, log_path: Path, memory: dict, start: int = 0):
+        """
+        Applies a log file from byte `start` to `memory`.
+        Returns (size of its valid prefix, set of keys touched).
+        """
+        if not log_path.exists():
+            return 0, set()
+        with open(log_path, 'rb') as f:
+            f.seek(start)
+            data = f.read()
+
+        valid = data.rfind(b"\n") + 1
+        if valid < len(data):
+            print(f"[Memory] Dropping torn record at end of {log_path.name}")
+            with open(log_path, 'r+b') as f:
+                f.truncate(start + valid)
+
+        keys = set()
+        for line in data[:valid].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[Memory] Skipping corrupt record in {log_path.name}")
+                continue
+            self._apply(entry, memory)
+            keys.add(entry.get("key"))
+        return start + valid, keys
+
+    @staticmethod
+    def _apply(entry: dict, memory: dict):
+        op, key = entry.get("op"), entry.get("key")
+        if op == "put":
+            memory[key] = entry["record"]
+        elif op == "touch" and key in memory:
+            memory[key]["last_used_at"] = entry["last_used_at"]
+            if "use_count" in entry:
+                memory[key]["use_count"] = entry["use_count"]
+        elif op == "del":
+            memory.pop(key, None)
+
+    def encode(self, memory: dict, changes: dict):
+        """
+        Called under the store's data lock with {intent_signature: op}.
+        Returns (log_bytes, snapshot_payload_or_None) for commit().
+        """
+        log_bytes = self._log_entries(memory, changes)
+        snapshot = None
+        if self._compaction_due(len(log_bytes)):
+            snapshot = json.dumps(memory, indent=2)
+        return log_bytes, snapshot
+
+    def _compaction_due(self, new_bytes: int) -> bool:
+        pending = self._log_bytes + new_bytes
+        return pending >= self.compact_min_bytes and pending >= self._snapshot_bytes
+
+    @staticmethod
+    def _log_entries(memory: dict, changes: dict) -> bytes:
+        lines = []
+        for key, op in changes.items():
+            record = memory.get(key)
+            if op == "del" or record is None:
+                entry = {"op": "del", "key": key}
+            elif op == "touch":
+                entry = {"op": "touch", "key": key, "last_used_at": record.get("last_used_at"),
+                         "use_count": record.get("use_count", 0)}
+            else:
+                entry = {"op": "put", "key": key, "record": record}
+            lines.append(json.dumps(entry, ensure_ascii=False))
+        return ("\n".join(lines) + "\n").encode('utf-8') if lines else b""
+
+    def persisted_keys(self) -> set:
+        """Keys currently on disk (snapshot + logs), read without compacting or repairing."""
+        keys = _json_keys(self.path)
+        for log_path in (self.old_log_path, self.log_path):
+            _log_keys(log_path, keys)
+        return keys
+
+    def changed(self) -> bool:
+        """True if another process appended to the log or compacted since we last synced."""
+        if file_token(self.path) != self._snapshot_token:
+            return True
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return True
+        return st.st_ino != self._log_ino or st.st_size != self._log_bytes
+
+    def refresh(self, memory: dict):
+        """
+        Catches `memory` up with other writers. Replays only the new log tail when
+        possible; returns the touched keys, or None after a full reload (compaction).
+        """
+        log_token = file_token(self.log_path)
+        if file_token(self.path) == self._snapshot_token and log_token and log_token[0] == self._log_ino:
+            self._log_bytes, keys = self._replay(self.log_path, memory, start=self._log_bytes)
+            return keys
+        self.close()
+        self._reload_into(memory, self.load())
+        return None
+
+    @staticmethod
+    def _reload_into(memory: dict, fresh: dict):
+        memory.clear()
+        memory.update(fresh)
+
+    def commit(self, payload):
+        log_bytes, snapshot = payload
+        if log_bytes:
+            self._log.write(log_bytes)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log_bytes += len(log_bytes)
+        if snapshot is not None:
+            self._compact(snapshot)
+
+    def _compact(self, snapshot: str):
+        self._log.close()
+        os.replace(self.log_path, self.old_log_path)
+        self._open_log()
+        self._log_bytes = 0
+        self._write_snapshot(snapshot)
+
+    def _write_snapshot(self, snapshot: str):
+        atomic_write_text(self.path, snapshot)
+        self._snapshot_bytes = self.path.stat().st_size
+        self._snapshot_token = file_token(self.path)
+        if self.old_log_path.exists():
+            os.remove(self.old_log_path)
+        if self._log_bytes:
+            # Everything in the live log is now part of the snapshot.
+            self._log.truncate(0)
+            self._log_bytes = 0
+
+    def overwrite(self, memory):
+        """Replaces the stored state with `memory` (used by offline conversion)."""
+        atomic_write_text(self.path, json.dumps(dict(memory.items()), indent=2))
+        for stale in (self.log_path, self.old_log_path):
+            if stale.exists():
+                os.remove(stale)
+
+    def close(self):
+        if self._log:
+            self._log.close()
+            self._log = None
+
+
+class BinaryStorage(LogStorage):
+    """
+    Memory-mapped binary snapshot (`memory_store.bin`, see snapshot.py) + append-only
+    log (`memory_store.binlog`, same format as LogStorage).
+
+    Startup parses only the snapshot's index; records are decoded on first access.
+    Compaction happens under the store's data lock so the mapping can be re-pointed
+    at the new file; untouched records are copied without being decoded.
+
+    Converts automatically: if memory_store.json (+ .log) is newer than the binary
+    snapshot it is imported on load, and JsonStorage/LogStorage import a newer
+    binary snapshot the same way.
+    """
+    def __init__(self, path: Path, compact_min_bytes: int = COMPACT_MIN_BYTES):
+        super().__init__(path, compact_min_bytes)
+        self.json_path = self.path
+        self.path = self.json_path.with_suffix(".bin")
+        self.log_path = self.json_path.with_suffix(".binlog")
+
+    def load(self) -> LazyRecords:
+        if _newer_format(self.json_path) == "json":
+            memory = {}
+            if self.json_path.exists() and os.path.getsize(self.json_path):
+                with open(self.json_path, 'r', encoding='utf-8') as f:
+                    memory = json.load(f)
+            for log in (self.json_path.with_suffix(".log.old"), self.json_path.with_suffix(".log")):
+                self._replay(log, memory)
+            self.overwrite(memory)
+            print(f"[Memory] Converted {len(memory)} intents from {self.json_path.name} to {self.path.name}.")
+        elif not self.path.exists():
+            self.overwrite({})
+
+        memory = LazyRecords.open(self.path)
+        self._snapshot_bytes = self.path.stat().st_size
+        self._snapshot_token = file_token(self.path)
+        self._log_bytes, _ = self._replay(self.log_path, memory)
+        self._open_log()
+        return memory
+
+    def persisted_keys(self) -> set:
+        keys = set()
+        if self.path.exists():
+            snapshot = LazyRecords.open(self.path)
+            keys = set(snapshot)
+            snapshot.release()
+        return _log_keys(self.log_path, keys)
+
+    def encode(self, memory: LazyRecords, changes: dict):
+        log_bytes = self._log_entries(memory, changes)
+        if self._compaction_due(len(log_bytes)):
+            # The snapshot includes this batch, so its log entries are not needed.
+            self._compact_binary(memory)
+            return b"", None
+        return log_bytes, None
+
+    def _compact_binary(self, memory: LazyRecords):
+        data = encode_snapshot(memory)
+        memory.release()   # Windows cannot replace a mapped file
+        try:
+            atomic_write_bytes(self.path, data)
+        finally:
+            memory.remap(self.path)
+        self._snapshot_bytes = len(data)
+        self._snapshot_token = file_token(self.path)
+        self._log.truncate(0)
+        self._log_bytes = 0
+
+    @staticmethod
+    def _reload_into(memory: LazyRecords, fresh: LazyRecords):
+        memory.adopt(fresh)
+
+    def overwrite(self, memory):
+        atomic_write_bytes(self.path, encode_snapshot(memory))
+        if self.log_path.exists():
+            os.remove(self.log_path)
+
+
+STORAGES = {
+    "json": JsonStorage,
+    "log": LogStorage,
+    "binary": BinaryStorage,
+}
@@ -0,0 +1,139 @@
+import sys
+# Windows console encoding fix
+sys.stdout.reconfigure(encoding='utf-8')
+
+import argparse
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Add parent dir to sys.path to allow imports if run directly
+sys.path.append(str(Path(__file__).parent.parent))
+
+from router.vector_index import normalize, top_k
+from router.vector_store import VECTOR_TUNING_PATH, MilvusIndex
+
+PAGE_SIZE = 10_000
+IVF_NPROBE = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+HNSW_EF = [16, 32, 64, 128, 256, 512, 1024]
+
+
+def scan(index: MilvusIndex):
+    """Yields (ids, vectors) pages covering the whole collection."""
+    iterator = index.collection.query_iterator(batch_size=PAGE_SIZE, output_fields=["embedding"])
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            yield (np.array([row["id"] for row in rows], dtype=np.int64),
+                   normalize([row["embedding"] for row in rows]))
+    finally:
+        iterator.close()
+
+
+def sample_queries(index: MilvusIndex, n: int, seed: int) -> np.ndarray:
+    """Reservoir sample of stored vectors, jittered so a query is not its own exact match."""
+    rng = np.random.default_rng(seed)
+    reservoir, seen = [], 0
+    for _, vectors in scan(index):
+        for vector in vectors:
+            seen += 1
+            if len(reservoir) < n:
+                reservoir.append(vector)
+            elif (slot := rng.integers(seen)) < n:
+                reservoir[slot] = vector
+    queries = np.array(reservoir, dtype=np.float32)
+    return normalize(queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32))
+
+
+def exact_neighbours(index: MilvusIndex, queries: np.ndarray, k: int) -> np.ndarray:
+    """Brute-force top-k ids over the whole collection, streamed page by page."""
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for ids, vectors in scan(index):
+        rows, scores = top_k(queries @ vectors.T, k)
+        best_ids = np.concatenate([best_ids, ids[rows]], axis=1)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        keep, best_scores = top_k(best_scores, k)
+        best_ids = np.take_along_axis(best_ids, keep, axis=1)
+    return best_ids
+
+
+def measure(index: MilvusIndex, queries: np.ndarray, truth: np.ndarray, k: int, params: dict):
+    """(recall@k, p50 ms) of single-query searches with these search params."""
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = index.collection.search([query.tolist()], "embedding",
+                                       {"metric_type": "COSINE", "params": params}, limit=k)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({hit.id for hit in hits[0]} & set(expected.tolist())) / len(expected))
+    return float(np.mean(recalls)), float(np.median(latencies) * 1000)
+
+
+def candidates(index_def: dict, k: int) -> list:
+    if index_def["index_type"] == "IVF_FLAT":
+        return [{"nprobe": n} for n in IVF_NPROBE if n <= index_def["params"]["nlist"]]
+    if index_def["index_type"] == "HNSW":
+        return [{"ef": ef} for ef in HNSW_EF if ef >= k]
+    return [{}]   # FLAT is exact; nothing to tune
+
+
+def tune(target_recall: float, queries: int, k: int, rebuild: bool, dry_run: bool, seed: int):
+    index = MilvusIndex()
+    if rebuild and not index.ensure_index():
+        print("[Tune] Index already matches the row count; not rebuilt.")
+    rows = index.collection.num_entities
+    print(f"[Tune] {rows:,} rows, index {index.current_index['index_type']} {index.current_index['params']}")
+    if rows == 0:
+        print("[Tune] Collection is empty; nothing to tune.")
+        return
+
+    probes = sample_queries(index, queries, seed)
+    truth = exact_neighbours(index, probes, k)
+
+    print(f"{'params':<16} {'recall@' + str(k):>10} {'p50 ms':>8}")
+    results = []
+    for params in candidates(index.current_index, k):
+        recall, latency = measure(index, probes, truth, k, params)
+        results.append((params, recall, latency))
+        print(f"{json.dumps(params):<16} {recall:>10.3f} {latency:>8.2f}")
+        if recall >= 0.999:
+            break   # larger probe/ef values only cost latency from here
+
+    passing = [r for r in results if r[1] >= target_recall]
+    params, recall, latency = min(passing, key=lambda r: r[2]) if passing else max(results, key=lambda r: r[1])
+    if not passing:
+        print(f"[Tune] No setting reached recall {target_recall}; using the most accurate one.")
+    print(f"[Tune] Chosen: {params} (recall {recall:.3f}, {latency:.2f} ms)")
+
+    if dry_run:
+        return
+    tuning = {"index": index.current_index, "search": params, "rows": rows, "k": k,
+              "target_recall": target_recall, "recall": recall, "latency_ms": latency,
+              "tuned_at": datetime.now().isoformat()}
+    tmp = VECTOR_TUNING_PATH.with_suffix(".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(tuning, f, indent=2)
+    tmp.replace(VECTOR_TUNING_PATH)
+    print(f"[Tune] Saved to {VECTOR_TUNING_PATH}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sweep Milvus search parameters (nprobe / ef) against exact search and save the "
+                    "cheapest setting that reaches the target recall. The in-process index is exact "
+                    "and needs no tuning.")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--queries", type=int, default=200, help="sampled query vectors")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index first if the row count moved it to another tier "
+                        "(searches fail while it rebuilds; run when traffic is low)")
+    parser.add_argument("--dry-run", action="store_true", help="report without saving")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    tune(args.target_recall, args.queries, args.k, args.rebuild, args.dry_run, args.seed)
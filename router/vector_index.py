@@ -0,0 +1,289 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from .embeddings import EMBEDDING_DIM
+
+VECTOR_INDEX_PATH = Path(os.getenv("VECTOR_INDEX_PATH", Path(__file__).resolve().parent / "vector_index"))
+# Store vectors as int8 (4x smaller, approximate scores) instead of float32.
+VECTOR_INT8 = os.getenv("VECTOR_INT8", "0") == "1"
+
+# Rows scored per matrix product; bounds temporary memory for large indexes
+# (int8 rows are widened to float32 per chunk, so those chunks stay cache-sized).
+SEARCH_CHUNK_ROWS = 262_144
+INT8_CHUNK_ROWS = 16_384
+_MIN_CAPACITY = 1024
+
+# Metadata fields a search can be restricted by ("where" filters):
+#   {"domain": "coding" | [...], "task": ... | [...], "human_verified": bool,
+#    "created_after": iso | datetime | epoch, "created_before": ...}
+FILTER_FIELDS = ("domain", "task", "human_verified", "created_after", "created_before")
+_CATEGORICAL = ("domain", "task")
+
+
+def timestamp(value) -> float:
+    """Epoch seconds for an ISO string, datetime or number; NaN when missing or unparseable."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def matches(metadata: dict, where: dict) -> bool:
+    """Row-at-a-time version of the filter, for small unindexed sets (e.g. pending inserts)."""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for field in _CATEGORICAL:
+        if where.get(field) is not None and metadata.get(field) not in _as_list(where[field]):
+            return False
+    if where.get("human_verified") is not None and metadata.get("human_verified") is not bool(where["human_verified"]):
+        return False
+    created = timestamp(metadata.get("created_at"))
+    if where.get("created_after") is not None and not created >= timestamp(where["created_after"]):
+        return False
+    if where.get("created_before") is not None and not created <= timestamp(where["created_before"]):
+        return False
+    return True
+
+
+def normalize(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int):
+    """Row-wise top-k of a (queries x rows) score matrix, best first: (indices, scores)."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class NumpyIndex:
+    """
+    Exact cosine search over a contiguous matrix of normalized rows, persisted
+    as a memory-mapped file next to an append-only metadata log:
+
+        vectors.f32 / vectors.i8   rows (capacity grows by doubling)
+        scales.f32                 int8 only: per-row dequantization scale
+        meta.jsonl                 {"text": ..., "metadata": ...} per row
+        index.json                 dimension and dtype
+
+    A row only counts once its metadata line is written, so a crash between
+    the two writes leaves an ignored slot rather than a corrupt index.
+
+    The filterable metadata fields (FILTER_FIELDS) are also kept as column
+    arrays, so a "where" filter is a vectorized mask and only matching rows
+    are scored.
+    """
+    def __init__(self, path: Path = VECTOR_INDEX_PATH, dim: int = EMBEDDING_DIM, int8: bool = VECTOR_INT8):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        header_path = self.path / "index.json"
+        if header_path.exists():
+            with open(header_path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            dim, int8 = header["dim"], header["dtype"] == "int8"
+        else:
+            with open(header_path, 'w', encoding='utf-8') as f:
+                json.dump({"dim": dim, "dtype": "int8" if int8 else "float32"}, f)
+        self.dim = dim
+        self.int8 = int8
+        self.dtype = np.int8 if int8 else np.float32
+        self.vectors_path = self.path / ("vectors.i8" if int8 else "vectors.f32")
+        self.scales_path = self.path / "scales.f32"
+        self.meta_path = self.path / "meta.jsonl"
+        self._lock = threading.Lock()
+        self.texts = []
+        self.metadata = []
+        self._vectors = None
+        self._scales = None
+        self._codes = {field: {} for field in _CATEGORICAL}   # value -> int code per column
+        self._columns = {}
+        self._load()
+
+    def _load(self):
+        if self.meta_path.exists():
+            with open(self.meta_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break   # torn final line
+                    entry = json.loads(line)
+                    self.texts.append(entry["text"])
+                    self.metadata.append(entry["metadata"])
+        for path in (self.vectors_path, self.scales_path) if self.int8 else (self.vectors_path,):
+            if not path.exists():
+                path.touch()
+        self._map()
+        if self.capacity < len(self.texts):
+            print(f"[VectorIndex] {self.vectors_path.name} is shorter than {self.meta_path.name}; truncating metadata.")
+            del self.texts[self.capacity:], self.metadata[self.capacity:]
+        self._resize_columns(self.capacity)
+        self._index_metadata(0, self.metadata)
+
+    def _resize_columns(self, capacity: int):
+        fresh = {"domain": np.full(capacity, -1, dtype=np.int32),
+                 "task": np.full(capacity, -1, dtype=np.int32),
+                 "human_verified": np.full(capacity, -1, dtype=np.int8),
+                 "created_at": np.full(capacity, np.nan, dtype=np.float64)}
+        for name, column in self._columns.items():
+            fresh[name][:len(column)] = column[:capacity]
+        self._columns = fresh
+
+    def _index_metadata(self, start: int, metadatas: list):
+        """Fills the filter columns for rows start..start+len(metadatas)."""
+        end = start + len(metadatas)
+        for field in _CATEGORICAL:
+            codes = self._codes[field]
+            self._columns[field][start:end] = [
+                codes.setdefault(m[field], len(codes)) if isinstance(m, dict) and isinstance(m.get(field), str) else -1
+                for m in metadatas]
+        self._columns["human_verified"][start:end] = [
+            int(m["human_verified"]) if isinstance(m, dict) and isinstance(m.get("human_verified"), bool) else -1
+            for m in metadatas]
+        self._columns["created_at"][start:end] = [
+            timestamp(m.get("created_at")) if isinstance(m, dict) else np.nan for m in metadatas]
+
+    def mask(self, where: dict, count: int = None):
+        """Boolean array over the first `count` rows that satisfy `where`; None when unfiltered."""
+        if not where or all(where.get(field) is None for field in FILTER_FIELDS):
+            return None
+        count = len(self.texts) if count is None else count
+        mask = np.ones(count, dtype=bool)
+        for field in _CATEGORICAL:
+            if where.get(field) is not None:
+                codes = [self._codes[field][v] for v in _as_list(where[field]) if v in self._codes[field]]
+                mask &= np.isin(self._columns[field][:count], codes)
+        if where.get("human_verified") is not None:
+            mask &= self._columns["human_verified"][:count] == int(bool(where["human_verified"]))
+        created = self._columns["created_at"][:count]
+        with np.errstate(invalid="ignore"):   # NaN (no created_at) never matches a range
+            if where.get("created_after") is not None:
+                mask &= created >= timestamp(where["created_after"])
+            if where.get("created_before") is not None:
+                mask &= created <= timestamp(where["created_before"])
+        return mask
+
+    def _map(self):
+        row_bytes = self.dim * np.dtype(self.dtype).itemsize
+        rows = os.path.getsize(self.vectors_path) // row_bytes
+        if self.int8:
+            rows = min(rows, os.path.getsize(self.scales_path) // 4)
+            self._scales = (np.memmap(self.scales_path, dtype=np.float32, mode="r+", shape=(rows,))
+                            if rows else np.empty(0, dtype=np.float32))
+        self._vectors = (np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(rows, self.dim))
+                         if rows else np.empty((0, self.dim), dtype=self.dtype))
+
+    @property
+    def capacity(self) -> int:
+        return self._vectors.shape[0]
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _grow(self, needed: int):
+        capacity = max(self.capacity * 2, needed, _MIN_CAPACITY)
+        self._vectors = self._scales = None   # unmap first (required on Windows)
+        with open(self.vectors_path, 'r+b') as f:
+            f.truncate(capacity * self.dim * np.dtype(self.dtype).itemsize)
+        if self.int8:
+            with open(self.scales_path, 'r+b') as f:
+                f.truncate(capacity * 4)
+        self._map()
+        self._resize_columns(self.capacity)
+
+    def insert(self, vectors: list, texts: list, metadatas: list) -> list:
+        """Appends rows; returns their ids (row numbers)."""
+        matrix = normalize(vectors)
+        with self._lock:
+            start = len(self.texts)
+            if start + len(matrix) > self.capacity:
+                self._grow(start + len(matrix))
+            end = start + len(matrix)
+            if self.int8:
+                # Symmetric per-row quantization: the largest component maps to +-127
+                peak = np.abs(matrix).max(axis=1)
+                peak[peak == 0] = 1.0
+                self._vectors[start:end] = np.rint(matrix * (127 / peak)[:, None]).astype(np.int8)
+                self._scales[start:end] = peak / 127
+                self._scales.flush()
+            else:
+                self._vectors[start:end] = matrix
+            self._vectors.flush()
+            with open(self.meta_path, 'ab') as f:
+                f.write(b"".join((json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+                                 .encode('utf-8') for text, metadata in zip(texts, metadatas)))
+            self._index_metadata(start, metadatas)
+            self.texts.extend(texts)
+            self.metadata.extend(metadatas)
+            return list(range(start, start + len(matrix)))
+
+    def flush(self):
+        """Rows are written through on insert; kept for parity with MilvusIndex."""
+        with self._lock:
+            for array in (self._vectors, self._scales):
+                if isinstance(array, np.memmap):
+                    array.flush()
+
+    def search_ids(self, vectors: list, k: int, where: dict = None):
+        """(ids, scores) arrays of shape (queries, <=k), best first, over rows matching `where`."""
+        queries = normalize(vectors)
+        with self._lock:
+            count = len(self.texts)
+            matrix, scales = self._vectors, self._scales
+            mask = self.mask(where, count)
+        rows = np.flatnonzero(mask) if mask is not None else None
+        total = count if rows is None else len(rows)
+        step = INT8_CHUNK_ROWS if self.int8 else SEARCH_CHUNK_ROWS
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, total, step):
+            end = min(start + step, total)
+            # Unfiltered: contiguous slices (views). Filtered: gather only the matching rows.
+            select = slice(start, end) if rows is None else rows[start:end]
+            if self.int8:
+                scores = (queries @ matrix[select].astype(np.float32).T) * scales[select]
+            else:
+                scores = queries @ matrix[select].T
+            ids, part = top_k(scores, k)
+            ids = ids + start if rows is None else rows[start:end][ids]
+            # Merge this chunk's winners with the running top-k
+            best_ids = np.concatenate([best_ids, ids], axis=1)
+            best_scores = np.concatenate([best_scores, part], axis=1)
+            keep, best_scores = top_k(best_scores, k)
+            best_ids = np.take_along_axis(best_ids, keep, axis=1)
+        return best_ids, best_scores
+
+    def search(self, vectors: list, top_k: int, where: dict = None, threshold: float = None) -> list:
+        """One list of {"text", "metadata", "score", "id"} hits per query vector."""
+        ids, scores = self.search_ids(vectors, top_k, where)
+        keep = scores >= threshold if threshold is not None else np.ones(scores.shape, dtype=bool)
+        counts = keep.sum(axis=1)
+        ids, scores = ids[keep].tolist(), scores[keep].tolist()   # row-major, so hits stay grouped per query
+        results, start = [], 0
+        for n in counts.tolist():
+            results.append([{"text": self.texts[i], "metadata": self.metadata[i], "score": s, "id": i}
+                            for i, s in zip(ids[start:start + n], scores[start:start + n])])
+            start += n
+        return results
@@ -1,8 +1,16 @@
 
+import asyncio
+import atexit
+import json
+import math
 import os
+import threading
+import time
+from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
-from pymilvus import connections, utility, Collection, CollectionSchema, FieldSchema, DataType
+
+from .embeddings import EMBEDDING_DIM, embed
 
 
 env_path = Path(__file__).resolve().parent / '.env'
@@ -12,100 +20,441 @@ load_dotenv(dotenv_path=env_path)
 MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
 MILVUS_PORT = os.getenv("MILVUS_PORT", "19530")
 COLLECTION_NAME = "semantic_memory"
-DIMENSION = 384
+DIMENSION = EMBEDDING_DIM
 
-class VectorStore:
-    def __init__(self):
-        self.collection_name = COLLECTION_NAME
+# "milvus", "numpy" (in-process, see vector_index.py) or "auto": Milvus if it is
+# installed and reachable, otherwise the in-process index.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+
+# Inserts are buffered and written in bulk once VECTOR_INSERT_BATCH rows are pending
+# or the oldest has waited VECTOR_FLUSH_INTERVAL seconds. Buffered rows are still
+# searched, so a session always sees its own writes.
+VECTOR_INSERT_BATCH = int(os.getenv("VECTOR_INSERT_BATCH", "64"))
+VECTOR_FLUSH_INTERVAL = float(os.getenv("VECTOR_FLUSH_INTERVAL", "5"))
+# insert_many() writes backfills in chunks of this many rows.
+VECTOR_BULK_CHUNK = 1000
+# Query vectors per Milvus search request (the server caps nq).
+MILVUS_SEARCH_BATCH = 1024
+
+# Milvus index type: "auto" picks by row count (see choose_index), or force
+# FLAT / IVF_FLAT / HNSW. Search parameters tuned offline by
+# tune_vector_index.py are read from VECTOR_TUNING_PATH.
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "auto").upper()
+VECTOR_TUNING_PATH = Path(os.getenv("VECTOR_TUNING_PATH", Path(__file__).resolve().parent / "vector_tuning.json"))
+FLAT_MAX_ROWS = 20_000        # brute force is exact and fast enough below this
+HNSW_MIN_ROWS = 1_000_000     # IVF probe cost grows with size; graph search from here on
+HNSW_PARAMS = {"M": 16, "efConstruction": 200}
+
+
+def choose_index(rows: int, index_type: str = VECTOR_INDEX_TYPE) -> dict:
+    """Index definition for a collection of `rows` vectors."""
+    if index_type == "AUTO":
+        index_type = "FLAT" if rows < FLAT_MAX_ROWS else "IVF_FLAT" if rows < HNSW_MIN_ROWS else "HNSW"
+    if index_type == "IVF_FLAT":
+        # ~4*sqrt(n) lists, rounded to a power of two so small growth doesn't change it
+        nlist = 2 ** round(math.log2(min(max(4 * math.sqrt(max(rows, 1)), 128), 65536)))
+        params = {"nlist": nlist}
+    elif index_type == "HNSW":
+        params = dict(HNSW_PARAMS)
+    else:
+        params = {}
+    return {"index_type": index_type, "metric_type": "COSINE", "params": params}
+
+
+def same_index(a: dict, b: dict) -> bool:
+    return bool(a and b) and a.get("index_type") == b.get("index_type") and a.get("params") == b.get("params")
+
+
+def default_search_params(index: dict, top_k: int) -> dict:
+    if index["index_type"] == "HNSW":
+        return {"ef": max(64, top_k)}
+    if index["index_type"] == "IVF_FLAT":
+        return {"nprobe": max(10, index["params"]["nlist"] // 32)}
+    return {}
+
+
+def load_tuning(path: Path = VECTOR_TUNING_PATH) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[VectorStore] Ignoring unreadable tuning file {path}: {e}")
+        return {}
+
+
+def _iso(value) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).isoformat()
+    return str(value)
+
+
+def milvus_expr(where: dict) -> str:
+    """
+    Boolean expression over the JSON metadata field for a "where" filter
+    (see vector_index.FILTER_FIELDS). created_at is an ISO string, so the
+    range compares lexicographically.
+    """
+    clauses = []
+    for field in ("domain", "task"):
+        value = (where or {}).get(field)
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            clauses.append(f'metadata["{field}"] in {json.dumps(list(value))}')
+        else:
+            clauses.append(f'metadata["{field}"] == {json.dumps(value)}')
+    if (where or {}).get("human_verified") is not None:
+        clauses.append(f'metadata["human_verified"] == {"true" if where["human_verified"] else "false"}')
+    if (where or {}).get("created_after") is not None:
+        clauses.append(f'metadata["created_at"] >= {json.dumps(_iso(where["created_after"]))}')
+    if (where or {}).get("created_before") is not None:
+        clauses.append(f'metadata["created_at"] <= {json.dumps(_iso(where["created_before"]))}')
+    return " and ".join(clauses)
+
+
+class MilvusIndex:
+    def __init__(self, collection_name: str = COLLECTION_NAME):
+        from pymilvus import Collection
+        self.collection_name = collection_name
         self._connect()
         self._create_collection_if_not_exists()
         self.collection = Collection(self.collection_name)
+        # Tier changes rebuild the index, which makes it unsearchable meanwhile, so
+        # workers never do it themselves: they only report that one is due.
+        self.current_index = self.index_params or choose_index(0)
+        self.check_index()
         self.collection.load()
+        self.tuning = load_tuning()
 
     def _connect(self):
-        try:
-            connections.connect("default", host=MILVUS_HOST, port=MILVUS_PORT)
-            print(f"[VectorStore] Connected to Milvus at {MILVUS_HOST}:{MILVUS_PORT}")
-        except Exception as e:
-            print(f"[VectorStore] Connection Failed: {e}")
+        from pymilvus import connections
+        # Raises if Milvus is unreachable so VECTOR_BACKEND=auto can fall back
+        connections.connect("default", host=MILVUS_HOST, port=MILVUS_PORT)
+        print(f"[VectorStore] Connected to Milvus at {MILVUS_HOST}:{MILVUS_PORT}")
 
     def _create_collection_if_not_exists(self):
+        from pymilvus import utility, Collection, CollectionSchema, FieldSchema, DataType
         if utility.has_collection(self.collection_name):
             return
-        
+
         print(f"[VectorStore] Creating collection '{self.collection_name}'...")
-        
+
         # Define Schema
         fields = [
             FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
             FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=DIMENSION),
-            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535), 
-            FieldSchema(name="metadata", dtype=DataType.JSON) 
+            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
+            FieldSchema(name="metadata", dtype=DataType.JSON)
         ]
-        
+
         schema = CollectionSchema(fields, "Semantic Memory Storage")
-        
+
         # Create
         collection = Collection(self.collection_name, schema)
-        
-        # Build Index for fast search
-        index_params = {
-            "metric_type": "COSINE",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 128}
-        }
-        collection.create_index(field_name="embedding", index_params=index_params)
+
+        # Empty collection: starts on the small-collection index; tune_vector_index.py --rebuild upgrades it
+        collection.create_index(field_name="embedding", index_params=choose_index(0))
         print(f"[VectorStore] Collection created and indexed.")
 
-    def search_similar(self, query_embedding: list, top_k: int = 3, threshold: float = 0.7):
-        if not query_embedding:
-            return []
-            
-        search_params = {"metric_type": "COSINE", "params": {"nprobe": 10}}
-        
-        try:
+    @property
+    def index_params(self) -> dict:
+        """The index currently built on the embedding field (None if there is none)."""
+        for index in self.collection.indexes:
+            if index.field_name == "embedding":
+                params = dict(index.params)
+                inner = params.get("params", {})
+                params["params"] = json.loads(inner) if isinstance(inner, str) else dict(inner)
+                return params
+        return None
+
+    def check_index(self) -> bool:
+        """True if the index matches the row count's tier; otherwise says how to rebuild it."""
+        wanted = choose_index(self.collection.num_entities)
+        if same_index(self.current_index, wanted):
+            return True
+        print(f"[VectorStore] Index {self.current_index.get('index_type')} {self.current_index.get('params')} "
+              f"is behind the row count (wants {wanted['index_type']} {wanted['params']}); "
+              f"run `python router/tune_vector_index.py --rebuild` during a quiet period.")
+        return False
+
+    def ensure_index(self, force: bool = False) -> bool:
+        """
+        Rebuilds the index when the row count has moved it to another tier
+        (or IVF list count). Searches fail while it is rebuilt, so this is an
+        offline/admin operation (tune_vector_index.py --rebuild), never called
+        by the serving path. Returns True if rebuilt.
+        """
+        wanted = choose_index(self.collection.num_entities)
+        current = self.index_params
+        if not force and same_index(current, wanted):
+            self.current_index = current
+            return False
+        print(f"[VectorStore] Rebuilding index: {current and current.get('index_type')} -> "
+              f"{wanted['index_type']} {wanted['params']} ({self.collection.num_entities} rows)")
+        self.collection.release()
+        if current:
+            self.collection.drop_index()
+        self.collection.create_index(field_name="embedding", index_params=wanted)
+        self.collection.load()
+        self.current_index = wanted
+        return True
+
+    def search_params(self, top_k: int) -> dict:
+        """Tuned parameters when they were measured on the current index, otherwise defaults."""
+        index = self.current_index
+        tuned = self.tuning.get("search") if same_index(self.tuning.get("index"), index) else None
+        params = dict(tuned or default_search_params(index, top_k))
+        if "ef" in params:
+            params["ef"] = max(params["ef"], top_k)   # HNSW needs ef >= limit
+        return params
+
+    def search(self, vectors: list, top_k: int, where: dict = None, threshold: float = None) -> list:
+        """
+        One hit list per query vector. `where` becomes a filter expression and
+        `threshold` a range search (radius), so both run inside Milvus.
+        """
+        search_params = {"metric_type": "COSINE", "params": self.search_params(top_k)}
+        if threshold is not None:
+            search_params["params"].update({"radius": threshold, "range_filter": 1.0})
+        expr = milvus_expr(where) or None
+        output = []
+        for start in range(0, len(vectors), MILVUS_SEARCH_BATCH):
             results = self.collection.search(
-                data=[query_embedding],
+                data=vectors[start:start + MILVUS_SEARCH_BATCH],
                 anns_field="embedding",
                 param=search_params,
                 limit=top_k,
-                output_fields=["text", "metadata"]
+                expr=expr,
+                output_fields=["text", "metadata"],
+                consistency_level="Session"   # rows this client inserted are visible without a flush
             )
-            
-            matches = []
-            for hit in results[0]:
-                if hit.score < threshold: # Cosine similarity: 1.0 is exact match
-                    continue
-                    
-                matches.append({
-                    "text": hit.entity.get("text"),
-                    "metadata": hit.entity.get("metadata"),
-                    "score": hit.score,
-                    "id": hit.id
-                })
-            
-            return matches
-            
+            output.extend([[{
+                "text": hit.entity.get("text"),
+                "metadata": hit.entity.get("metadata"),
+                "score": hit.score,
+                "id": hit.id
+            } for hit in hits] for hits in results])
+        return output
+
+    def insert(self, vectors: list, texts: list, metadatas: list):
+        self.collection.insert([vectors, texts, metadatas])
+
+    def flush(self):
+        """Seals growing segments. Expensive; only called explicitly (never rebuilds the index)."""
+        self.collection.flush()
+        # Pick up an index rebuilt and tuned by tune_vector_index.py in the meantime
+        self.current_index = self.index_params or self.current_index
+        self.tuning = load_tuning()
+
+
+def open_index(backend: str = VECTOR_BACKEND):
+    if backend in ("auto", "milvus"):
+        try:
+            return MilvusIndex()
+        except Exception as e:
+            if backend == "milvus":
+                raise
+            print(f"[VectorStore] Milvus unavailable ({e}); using in-process index")
+    from .vector_index import NumpyIndex
+    index = NumpyIndex()
+    print(f"[VectorStore] In-process index at {index.path} ({len(index)} vectors)")
+    return index
+
+
+class VectorStore:
+    """
+    Semantic memory over a pluggable index backend (Milvus or NumpyIndex).
+    Nothing connects until the first search or insert.
+
+    Single inserts are buffered and written to the index in batches by a
+    background thread; search_similar also scans the buffer, so a session
+    reads its own writes. flush() drains the buffer and seals the index.
+    """
+    def __init__(self, backend: str = VECTOR_BACKEND, insert_batch: int = VECTOR_INSERT_BATCH,
+                 flush_interval: float = VECTOR_FLUSH_INTERVAL):
+        self.backend = backend
+        self.insert_batch = insert_batch
+        self.flush_interval = flush_interval
+        self._index = None
+        self._index_lock = threading.Lock()
+
+        self._buffer = []   # (embedding, text, metadata) not yet in the index
+        self._draining = [] # rows handed to index.insert() that may not be committed yet
+        self._buffer_since = None
+        self._buffer_lock = threading.Lock()
+        self._drain_lock = threading.Lock()   # keeps batches in insertion order
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._flusher = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = open_index(self.backend)
+        return self._index
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="vector-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                with self._buffer_lock:
+                    due = self._buffer and (len(self._buffer) >= self.insert_batch or
+                                            time.monotonic() - self._buffer_since >= self.flush_interval)
+                if due:
+                    self._drain()
+            except Exception as e:
+                print(f"[VectorStore] Background insert failed: {e}")
+
+    def _drain(self):
+        """Writes the buffered rows to the index in one bulk insert."""
+        with self._drain_lock:
+            with self._buffer_lock:
+                rows, self._buffer, self._buffer_since = self._buffer, [], None
+                # Still searched through the overlay until the insert has committed
+                self._draining = rows
+            if not rows:
+                return
+            try:
+                embeddings, texts, metadatas = map(list, zip(*rows))
+                self.index.insert(embeddings, texts, metadatas)
+            except:
+                with self._buffer_lock:
+                    # Put the rows back in front so nothing is lost or reordered
+                    self._buffer = rows + self._buffer
+                    self._buffer_since = self._buffer_since or time.monotonic()
+                    self._draining = []
+                raise
+            with self._buffer_lock:
+                self._draining = []
+            print(f"[VectorStore] Inserted {len(rows)} buffered memories.")
+
+    def flush(self):
+        """Inserts everything buffered and seals the index (explicit, rare)."""
+        self._drain()
+        if self._index is not None and hasattr(self._index, "flush"):
+            self._index.flush()
+
+    def close(self):
+        """Stops the background thread and flushes pending rows."""
+        self._closed.set()
+        self._wakeup.set()
+        if self._flusher and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[VectorStore] Flush on close failed: {e}")
+
+    def _pending_rows(self, where: dict = None) -> list:
+        """Rows buffered or being inserted, i.e. possibly not yet visible in the index."""
+        from .vector_index import matches
+        with self._buffer_lock:
+            return [row for row in self._draining + self._buffer if matches(row[2], where)]
+
+    def _search_buffer(self, query_embeddings: list, top_k: int, rows: list,
+                       threshold: float = None) -> list:
+        """Exact cosine hits among pending rows (read-your-writes overlay), per query."""
+        from .vector_index import normalize, top_k as best_k
+        if not rows:
+            return [[] for _ in query_embeddings]
+        ids, scores = best_k(normalize(query_embeddings) @ normalize([row[0] for row in rows]).T, top_k)
+        return [[{"text": rows[i][1], "metadata": rows[i][2], "score": s, "id": None}
+                 for i, s in zip(row_ids.tolist(), row_scores.tolist()) if threshold is None or s >= threshold]
+                for row_ids, row_scores in zip(ids, scores)]
+
+    async def search_many(self, queries: list, top_k: int = 3, threshold: float = 0.7,
+                          where: dict = None) -> list:
+        """
+        One list of hits per query, best first. Queries are texts (embedded in
+        one batch) or precomputed embeddings, and all go to the index in a
+        single call. `where` restricts by metadata, e.g.
+        {"domain": "coding", "human_verified": True, "created_after": "2025-01-01"};
+        filtering and the score threshold are applied inside the index.
+        """
+        if not queries:
+            return []
+        text_positions = [i for i, query in enumerate(queries) if isinstance(query, str)]
+        embeddings = list(queries)
+        if text_positions:
+            for i, vector in zip(text_positions, await embed([queries[i] for i in text_positions])):
+                embeddings[i] = vector
+
+        try:
+            # Pending rows are taken before the index is searched: a row drained
+            # meanwhile is then found in the overlay, the index, or both (deduplicated).
+            rows = self._pending_rows(where)
+            results = await asyncio.to_thread(self.index.search, embeddings, top_k, where, threshold)
+            pending = self._search_buffer(embeddings, top_k, rows, threshold)
+            # Cosine similarity: 1.0 is exact match
+            return [self._merge_hits(hits, extra, top_k) for hits, extra in zip(results, pending)]
+
         except Exception as e:
             print(f"[VectorStore] Search Error: {e}")
+            return [[] for _ in queries]
+
+    @staticmethod
+    def _merge_hits(hits: list, extra: list, top_k: int) -> list:
+        """Index hits plus overlay hits for rows the index didn't return yet."""
+        def key(hit):
+            return hit["text"], json.dumps(hit.get("metadata") or {}, sort_keys=True, default=str)
+        indexed = {key(hit) for hit in hits}
+        merged = hits + [hit for hit in extra if key(hit) not in indexed]
+        return sorted(merged, key=lambda hit: -hit["score"])[:top_k]
+
+    async def search_similar(self, query, top_k: int = 3, threshold: float = 0.7, where: dict = None):
+        """`query` is either the query text (embedded here) or a precomputed embedding."""
+        if query is None or len(query) == 0:
             return []
+        return (await self.search_many([query], top_k, threshold, where))[0]
 
-    def insert_memory(self, text: str, embedding: list, metadata: dict):
+    async def insert_memory(self, text: str, embedding: list = None, metadata: dict = None):
+        """Buffers one row; it is written with the next batch."""
         try:
-            
-            
-            data = [
-                [embedding],
-                [text],
-                [metadata]
-            ]
-            
-            self.collection.insert(data)
-            self.collection.flush() 
-            print(f"[VectorStore] Memory inserted.")
-            
+            if embedding is None:
+                embedding = (await embed([text]))[0]
+
+            with self._buffer_lock:
+                self._buffer.append((embedding, text, metadata or {}))
+                self._buffer_since = self._buffer_since or time.monotonic()
+                full = len(self._buffer) >= self.insert_batch
+            self._start_flusher()
+            if full:
+                self._wakeup.set()
+            print(f"[VectorStore] Memory buffered.")
+
         except Exception as e:
             print(f"[VectorStore] Insert Error: {e}")
 
+    async def insert_many(self, texts: list, embeddings: list = None, metadatas: list = None):
+        """
+        Bulk backfill: embeds in batches, inserts in chunks of VECTOR_BULK_CHUNK
+        and seals the index once at the end. Returns the number of rows written.
+        """
+        metadatas = metadatas or [{} for _ in texts]
+        await asyncio.to_thread(self._drain)   # keep earlier single inserts ahead of the backfill
+        written = 0
+        for start in range(0, len(texts), VECTOR_BULK_CHUNK):
+            chunk = texts[start:start + VECTOR_BULK_CHUNK]
+            vectors = embeddings[start:start + VECTOR_BULK_CHUNK] if embeddings is not None else await embed(chunk)
+            await asyncio.to_thread(self.index.insert, list(vectors), chunk,
+                                    metadatas[start:start + VECTOR_BULK_CHUNK])
+            written += len(chunk)
+        await asyncio.to_thread(self.flush)
+        print(f"[VectorStore] Inserted {written} memories.")
+        return written
+
 # Global instance
 vector_store = VectorStore()
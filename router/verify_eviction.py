@@ -0,0 +1,57 @@
+import sys
+# Windows console encoding fix
+sys.stdout.reconfigure(encoding='utf-8')
+
+import tempfile
+from pathlib import Path
+
+# Add parent dir to sys.path to allow imports if run directly
+sys.path.append(str(Path(__file__).parent.parent))
+
+from router.eviction import LFUPolicy
+from router.memory import MemoryStore
+
+
+def check_lfu_policy() -> bool:
+    # Emptying the lowest bucket, then placing a key higher up, must not hide the lower buckets
+    policy = LFUPolicy()
+    policy.admit("a", {"use_count": 0})
+    policy.admit("b", {"use_count": 2})
+    policy.admit("a", {"use_count": 10})
+    ok = policy.victim() == "b"
+    policy.touch("b", {})
+    policy.touch("b", {})
+    ok = ok and policy.victim() == "b"
+    print(f"  policy    victim={policy.victim()}  {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def check_merge_at_capacity() -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(memory_file=Path(tmp) / "memory_store.json", write_behind=False,
+                            capacity=3, eviction_policy="lfu")
+        for name, uses in (("a", 0), ("b", 2), ("c", 10)):
+            signature = f"x|t|{name}"
+            store.save_intent_answer({"intent_signature": signature, "domain": "x", "task": "t", "object": name},
+                                     f"answer {name}", ["Verify"], 0.95)
+            for _ in range(uses):
+                store.get_intent_answer(signature)
+        store.merge_intents("x|t|c", "x|t|a")
+        store.capacity = 2   # full again, so the next save evicts
+        store.save_intent_answer({"intent_signature": "x|t|d", "domain": "x", "task": "t", "object": "d"},
+                                 "answer d", ["Verify"], 0.95)
+        intents = sorted(store.list_intents())
+        store.close()
+        # a now holds c's 10 uses, so b (2 uses) makes room for d
+        ok = intents == ["x|t|a", "x|t|d"]
+        print(f"  merge     intents={intents}  {'OK' if ok else 'FAILED'}")
+        return ok
+
+
+if __name__ == "__main__":
+    print("--- LFU eviction ---")
+    if all([check_lfu_policy(), check_merge_at_capacity()]):
+        print("SUCCESS: Least frequently used intents are evicted.")
+    else:
+        print("FAILURE: Wrong eviction victim.")
+        sys.exit(1)
@@ -0,0 +1,97 @@
+import sys
+# Windows console encoding fix
+sys.stdout.reconfigure(encoding='utf-8')
+
+import argparse
+import multiprocessing
+import tempfile
+from pathlib import Path
+
+# Add parent dir to sys.path to allow imports if run directly
+sys.path.append(str(Path(__file__).parent.parent))
+
+COUNTER = {"intent_signature": "testing|counter|shared", "domain": "testing", "task": "counter", "object": "shared"}
+
+
+def open_store(path: str, storage: str):
+    if storage == "sqlite":
+        from router.memory_sqlite import SQLiteMemoryStore
+        return SQLiteMemoryStore(db_file=Path(path).with_suffix(".db"))
+    from router.memory import MemoryStore
+    return MemoryStore(memory_file=Path(path), storage=storage, shared=True)
+
+
+def router_worker(path: str, storage: str, worker: int, saves: int):
+    store = open_store(path, storage)
+    conflicts = 0
+    for i in range(saves):
+        store.save_intent_answer(
+            {"intent_signature": f"testing|worker_{worker}|item_{i}", "domain": "testing",
+             "task": f"worker_{worker}", "object": f"item_{i}"},
+            f"answer {worker}/{i}", ["Stress"], 0.95)
+
+        # Read-modify-write of a shared counter with optimistic retries
+        while True:
+            record = store.get_intent_answer(COUNTER["intent_signature"])
+            value = int(record["approved_answer"]) if record else 0
+            version = record.get("version", 1) if record else 0
+            if store.save_intent_answer(COUNTER, str(value + 1), ["Stress"], 0.95, expected_version=version):
+                break
+            conflicts += 1
+    store.close()
+    return conflicts
+
+
+def backend_worker(path: str, worker: int, saves: int):
+    from backend.memory_store import MemoryStore as BackendMemoryStore
+    store = BackendMemoryStore(filepath=path)
+    for i in range(saves):
+        store.update_memory("stress", f"{worker}/{i}")
+
+
+def check_router(storage: str, workers: int, saves: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "memory_store.json")
+        with multiprocessing.Pool(workers) as pool:
+            conflicts = sum(pool.starmap(router_worker, [(path, storage, w, saves) for w in range(workers)]))
+
+        store = open_store(path, storage)
+        intents = store.list_intents()
+        counter = store.get_intent_answer(COUNTER["intent_signature"])
+        store.close()
+
+        expected = workers * saves
+        ok = (len(intents) == expected + 1 and int(counter["approved_answer"]) == expected
+              and counter["version"] == expected)
+        print(f"  {storage:<7} intents={len(intents) - 1}/{expected} counter={counter['approved_answer']}/{expected} "
+              f"version={counter['version']} conflicts retried={conflicts}  {'OK' if ok else 'FAILED'}")
+        return ok
+
+
+def check_backend(workers: int, saves: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "memory_store.json")
+        with multiprocessing.Pool(workers) as pool:
+            pool.starmap(backend_worker, [(path, w, saves) for w in range(workers)])
+        from backend.memory_store import MemoryStore as BackendMemoryStore
+        entries = BackendMemoryStore(filepath=path).data
+        expected = workers * saves
+        ok = len(entries) == expected
+        print(f"  backend entries={len(entries)}/{expected}  {'OK' if ok else 'FAILED'}")
+        return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process memory store stress test")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--saves", type=int, default=50, help="saves per worker")
+    args = parser.parse_args()
+
+    print(f"--- {args.workers} processes x {args.saves} saves ---")
+    results = [check_router(storage, args.workers, args.saves) for storage in ("json", "log", "sqlite")]
+    results.append(check_backend(args.workers, args.saves))
+    if all(results):
+        print("SUCCESS: No lost updates.")
+    else:
+        print("FAILURE: Lost updates detected.")
+        sys.exit(1)